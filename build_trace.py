@@ -1,8 +1,11 @@
 import os
 import sys
+import heapq
 import simplejson as json
 from collections import defaultdict
 
+from tracewriter import TraceWriter
+
 
 ROOT_TASK_ID = "0"
 
@@ -25,115 +28,237 @@ def parse_json_dir(log_dir):
         event_logs.append(event_log)
     return event_logs
 
-# Returns two dependency mappings. The first has key object id, value task uuid
-# that produced it. The second has key task, value list of object ids that it
-# depends on.
-def build_dependencies(event_logs):
-    task_dependencies = {}
-    for event_log in event_logs:
-        for event in event_log:
-            if event['event'] != 'SCHEDULE':
-                continue
-            task_dependencies[event['taskId']] = event['dependsOn']
-    return task_dependencies
+def iter_json_log(filename):
+    """Events of a log file, read one line at a time."""
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_json_dir(log_dir):
+    """Lazily read event logs of the worker log files in log_dir, like
+    parse_json_dir."""
+    event_logs = []
+    for filename in sorted(os.listdir(log_dir)):
+        if not os.path.isfile(os.path.join(log_dir, filename)):
+            continue
+        if 'worker' not in filename:
+            continue
+        if filename.endswith('c++.log'):
+            continue
+        event_logs.append(iter_json_log(os.path.join(log_dir, filename)))
+    return event_logs
 
+def merge_event_logs(event_logs):
+    """(log index, event) for the events of all logs in timestamp order.
+    Events of one log keep their order."""
+    def keyed(i, event_log):
+        for (seq, event) in enumerate(event_log):
+            yield (event['time'], i, seq, event)
+    merged = heapq.merge(*[keyed(i, event_log) for (i, event_log) in enumerate(event_logs)])
+    for (_, i, _, event) in merged:
+        yield (i, event)
 
-def build_tasks(task_dependencies, event_log, task_roots):
-    tasks = []
-    phases = []
+class _LogState():
+    """The task a log is in the middle of, as kept by build_tasks."""
+    def __init__(self):
+        self.seen_events = False
+        self.done = False
+        self.is_driver = False
+        self.task_id = None
+        self.phases = []
+        self.phase = 0
+        self.depends_on = []
+        self.submits = []
+        self.creates = []
+        self.cur_time = 0
+
+    def end_phase(self, time):
+        self.phases.append({
+            'phaseId': self.phase,
+            'dependsOn': self.depends_on,
+            'submits': self.submits,
+            'duration': time - self.cur_time,
+            'creates': self.creates,
+            })
 
-    is_driver = False
-    task_id = None
-    phase = 0
-    depends_on = []
-    submits = []
-    creates = []
-    cur_time = 0
+class StreamingTraceBuilder():
+    """Builds tasks from events of many logs, fed in timestamp order, like
+    build_tasks does log by log. Each task is written out when its END
+    event arrives, so only the tasks in flight are held. Task dependencies
+    come from the SCHEDULE events, unless a task_dependencies mapping is
+    given."""
+    def __init__(self, writer, task_dependencies=None):
+        self.writer = writer
+        self.task_dependencies = task_dependencies
+        self._logs = {}
+        # dependencies of tasks scheduled but not begun
+        self._scheduled = {}
+        # tasks begun before their SCHEDULE event, whose dependencies are
+        # filled in when it arrives, and those of them already ended
+        self._unscheduled = {}
+        self._held = {}
+        self.task_roots = []
 
-    for event in event_log:
+    def _write_task(self, task):
+        if task['taskId'] in self._unscheduled:
+            self._held[task['taskId']] = task
+        else:
+            self.writer.write_task(task)
+
+    def add_event(self, log, event):
+        state = self._logs.get(log)
+        if state is None:
+            state = self._logs[log] = _LogState()
+        if state.done:
+            return
+        state.seen_events = True
         event_type = event['event']
         if event_type == 'SCHEDULE':
             schedule = {'taskId': event['taskId']}
-            if cur_time == 0:
+            if state.cur_time == 0:
                 # This is the very first task scheduled, by the driver.
                 offset = 0
             else:
-                offset = event['time'] - cur_time
+                offset = event['time'] - state.cur_time
             schedule['timeOffset'] = offset
-            submits.append(schedule)
+            state.submits.append(schedule)
+            if self.task_dependencies is None:
+                task_id = event['taskId']
+                if task_id in self._unscheduled:
+                    self._unscheduled.pop(task_id).extend(event['dependsOn'])
+                    if task_id in self._held:
+                        self.writer.write_task(self._held.pop(task_id))
+                else:
+                    self._scheduled[task_id] = event['dependsOn']
         elif event_type == 'DRIVER_BEGIN':
-            assert(task_id == None)
-            cur_time = event['time']
-            is_driver = True
-            print "Program began at ", cur_time
+            assert(state.task_id == None)
+            state.cur_time = event['time']
+            state.is_driver = True
+            print "Program began at ", state.cur_time
         elif event_type == 'BEGIN':
-            phases = []
-            task_id = event['taskId']
-            phase = 0
-            depends_on = task_dependencies[task_id]
-            submits = []
-            creates = []
-            cur_time = event['time']
+            state.phases = []
+            state.task_id = event['taskId']
+            state.phase = 0
+            if self.task_dependencies is not None:
+                state.depends_on = self.task_dependencies[state.task_id]
+            elif state.task_id in self._scheduled:
+                state.depends_on = self._scheduled.pop(state.task_id)
+            else:
+                state.depends_on = self._unscheduled[state.task_id] = []
+            state.submits = []
+            state.creates = []
+            state.cur_time = event['time']
         elif event_type == 'PHASE_END':
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
+            state.end_phase(event['time'])
         elif event_type == 'PHASE_BEGIN':
-            phase += 1
-            depends_on = event['dependsOn']
-            submits = []
-            creates = []
-            cur_time = event['time']
+            state.phase += 1
+            state.depends_on = event['dependsOn']
+            state.submits = []
+            state.creates = []
+            state.cur_time = event['time']
         elif event_type == 'END':
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
-            tasks.append({
-                'taskId': task_id,
-                'phases': phases,
+            state.end_phase(event['time'])
+            self._write_task({
+                'taskId': state.task_id,
+                'phases': state.phases,
                 'results': event['results'],
                 })
+            state.phases = []
         elif event_type == 'PUT':
-            object_id = event['objectId']
-            creates.append({
+            state.creates.append({
                 'objectId': event['objectId'],
                 'size': event['size'],
-                'timeOffset': event['time'] - cur_time,
+                'timeOffset': event['time'] - state.cur_time,
                 })
         elif event_type == 'DRIVER_END':
-            if not is_driver:
-                continue
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
-            break
+            if not state.is_driver:
+                return
+            state.end_phase(event['time'])
+            state.done = True
         else:
             print "Found unexpected event type {0}".format(event_type)
             sys.exit(-1)
 
-    # The task ID should not be set if this the driver program.
-    if (task_id is None) and (event_log):
-        task_id = ROOT_TASK_ID
-        tasks.append({
-            'taskId': task_id,
-            'phases': phases,
-            'results': [],
-            })
-        task_roots.append(task_id)
+    def finish(self):
+        """Write the tasks still held and return the root task ids. The
+        root tasks are not written."""
+        for task_id in self._unscheduled:
+            print "Warning: task {0} was never scheduled".format(task_id)
+        for task in self._held.values():
+            self.writer.write_task(task)
+        roots = []
+        for log in sorted(self._logs):
+            state = self._logs[log]
+            # The task ID should not be set if this the driver program.
+            if state.task_id is None and state.seen_events:
+                roots.append({
+                    'taskId': ROOT_TASK_ID,
+                    'phases': state.phases,
+                    'results': [],
+                    })
+        self.task_roots = [root['taskId'] for root in roots]
+        return roots
 
-    return tasks
+def stream_trace(event_logs, trace_filename, task_dependencies=None):
+    """Build a trace from event logs, iterables of events in the order
+    they were logged, and write it to trace_filename as the tasks
+    complete. Returns the number of tasks written."""
+    writer = TraceWriter(trace_filename)
+    builder = StreamingTraceBuilder(writer, task_dependencies)
+    try:
+        for (log, event) in merge_event_logs(event_logs):
+            builder.add_event(log, event)
+        roots = builder.finish()
+    except:
+        writer.abort()
+        raise
+    # There should only be one driver program.
+    if len(roots) == 0:
+        print "Error: No task roots found."
+        writer.abort()
+        return 0
+    if len(roots) > 1:
+        print "Error: More than one task root."
+        writer.abort()
+        return 0
+    writer.write_task(roots[0])
+    writer.close(roots[0]['taskId'])
+    return writer.num_tasks
+
+# Returns two dependency mappings. The first has key object id, value task uuid
+# that produced it. The second has key task, value list of object ids that it
+# depends on.
+def build_dependencies(event_logs):
+    task_dependencies = {}
+    for event_log in event_logs:
+        for event in event_log:
+            if event['event'] != 'SCHEDULE':
+                continue
+            task_dependencies[event['taskId']] = event['dependsOn']
+    return task_dependencies
+
+
+class _TaskList():
+    """Writer for StreamingTraceBuilder that keeps the tasks in a list."""
+    def __init__(self):
+        self.tasks = []
+
+    def write_task(self, task):
+        self.tasks.append(task)
+
+def build_tasks(task_dependencies, event_log, task_roots):
+    """Tasks of one event log, in the order they ended, with dependencies
+    from task_dependencies. If the log is the driver's, its root task comes
+    last and its id is appended to task_roots."""
+    task_list = _TaskList()
+    builder = StreamingTraceBuilder(task_list, task_dependencies)
+    for event in event_log:
+        builder.add_event(0, event)
+    roots = builder.finish()
+    task_roots.extend(root['taskId'] for root in roots)
+    return task_list.tasks + roots
 
 def dump_tasks(task_roots, tasks, trace_filename):
     # There should only be one driver program.
@@ -154,8 +279,14 @@ def dump_tasks(task_roots, tasks, trace_filename):
 if __name__ == '__main__':
     import sys
 
+    if len(sys.argv) >= 2 and sys.argv[1] == '--batch':
+        batch = True
+        del sys.argv[1]
+    else:
+        batch = False
     if len(sys.argv) < 2:
         print 'First argument must be directory with logs'
+        print 'Pass --batch first to load every log before building the trace'
         sys.exit(1)
 
     log_dir = sys.argv[1]
@@ -165,6 +296,11 @@ if __name__ == '__main__':
     print 'Dumping trace built from {0} directory to {1}'.format(log_dir,
                                                                  trace_filename)
 
+    if not batch:
+        num_tasks = stream_trace(iter_json_dir(log_dir), trace_filename)
+        print 'Wrote {0} tasks'.format(num_tasks)
+        sys.exit(0)
+
     event_logs = parse_json_dir(log_dir)
     task_dependencies = build_dependencies(event_logs)
     task_roots, tasks = [], []
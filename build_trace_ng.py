@@ -3,11 +3,11 @@ import time
 import sys
 import simplejson as json
 from collections import defaultdict
-import redis
+from multiprocessing.pool import ThreadPool
 import binascii
-import subprocess32 as subprocess
 
-from photon import task_from_string, ObjectID
+# the event logs read here are turned into tasks by build_trace
+from build_trace import ROOT_TASK_ID, build_tasks, stream_trace
 
 # Hack to suppress Ray errors from printing. These must be kept in sync with
 # worker.py.
@@ -15,14 +15,37 @@ LOG_POINT = 0
 LOG_SPAN_START = 1
 LOG_SPAN_END = 2
 
-ROOT_TASK_ID = "0"
-
-def read_event_logs(r):
-    event_log_keys = r.keys("event_log:*")
+# Keys requested per SCAN call, and requests per pipelined round trip. A
+# batch is answered before the next one is sent, which bounds the requests
+# in flight and the replies held at once.
+SCAN_COUNT = 1000
+BATCH_SIZE = 1000
+# threads decoding task specs
+NUM_DECODE_THREADS = 4
+
+def pipelined(r, keys, request, batch_size=BATCH_SIZE):
+    """Issue request(pipe, key) for every key, batch_size requests per
+    round trip, and return the replies in order."""
+    replies = []
+    for i in xrange(0, len(keys), batch_size):
+        pipe = r.pipeline(transaction=False)
+        for key in keys[i:i + batch_size]:
+            request(pipe, key)
+        replies.extend(pipe.execute())
+    return replies
+
+def read_event_logs(r, decode_task_spec=None, batch_size=BATCH_SIZE,
+                    num_threads=NUM_DECODE_THREADS):
+    event_log_keys = list(r.scan_iter(match="event_log:*", count=SCAN_COUNT))
+    logs = pipelined(r, event_log_keys,
+                     lambda pipe, key: pipe.lrange(key, 0, -1), batch_size)
     event_logs = []
-    task_dependencies = {}
-    for key in event_log_keys:
-        log = r.lrange(key, 0, -1)
+    # tasks in the order they are first seen, and result objects, whose
+    # dependencies and sizes are fetched in batches below
+    task_ids = []
+    seen_task_ids = set()
+    results_to_size = []
+    for log in logs:
         log = [json.loads(events) for events in log]
         log = [event for events in log for event in events]
         filtered_log = []
@@ -59,10 +82,12 @@ def read_event_logs(r):
                 result_ids = contents['results'].split()
                 results = []
                 for result_id in result_ids:
-                    results.append({
+                    result = {
                         'objectId': result_id,
-                        'size': get_object_size(r, result_id),
-                        })
+                        'size': None,
+                        }
+                    results.append(result)
+                    results_to_size.append(result)
                 event_dict = {
                         'event': 'END',
                         'results': results,
@@ -83,18 +108,45 @@ def read_event_logs(r):
             event_dict['time'] = time
             filtered_log.append(event_dict)
 
-            if task_id is not None and task_id not in task_dependencies:
-                task_dependencies[task_id] = get_task_dependencies(r, task_id)
+            if task_id is not None and task_id not in seen_task_ids:
+                seen_task_ids.add(task_id)
+                task_ids.append(task_id)
         event_logs.append(filtered_log)
+
+    sizes = pipelined(r, [binascii.unhexlify(result['objectId']) for result in results_to_size],
+                      lambda pipe, object_id: pipe.hget("OI:{}".format(object_id), 'data_size'),
+                      batch_size)
+    for (result, size) in zip(results_to_size, sizes):
+        result['size'] = size
+    specs = pipelined(r, [binascii.unhexlify(task_id) for task_id in task_ids],
+                      lambda pipe, task_id: pipe.hget("TT:{}".format(task_id), 'task_spec'),
+                      batch_size)
+    dependencies = decode_task_specs(specs, decode_task_spec, num_threads)
+    task_dependencies = dict(zip(task_ids, dependencies))
     return event_logs, task_dependencies
 
+def decode_task_specs(specs, decode_task_spec=None, num_threads=NUM_DECODE_THREADS):
+    """Object ids each task spec depends on, decoding the specs in a thread
+    pool. decode_task_spec defaults to task_spec_dependencies."""
+    if decode_task_spec is None:
+        decode_task_spec = task_spec_dependencies
+    if num_threads <= 1 or len(specs) <= 1:
+        return map(decode_task_spec, specs)
+    pool = ThreadPool(num_threads)
+    try:
+        return pool.map(decode_task_spec, specs,
+                        max(1, len(specs) // (4 * num_threads)))
+    finally:
+        pool.close()
+        pool.join()
+
 def get_object_size(r, object_id):
     object_id = binascii.unhexlify(object_id)
     return r.hget("OI:{}".format(object_id), 'data_size')
 
-def get_task_dependencies(r, task_id):
-    task_id = binascii.unhexlify(task_id)
-    spec = r.hget("TT:{}".format(task_id), 'task_spec')
+def task_spec_dependencies(spec):
+    # photon is only needed to decode real Ray task specs
+    from photon import task_from_string, ObjectID
     task = task_from_string(spec)
     dependencies = []
     for arg in task.arguments():
@@ -102,134 +154,16 @@ def get_task_dependencies(r, task_id):
             dependencies.append(arg.hex())
     return dependencies
 
-# Returns two dependency mappings. The first has key object id, value task uuid
-# that produced it. The second has key task, value list of object ids that it
-# depends on.
-def build_dependencies(event_logs):
-    task_dependencies = {}
-    for event_log in event_logs:
-        for event in event_log:
-            if event['event'] != 'SCHEDULE':
-                continue
-            task_dependencies[event['taskId']] = event['dependsOn']
-    return task_dependencies
-
-
-def build_tasks(task_dependencies, event_log, task_roots):
-    tasks = []
-    phases = []
-
-    is_driver = False
-    task_id = None
-    phase = 0
-    depends_on = []
-    submits = []
-    creates = []
-    cur_time = 0
-
-    for event in event_log:
-        event_type = event['event']
-        if event_type == 'SCHEDULE':
-            schedule = {'taskId': event['taskId']}
-            if cur_time == 0:
-                # This is the very first task scheduled, by the driver.
-                offset = 0
-            else:
-                offset = event['time'] - cur_time
-            schedule['timeOffset'] = offset
-            submits.append(schedule)
-        elif event_type == 'DRIVER_BEGIN':
-            assert(task_id == None)
-            cur_time = event['time']
-            is_driver = True
-            print "Program began at ", cur_time
-        elif event_type == 'BEGIN':
-            phases = []
-            task_id = event['taskId']
-            phase = 0
-            depends_on = task_dependencies[task_id]
-            submits = []
-            creates = []
-            cur_time = event['time']
-        elif event_type == 'PHASE_END':
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
-        elif event_type == 'PHASE_BEGIN':
-            phase += 1
-            depends_on = event['dependsOn']
-            submits = []
-            creates = []
-            cur_time = event['time']
-        elif event_type == 'END':
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
-            tasks.append({
-                'taskId': task_id,
-                'phases': phases,
-                'results': event['results'],
-                })
-        elif event_type == 'PUT':
-            object_id = event['objectId']
-            creates.append({
-                'objectId': event['objectId'],
-                'size': event['size'],
-                'timeOffset': event['time'] - cur_time,
-                })
-        elif event_type == 'DRIVER_END':
-            if not is_driver:
-                continue
-            phases.append({
-                'phaseId': phase,
-                'dependsOn': depends_on,
-                'submits': submits,
-                'duration': event['time'] - cur_time,
-                'creates': creates,
-                })
-            break
-        else:
-            print "Found unexpected event type {0}".format(event_type)
-            sys.exit(-1)
-
-    # The task ID should not be set if this the driver program.
-    if (task_id is None) and (event_log):
-        task_id = ROOT_TASK_ID
-        tasks.append({
-            'taskId': task_id,
-            'phases': phases,
-            'results': [],
-            })
-        task_roots.append(task_id)
-
-    return tasks
-
-def dump_tasks(task_roots, tasks, trace_filename):
-    # There should only be one driver program.
-    if len(task_roots) == 0:
-        print "Error: No task roots found."
-        return
-    if len(task_roots) > 1:
-        print "Error: More than one task root."
-        return
-    # Write out the trace.
-    with open(trace_filename, 'w') as f:
-        f.write(json.dumps({
-            'rootTask': task_roots[0],
-            'tasks': tasks,
-            }, sort_keys=True, indent=4, separators=(',', ': ')))
+def get_task_dependencies(r, task_id):
+    task_id = binascii.unhexlify(task_id)
+    spec = r.hget("TT:{}".format(task_id), 'task_spec')
+    return task_spec_dependencies(spec)
 
 
 if __name__ == '__main__':
     import sys
+    import redis
+    import subprocess32 as subprocess
 
     trace_filename = 'trace.json'
     if len(sys.argv) >= 2:
@@ -242,9 +176,7 @@ if __name__ == '__main__':
     r = redis.StrictRedis()
     event_logs, task_dependencies = read_event_logs(r)
 
-    task_roots, tasks = [], []
-    for event_log in event_logs:
-        tasks += build_tasks(task_dependencies, event_log, task_roots)
-    dump_tasks(task_roots, tasks, trace_filename)
+    num_tasks = stream_trace(event_logs, trace_filename, task_dependencies)
+    print 'Wrote {0} tasks'.format(num_tasks)
 
     p.kill()
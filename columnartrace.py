@@ -0,0 +1,358 @@
+import collections
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+import replaystate
+import tracedecoder
+from interning import intern_id, id_name
+from replaystate import ComputationDescription, Task, TaskPhase, TaskResult, TaskSubmit, ObjectPut
+
+
+################################################################
+#              Columnar binary trace format                    #
+################################################################
+#
+# A columnar trace is a directory of .npy arrays, one per column, that
+# np.load() memory-maps, plus a small header.json. Task and object ids
+# are interned into string tables, so that every reference to a task or
+# an object is an integer index. Variable length lists are stored in CSR
+# form: the items of row i are items[offsets[i]:offsets[i + 1]].
+#
+#   task_name_offsets, task_name_bytes        task id string table
+#   object_name_offsets, object_name_bytes    object id string table
+#   task_phase_offsets                        phases of each task
+#   task_result_offsets, result_object,       results of each task
+#   result_size
+#   phase_duration                            one row per phase
+#   phase_depends_offsets, depends_object     depends_on of each phase
+#   phase_submit_offsets, submit_task,        submits of each phase
+#   submit_time_offset
+#   phase_create_offsets, create_object,      creates of each phase
+#   create_size, create_time_offset
+#
+# Phases are numbered consecutively within a task, so phase p of task i is
+# row task_phase_offsets[i] + p of the phase columns.
+
+FORMAT_NAME = 'columnar-trace'
+FORMAT_VERSION = 1
+HEADER_FILENAME = 'header.json'
+
+COLUMNS = [
+    'task_name_offsets', 'task_name_bytes',
+    'object_name_offsets', 'object_name_bytes',
+    'task_phase_offsets',
+    'task_result_offsets', 'result_object', 'result_size',
+    'phase_duration',
+    'phase_depends_offsets', 'depends_object',
+    'phase_submit_offsets', 'submit_task', 'submit_time_offset',
+    'phase_create_offsets', 'create_object', 'create_size', 'create_time_offset',
+]
+
+
+def is_columnar_trace(path):
+    return os.path.isfile(os.path.join(path, HEADER_FILENAME))
+
+
+def columnar_trace_files(path):
+    """The header and column files that make up a columnar trace."""
+    return ([os.path.join(path, HEADER_FILENAME)] +
+            [os.path.join(path, name + '.npy') for name in COLUMNS])
+
+
+def columnar_trace_path(trace_filename):
+    """Default output directory for converting trace_filename."""
+    base = trace_filename
+    for suffix in ['.gz', '.json']:
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return base + '.columnar'
+
+
+class _StringTableBuilder():
+    def __init__(self):
+        self.index = {}
+        self.names = []
+
+    def intern(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.index[name] = i
+            self.names.append(name)
+        return i
+
+    def columns(self):
+        encoded = [id_name(name) for name in self.names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        data = np.frombuffer(''.join(encoded), dtype=np.uint8)
+        return (offsets, data)
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def trace_columns(computation):
+    """The columns of a ComputationDescription, as a dict from column name
+       to array, and the header of its columnar trace."""
+    tasks = [computation.get_task(task_id) for task_id in computation.get_task_ids()]
+    task_names = _StringTableBuilder()
+    for task in tasks:
+        task_names.intern(task.id())
+    object_names = _StringTableBuilder()
+
+    task_num_phases = []
+    task_num_results = []
+    result_object = []
+    result_size = []
+    phase_duration = []
+    phase_num_depends = []
+    depends_object = []
+    phase_num_submits = []
+    submit_task = []
+    submit_time_offset = []
+    phase_num_creates = []
+    create_object = []
+    create_size = []
+    create_time_offset = []
+    for task in tasks:
+        task_num_phases.append(task.num_phases())
+        for phase_id in xrange(task.num_phases()):
+            phase = task.get_phase(phase_id)
+            phase_duration.append(phase.duration)
+            phase_num_depends.append(len(phase.depends_on))
+            depends_object.extend(object_names.intern(object_id) for object_id in phase.depends_on)
+            phase_num_submits.append(len(phase.submits))
+            for submit in phase.submits:
+                submit_task.append(task_names.index[submit.task_id])
+                submit_time_offset.append(submit.time_offset)
+            phase_num_creates.append(len(phase.creates))
+            for put in phase.creates:
+                create_object.append(object_names.intern(put.object_id))
+                create_size.append(put.size)
+                create_time_offset.append(put.time_offset)
+        results = task.get_results()
+        task_num_results.append(len(results))
+        for result in results:
+            result_object.append(object_names.intern(result.object_id))
+            result_size.append(result.size)
+
+    columns = {}
+    (columns['task_name_offsets'], columns['task_name_bytes']) = task_names.columns()
+    (columns['object_name_offsets'], columns['object_name_bytes']) = object_names.columns()
+    columns['task_phase_offsets'] = _offsets(task_num_phases)
+    columns['task_result_offsets'] = _offsets(task_num_results)
+    columns['result_object'] = np.array(result_object, dtype=np.int32)
+    columns['result_size'] = np.array(result_size, dtype=np.int64)
+    columns['phase_duration'] = np.array(phase_duration, dtype=np.float64)
+    columns['phase_depends_offsets'] = _offsets(phase_num_depends)
+    columns['depends_object'] = np.array(depends_object, dtype=np.int32)
+    columns['phase_submit_offsets'] = _offsets(phase_num_submits)
+    columns['submit_task'] = np.array(submit_task, dtype=np.int32)
+    columns['submit_time_offset'] = np.array(submit_time_offset, dtype=np.float64)
+    columns['phase_create_offsets'] = _offsets(phase_num_creates)
+    columns['create_object'] = np.array(create_object, dtype=np.int32)
+    columns['create_size'] = np.array(create_size, dtype=np.int64)
+    columns['create_time_offset'] = np.array(create_time_offset, dtype=np.float64)
+
+    root_task = computation.get_root_task()
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'num_tasks': len(tasks),
+        'num_phases': len(phase_duration),
+        'num_objects': len(object_names.names),
+        'root_task': -1 if root_task is None else task_names.index[root_task.id()],
+        'is_combined': bool(getattr(computation, 'is_combined', False)),
+    }
+    return (columns, header)
+
+
+def write_columnar_trace(computation, path):
+    """Write a ComputationDescription as a columnar trace directory."""
+    (columns, header) = trace_columns(computation)
+
+    # write to a scratch directory first so that readers never see a
+    # partially written trace
+    tmp_path = path.rstrip('/') + '.tmp{}'.format(os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for name in COLUMNS:
+        np.save(os.path.join(tmp_path, name + '.npy'), columns[name])
+    with open(os.path.join(tmp_path, HEADER_FILENAME), 'w') as f:
+        json.dump(header, f, indent=2, sort_keys=True)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+class ColumnarTrace():
+    """The columns of a columnar trace, memory-mapped unless mmap is False.
+       Builds model objects for one task at a time."""
+
+    def __init__(self, path, mmap=True):
+        with open(os.path.join(path, HEADER_FILENAME), 'r') as f:
+            header = json.load(f)
+        if header.get('format') != FORMAT_NAME or header.get('version') != FORMAT_VERSION:
+            raise replaystate.ValidationError('Unsupported columnar trace {} version {}'.format(
+                header.get('format'), header.get('version')))
+        self.path = path
+        self.num_tasks = header['num_tasks']
+        self.num_phases = header['num_phases']
+        self.num_objects = header['num_objects']
+        self.root_task = header['root_task']
+        self.is_combined = header['is_combined']
+        mmap_mode = 'r' if mmap else None
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode))
+        self.task_names = self._decode_names(self.task_name_offsets, self.task_name_bytes)
+        # object names are decoded on first use
+        self._object_names = [None] * self.num_objects
+        self._object_name_data = None
+        # shares identical depends_on tuples among the tasks built
+        self._dependency_lists = {}
+
+    @staticmethod
+    def _decode_names(offsets, data):
+        data = data.tostring()
+        offsets = offsets.tolist()
+        return [intern_id(data[offsets[i]:offsets[i + 1]]) for i in xrange(len(offsets) - 1)]
+
+    def object_name(self, i):
+        name = self._object_names[i]
+        if name is None:
+            if self._object_name_data is None:
+                self._object_name_data = self.object_name_bytes.tostring()
+            name = intern_id(self._object_name_data[self.object_name_offsets[i]:self.object_name_offsets[i + 1]])
+            self._object_names[i] = name
+        return name
+
+    def columns(self):
+        """The columns as a dict from column name to array."""
+        return dict((name, getattr(self, name)) for name in COLUMNS)
+
+    def _object_names_at(self, indices):
+        return [self.object_name(i) for i in indices.tolist()]
+
+    def build_task(self, i):
+        phases = []
+        first_phase = int(self.task_phase_offsets[i])
+        last_phase = int(self.task_phase_offsets[i + 1])
+        for p in xrange(first_phase, last_phase):
+            start, end = self.phase_depends_offsets[p:p + 2].tolist()
+            depends_on = self._object_names_at(self.depends_object[start:end])
+            start, end = self.phase_submit_offsets[p:p + 2].tolist()
+            submits = [TaskSubmit(self.task_names[task], time_offset)
+                       for (task, time_offset) in zip(self.submit_task[start:end].tolist(),
+                                                      self.submit_time_offset[start:end].tolist())]
+            start, end = self.phase_create_offsets[p:p + 2].tolist()
+            creates = [ObjectPut(self.object_name(obj), size, time_offset)
+                       for (obj, size, time_offset) in zip(self.create_object[start:end].tolist(),
+                                                           self.create_size[start:end].tolist(),
+                                                           self.create_time_offset[start:end].tolist())]
+            phases.append(TaskPhase(p - first_phase, depends_on, submits,
+                                    float(self.phase_duration[p]), creates,
+                                    self._dependency_lists))
+        start, end = self.task_result_offsets[i:i + 2].tolist()
+        results = [TaskResult(self.object_name(obj), size)
+                   for (obj, size) in zip(self.result_object[start:end].tolist(),
+                                          self.result_size[start:end].tolist())]
+        return Task(self.task_names[i], phases, results)
+
+
+class LazyTaskMap(collections.MutableMapping):
+    """Mapping from task id to Task that builds each Task from a
+       ColumnarTrace the first time it is looked up."""
+
+    def __init__(self, trace):
+        self._trace = trace
+        # task id -> row in the trace, or None for tasks set directly
+        self._index = dict((name, i) for (i, name) in enumerate(trace.task_names))
+        self._tasks = {}
+
+    def __getitem__(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = self._trace.build_task(self._index[task_id])
+            self._tasks[task_id] = task
+        return task
+
+    def __setitem__(self, task_id, task):
+        self._index[task_id] = None
+        self._tasks[task_id] = task
+
+    def __delitem__(self, task_id):
+        del self._index[task_id]
+        self._tasks.pop(task_id, None)
+
+    def __contains__(self, task_id):
+        return task_id in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def num_materialized(self):
+        return len(self._tasks)
+
+
+class ColumnarComputationDescription(ComputationDescription):
+    """ComputationDescription backed by a columnar trace. Tasks and their
+       phases are built on demand by get_task()."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._tasks = LazyTaskMap(trace)
+        if trace.root_task < 0:
+            self._root_task = None
+            self.is_combined = False
+            return
+        self._root_task = trace.task_names[trace.root_task]
+        self._tasks[self._root_task].is_root = True
+        if trace.is_combined:
+            self.mark_combined()
+        else:
+            self.is_combined = False
+
+
+def load_columnar_trace(path, mmap=True):
+    return ColumnarComputationDescription(ColumnarTrace(path, mmap))
+
+
+def load_json_trace(trace_filename):
+    (computation, _) = tracedecoder.decode_trace(trace_filename)
+    return computation
+
+
+def load_trace(trace_filename):
+    """Load a JSON trace, gzipped or not, or a columnar trace directory."""
+    if is_columnar_trace(trace_filename):
+        return load_columnar_trace(trace_filename)
+    return load_json_trace(trace_filename)
+
+
+def usage():
+    print 'Usage: python columnartrace.py input.json[.gz] [output.columnar]'
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [2, 3]:
+        usage()
+        sys.exit(-1)
+    trace_filename = sys.argv[1]
+    if len(sys.argv) == 3:
+        output_path = sys.argv[2]
+    else:
+        output_path = columnar_trace_path(trace_filename)
+    write_columnar_trace(load_json_trace(trace_filename), output_path)
+    print 'wrote {}'.format(output_path)
@@ -8,83 +8,86 @@ from replaystate import TaskPhase
 from replaystate import TaskResult
 from replaystate import Task
 from replaystate import ComputationDescription
-from replaystate import computation_decoder
+from replaystate import make_computation_decoder
+from interning import intern_id
 
 
 MAX_ID = 2**64
 
-def replace_object_id(computation, old_object_id, new_object_id):
+def remap_ids(computation, task_id_map, object_id_map):
     """
-    Replace all instances of old_object_id with new_object_id in the computation.
+    Replace the task IDs in task_id_map and the object IDs in object_id_map,
+    both from old to new ID, everywhere in the computation, in a single pass
+    over its tasks.
     """
-    old_object_id = str(old_object_id)
-    new_object_id = str(new_object_id)
-    replaced_task_created = False
-    # Replace the old object ID inside any tasks that depend on the object.
-    for task in computation._tasks.itervalues():
+    task_id_map = dict((intern_id(old), intern_id(new))
+                       for old, new in task_id_map.iteritems())
+    object_id_map = dict((intern_id(old), intern_id(new))
+                         for old, new in object_id_map.iteritems())
+    new_object_ids = set(object_id_map.itervalues())
+    # Tasks that created each replaced object, which must be exactly one, and
+    # the replaced tasks that were submitted, which must be all but the root.
+    creators = {}
+    submitted = set()
+
+    def replace_created(task, put_or_result):
+        object_id = put_or_result.object_id
+        if object_id in new_object_ids:
+            raise Exception("Found an object with the new object ID {} in "
+                            "task {}".format(object_id, task.id()))
+        if object_id not in object_id_map:
+            return
+        if object_id in creators:
+            raise Exception("Object can only be created by a single "
+                    "task, but found a second task {} that created "
+                    "{}".format(task.id(), object_id))
+        creators[object_id] = task.id()
+        put_or_result.object_id = object_id_map[object_id]
+
+    for task in computation._tasks.values():
         for i in range(task.num_phases()):
             phase = task.get_phase(i)
-            if old_object_id in phase.depends_on:
-                phase.depends_on.remove(old_object_id)
-                phase.depends_on.append(new_object_id)
+            if any(object_id in object_id_map for object_id in phase.depends_on):
+                # depends_on tuples may be shared between phases, so replace
+                # rather than update them
+                phase.depends_on = tuple(object_id_map.get(object_id, object_id)
+                                         for object_id in phase.depends_on)
+            for task_submit in phase.submits:
+                if task_submit.task_id in task_id_map:
+                    submitted.add(task_submit.task_id)
+                    task_submit.task_id = task_id_map[task_submit.task_id]
             for put in phase.creates:
-                if put.object_id == new_object_id:
-                    raise Exception("Found a put with the new object ID {} in "
-                                    "task {}".format(new_object_id, task.id()))
-                if put.object_id != old_object_id:
-                    continue
-                # If this phase created the object through a put, replace the
-                # old object ID.
-                if replaced_task_created:
-                    raise Exception("Object can only be created by a single "
-                            "task, but found a second task {} that put "
-                            "{}".format(task.id(), old_object_id))
-                put.object_id = new_object_id
-                replaced_task_created = True
-        # If this task created the object by returning it, replace the old
-        # object ID.
+                replace_created(task, put)
         for result in task.get_results():
-            if result.object_id == new_object_id:
-                raise Exception("Found a return value with the new object ID {} "
-                                "in task {}".format(new_object_id, task.id()))
-            if result.object_id != old_object_id:
-                continue
-            if replaced_task_created:
-                raise Exception("Object can only be created by a single "
-                        "task, but found a second task {} that returned "
-                        "{}".format(task.id(), old_object_id))
-            result.object_id = new_object_id
-            replaced_task_created = True
-    if not replaced_task_created:
-        raise Exception("Object {} not created by this "
-                        "computation?".format(old_object_id))
+            replace_created(task, result)
+
+    for object_id in object_id_map:
+        if object_id not in creators:
+            raise Exception("Object {} not created by this "
+                            "computation?".format(object_id))
+    for old_task_id, new_task_id in task_id_map.iteritems():
+        task = computation._tasks.pop(old_task_id)
+        task._task_id = new_task_id
+        computation._tasks[new_task_id] = task
+        if computation._root_task == old_task_id:
+            computation._root_task = new_task_id
+        elif old_task_id not in submitted:
+            # The task was neither the root task, nor was it submitted by any
+            # other task. This is a fatal error in the computation graph.
+            raise Exception("Task {} was not root task, nor was it submitted "
+                            "by any other task.".format(old_task_id))
+
+def replace_object_id(computation, old_object_id, new_object_id):
+    """
+    Replace all instances of old_object_id with new_object_id in the computation.
+    """
+    remap_ids(computation, {}, {old_object_id: new_object_id})
 
 def replace_task_id(computation, old_task_id, new_task_id):
     """
     Replace all instances of old_task_id with new_task_id in the computation.
     """
-    # Replace ID of the matching Task instance with the new task ID.
-    task = computation._tasks.pop(old_task_id)
-    task._task_id = new_task_id
-    computation._tasks[new_task_id] = task
-    # If this is the root task, replace the computation's root task attribute.
-    if computation._root_task == old_task_id:
-        computation._root_task = new_task_id
-        return
-    # Else, we have to replace the ID inside the task that submitted this task.
-    # There should only be one, so we can return once we've found it.
-    for task in computation._tasks.itervalues():
-        for i in range(task.num_phases()):
-            phase = task.get_phase(i)
-            for task_submit in phase.submits:
-                if task_submit.task_id == old_task_id:
-                    task_submit.task_id = new_task_id
-                    return
-    # If we're able to reach this line, the task was neither the root task, nor
-    # was it submitted by any other task. This is a fatal error in the
-    # computation graph.
-    raise Exception("Task {} was not root task, nor was it submitted by any "
-                    "other task.".format(old_task_id))
+    remap_ids(computation, {old_task_id: new_task_id}, {})
 
 def get_task_ids(computation):
     """
@@ -108,11 +111,15 @@ def get_object_ids(computation):
     assert(len(object_ids) == len(set(object_ids)))
     return object_ids
 
-def insert_unique_id(ids):
-    new_id = str(random.randint(0, MAX_ID))
-    while new_id in ids:
-        new_id = str(random.randint(0, MAX_ID))
-    ids.append(new_id)
+def insert_unique_id(ids, reserved=()):
+    """
+    Add a random ID that is neither in the set ids nor in reserved to ids,
+    and return it.
+    """
+    new_id = intern_id(random.randint(0, MAX_ID))
+    while new_id in ids or new_id in reserved:
+        new_id = intern_id(random.randint(0, MAX_ID))
+    ids.add(new_id)
     return new_id
 
 
@@ -122,34 +129,36 @@ def merge_computation(computation1, computation2, offset,
     """
     Merge computation2 into computation1. Each computation is an instance of
     ComputationDescription. Returns a tuple of (task_ids, object_ids). These
-    are lists of all task IDs and object IDs, respectively, used by the merged
-    computation. computation2 will get merged into computation1 as a task that
-    gets called by computation1's driver at time offset `offset`.
+    are sets of all task IDs and object IDs, respectively, used by the merged
+    computation, and are updated in place. computation2 will get merged into
+    computation1 as a task that gets called by computation1's driver at time
+    offset `offset`.
     """
     computation2_task_ids = get_task_ids(computation2)
     computation2_object_ids = get_object_ids(computation2)
 
-    # Replace all task IDs in computation2 that appear in computation1 with a
-    # new task ID.
+    # Map the task IDs in computation2 that appear in computation1 to new task
+    # IDs, unique in both computations.
+    task_id_map = {}
+    reserved = set(computation2_task_ids)
     for task_id in computation2_task_ids:
         if task_id not in computation1_task_ids:
-            computation1_task_ids.append(task_id)
+            computation1_task_ids.add(task_id)
             continue
-        # Task ID collision. Replace all instances of task_id in computation2
-        # with a unique task ID.
-        new_task_id = insert_unique_id(computation1_task_ids)
-        replace_task_id(computation2, task_id, new_task_id)
+        task_id_map[task_id] = insert_unique_id(computation1_task_ids, reserved)
 
-    # Replace all object IDs in computation2 that appear in computation1 with a
-    # new object ID.
+    # Likewise for object IDs.
+    object_id_map = {}
+    reserved = set(computation2_object_ids)
     for object_id in computation2_object_ids:
         if object_id not in computation1_object_ids:
-            computation1_object_ids.append(object_id)
+            computation1_object_ids.add(object_id)
             continue
-        # Object ID collision. Replace all instances of object_id in computation2
-        # with a unique object ID.
-        new_object_id = insert_unique_id(computation1_object_ids)
-        replace_object_id(computation2, object_id, new_object_id)
+        object_id_map[object_id] = insert_unique_id(computation1_object_ids, reserved)
+
+    # Replace all colliding IDs in computation2 at once.
+    if task_id_map or object_id_map:
+        remap_ids(computation2, task_id_map, object_id_map)
 
     # Merge in all of computation2's tasks into computation1.
     for task_id, task in computation2._tasks.iteritems():
@@ -159,7 +168,7 @@ def merge_computation(computation1, computation2, offset,
     # root task's first phase.
     root_task = computation1._tasks[computation1._root_task]
     phase0 = root_task.get_phase(0)
-    phase0.submits.append(TaskSubmit(computation2._root_task, offset))
+    phase0.submits += (TaskSubmit(computation2._root_task, offset),)
 
     # Make sure computation1 waits for computation2 to finish by generating a
     # result object for computation2 that computation1 will depend on in its
@@ -168,7 +177,7 @@ def merge_computation(computation1, computation2, offset,
     root_task2 = computation2._tasks[computation2._root_task]
     root_task2.add_result(TaskResult(result_id, 0))
     root_last_phase = root_task.get_phase(1)
-    root_last_phase.depends_on.append(result_id)
+    root_last_phase.depends_on += (result_id,)
 
     return computation1_task_ids, computation1_object_ids
 
@@ -190,14 +199,13 @@ def merge_computations(computations, offsets):
     computation.mark_combined()
 
     # Merge the computations into the mock computation.
-    task_ids = get_task_ids(computation)
-    object_ids = get_object_ids(computation)
+    task_ids = set(get_task_ids(computation))
+    object_ids = set(get_object_ids(computation))
     offset = 0
-    while computations:
-        computation_to_merge = computations.pop(0)
-        offset += offsets.pop(0)
-        task_ids, object_ids = merge_computation(computation,
-                computation_to_merge, offset, task_ids, object_ids)
+    for computation_to_merge, computation_offset in zip(computations, offsets):
+        offset += computation_offset
+        merge_computation(computation, computation_to_merge, offset,
+                          task_ids, object_ids)
     return computation
 
 def serialize_computation(computation):
@@ -215,7 +223,7 @@ def serialize_computation(computation):
                 'dependsOn': [str(object_id) for object_id in
                               phase.depends_on],
                 'submits': [{
-                    'taskId': submit.task_id,
+                    'taskId': str(submit.task_id),
                     'timeOffset': submit.time_offset,
                     } for submit in phase.submits],
                 'duration': phase.duration,
@@ -226,7 +234,7 @@ def serialize_computation(computation):
                     } for put in phase.creates],
                 })
         tasks.append({
-            'taskId': task.id(),
+            'taskId': str(task.id()),
             'phases': phases,
             'results': [{
                 'objectId': str(result.object_id),
@@ -234,7 +242,7 @@ def serialize_computation(computation):
                 } for result in task.get_results()],
             })
     json_dict = {
-            'rootTask': computation._root_task,
+            'rootTask': str(computation._root_task),
             'tasks': tasks,
             'is_combined': True,
             }
@@ -275,7 +283,7 @@ if __name__ == '__main__':
             f = open(trace_filename, 'r')
         try:
             computations.append(json.loads(f.read(),
-                                           object_hook=computation_decoder))
+                                           object_hook=make_computation_decoder()))
         finally:
             f.close()
     computation = merge_computations(computations, offsets)
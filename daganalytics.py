@@ -0,0 +1,342 @@
+import argparse
+import os
+
+import numpy as np
+
+import columnartrace
+
+
+################################################################
+#                Vectorized DAG analytics of traces            #
+################################################################
+#
+# DagAnalytics computes the shape of a trace's task graph with NumPy
+# passes over its columns, the CSR arrays of the columnar trace format,
+# without walking the Python model objects. The graph has a node per task
+# phase and an edge
+#
+#   - from each phase to the next phase of its task, after its duration,
+#   - from a phase to the first phase of each task it submits, after the
+#     submit's time offset,
+#   - from the phase producing an object to each phase depending on it,
+#     after the put's time offset, or the phase's duration for results.
+#
+# Unlike ComputationDescription.analyze(), which adds up whole phase
+# durations, this honors the time offsets of submits and puts, so it gives
+# the earliest start time of every phase with unlimited workers and free
+# transfers. From that it derives
+#
+#   - top level: earliest start time of each phase and task,
+#   - bottom level: longest time from the start of each phase and task to
+#     the end of the computation, the usual list scheduling priority,
+#   - the parallelism profile, the number of phases running at each time
+#     of that earliest-start schedule,
+#   - fan-in (object dependencies) and fan-out (consumers of the objects
+#     produced) per task, and their histograms,
+#   - reuse counts, the number of dependencies on each object, and bounds
+#     on the bytes that have to be transferred between nodes.
+#
+# Results are cached in <trace>.analytics.npz next to the trace and are
+# reused as long as the trace file is unchanged.
+
+ANALYTICS_VERSION = 1
+ANALYTICS_SUFFIX = '.analytics.npz'
+
+# arrays saved in the cache, besides the scalar statistics
+ARRAYS = [
+    'task_name_offsets', 'task_name_bytes',
+    'task_top_level', 'task_bottom_level', 'task_fan_in', 'task_fan_out',
+    'phase_top_level', 'phase_bottom_level',
+    'parallelism_times', 'parallelism_width',
+    'object_size', 'object_reuse', 'object_consumer_tasks',
+]
+SCALARS = ['total_work', 'critical_path', 'total_dependency_bytes', 'cross_task_bytes']
+
+
+def analytics_path(trace_filename):
+    return trace_filename.rstrip('/') + ANALYTICS_SUFFIX
+
+
+def _source_stat(trace_filename):
+    """Size and mtime identifying the version of a trace on disk."""
+    if columnartrace.is_columnar_trace(trace_filename):
+        # columnar traces are replaced as a whole, with a new header
+        trace_filename = os.path.join(trace_filename, columnartrace.HEADER_FILENAME)
+    st = os.stat(trace_filename)
+    return np.array([st.st_size, st.st_mtime], dtype=np.float64)
+
+
+def _csr_ranges(offsets, rows):
+    """Indices of all items of the given CSR rows, concatenated."""
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # start of each row's run minus the number of items before it
+    shifts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return shifts + np.arange(total)
+
+
+def _rows_of(offsets):
+    """Row of each item of a CSR array."""
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+class DagAnalytics(object):
+    """DAG shape statistics of one trace. Build it with from_columns() or
+       analyze_trace(), which caches the results."""
+
+    def __init__(self, arrays, scalars):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        for name in SCALARS:
+            setattr(self, name, scalars[name])
+        self._task_index = None
+
+    @classmethod
+    def from_columns(cls, columns):
+        c = dict((name, np.asarray(array)) for (name, array) in columns.iteritems())
+        task_phase_offsets = c['task_phase_offsets']
+        num_tasks = len(task_phase_offsets) - 1
+        duration = c['phase_duration']
+        num_phases = len(duration)
+        num_objects = len(c['object_name_offsets']) - 1
+        phase_task = _rows_of(task_phase_offsets)
+        first_phase = task_phase_offsets[:-1]
+        last_phase = task_phase_offsets[1:] - 1
+
+        # the phase producing each object, and when after the start of that
+        # phase the object is available
+        producer = np.full(num_objects, -1, dtype=np.int64)
+        available = np.zeros(num_objects)
+        object_size = np.zeros(num_objects, dtype=np.int64)
+        create_phase = _rows_of(c['phase_create_offsets'])
+        producer[c['create_object']] = create_phase
+        available[c['create_object']] = c['create_time_offset']
+        object_size[c['create_object']] = c['create_size']
+        result_phase = last_phase[_rows_of(c['task_result_offsets'])]
+        producer[c['result_object']] = result_phase
+        available[c['result_object']] = duration[result_phase]
+        object_size[c['result_object']] = c['result_size']
+
+        depends_phase = _rows_of(c['phase_depends_offsets'])
+        depends_object = c['depends_object']
+        if len(depends_object) and producer[depends_object].min() < 0:
+            raise ValueError('Dependency on an object that no task creates')
+        next_phase = np.nonzero(phase_task[:-1] == phase_task[1:])[0]
+        submit_phase = _rows_of(c['phase_submit_offsets'])
+        src = np.concatenate([next_phase, submit_phase, producer[depends_object]])
+        dst = np.concatenate([next_phase + 1, first_phase[c['submit_task']], depends_phase])
+        delay = np.concatenate([duration[next_phase], c['submit_time_offset'],
+                                available[depends_object]])
+
+        # CSR of the outgoing edges, then Kahn's algorithm one frontier of
+        # phases at a time
+        order = np.argsort(src, kind='mergesort')
+        (src, dst, delay) = (src[order], dst[order], delay[order])
+        out_offsets = np.zeros(num_phases + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_phases), out=out_offsets[1:])
+        in_count = np.bincount(dst, minlength=num_phases)
+        top_level = np.zeros(num_phases)
+        frontier = np.nonzero(in_count == 0)[0]
+        level_edges = []
+        num_sorted = 0
+        while len(frontier):
+            num_sorted += len(frontier)
+            edges = _csr_ranges(out_offsets, frontier)
+            level_edges.append(edges)
+            targets = dst[edges]
+            # the top levels of the frontier are final
+            np.maximum.at(top_level, targets, top_level[src[edges]] + delay[edges])
+            in_count -= np.bincount(targets, minlength=num_phases)
+            frontier = np.unique(targets[in_count[targets] == 0])
+        if num_sorted != num_phases:
+            raise ValueError('Cyclic dependencies')
+        bottom_level = duration.copy()
+        for edges in reversed(level_edges):
+            np.maximum.at(bottom_level, src[edges], delay[edges] + bottom_level[dst[edges]])
+
+        # parallelism of the earliest start schedule
+        busy = duration > 0
+        starts = np.sort(top_level[busy])
+        ends = np.sort(top_level[busy] + duration[busy])
+        times = np.unique(np.concatenate([starts, ends]))
+        width = (np.searchsorted(starts, times, 'right') -
+                 np.searchsorted(ends, times, 'right'))
+
+        # fan-in and fan-out per task, and object reuse
+        consumer_task = phase_task[depends_phase]
+        object_reuse = np.bincount(depends_object, minlength=num_objects)
+        producer_task = phase_task[producer[depends_object]]
+        task_fan_in = np.bincount(consumer_task, minlength=num_tasks)
+        task_fan_out = np.bincount(producer_task, minlength=num_tasks)
+        # distinct (object, consumer task) pairs, other than the producer
+        pairs = np.unique(depends_object.astype(np.int64) * num_tasks + consumer_task)
+        (pair_object, pair_task) = (pairs // num_tasks, pairs % num_tasks)
+        remote = pair_task != phase_task[producer[pair_object]]
+        object_consumer_tasks = np.bincount(pair_object[remote], minlength=num_objects)
+
+        arrays = {
+            'task_name_offsets': c['task_name_offsets'],
+            'task_name_bytes': c['task_name_bytes'],
+            'task_top_level': top_level[first_phase],
+            'task_bottom_level': bottom_level[first_phase],
+            'task_fan_in': task_fan_in,
+            'task_fan_out': task_fan_out,
+            'phase_top_level': top_level,
+            'phase_bottom_level': bottom_level,
+            'parallelism_times': times,
+            'parallelism_width': width,
+            'object_size': object_size,
+            'object_reuse': object_reuse,
+            'object_consumer_tasks': object_consumer_tasks,
+        }
+        scalars = {
+            'total_work': float(duration.sum()),
+            'critical_path': float((top_level + duration).max()) if num_phases else 0.,
+            'total_dependency_bytes': int(object_size[depends_object].sum()),
+            'cross_task_bytes': int((object_size * object_consumer_tasks).sum()),
+        }
+        return cls(arrays, scalars)
+
+    def save(self, path, source_stat=None):
+        arrays = dict((name, getattr(self, name)) for name in ARRAYS)
+        arrays['scalars'] = np.array([getattr(self, name) for name in SCALARS], dtype=np.float64)
+        arrays['version'] = np.array(ANALYTICS_VERSION)
+        if source_stat is not None:
+            arrays['source_stat'] = source_stat
+        # np.savez appends .npz unless the name already ends with it
+        tmp_path = '{}.tmp{}.npz'.format(path, os.getpid())
+        np.savez(tmp_path, **arrays)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_stat=None):
+        """The saved analytics, or None if they are from another version or,
+           if source_stat is given, of another version of the trace."""
+        with np.load(path) as f:
+            if int(f['version']) != ANALYTICS_VERSION:
+                return None
+            if source_stat is not None and ('source_stat' not in f.files or
+                                            not np.array_equal(f['source_stat'], source_stat)):
+                return None
+            arrays = dict((name, f[name]) for name in ARRAYS)
+            scalars = dict(zip(SCALARS, f['scalars'].tolist()))
+        for name in ['total_dependency_bytes', 'cross_task_bytes']:
+            scalars[name] = int(scalars[name])
+        return cls(arrays, scalars)
+
+    def num_tasks(self):
+        return len(self.task_name_offsets) - 1
+
+    def task_ids(self):
+        data = self.task_name_bytes.tostring()
+        offsets = self.task_name_offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]] for i in xrange(len(offsets) - 1)]
+
+    def task_index(self, task_id):
+        """Row of a task in the per-task arrays."""
+        if self._task_index is None:
+            self._task_index = dict((name, i) for (i, name) in enumerate(self.task_ids()))
+        return self._task_index[str(task_id)]
+
+    def bottom_level(self, task_id):
+        return float(self.task_bottom_level[self.task_index(task_id)])
+
+    def top_level(self, task_id):
+        return float(self.task_top_level[self.task_index(task_id)])
+
+    def max_parallelism(self):
+        return int(self.parallelism_width.max()) if len(self.parallelism_width) else 0
+
+    def average_parallelism(self):
+        return self.total_work / self.critical_path if self.critical_path else 0.
+
+    def fan_in_histogram(self):
+        """Number of tasks with each number of object dependencies."""
+        return np.bincount(self.task_fan_in)
+
+    def fan_out_histogram(self):
+        """Number of tasks with each number of dependencies on their objects."""
+        return np.bincount(self.task_fan_out)
+
+    def reuse_histogram(self):
+        """Number of objects with each number of dependencies on them."""
+        return np.bincount(self.object_reuse)
+
+    def transfer_lower_bound(self, num_nodes):
+        """Bytes that have to be transferred if the tasks consuming each
+           object other than its producer are spread over as many of
+           num_nodes nodes as possible, and the producer shares a node with
+           one of them."""
+        spread = np.minimum(self.object_consumer_tasks, num_nodes)
+        return int((self.object_size * np.maximum(spread - 1, 0)).sum())
+
+    def summary(self, num_nodes=None):
+        summary = {
+            'num_tasks': self.num_tasks(),
+            'num_objects': len(self.object_size),
+            'total_work': self.total_work,
+            'critical_path': self.critical_path,
+            'average_parallelism': self.average_parallelism(),
+            'max_parallelism': self.max_parallelism(),
+            'max_fan_in': int(self.task_fan_in.max()) if self.num_tasks() else 0,
+            'max_fan_out': int(self.task_fan_out.max()) if self.num_tasks() else 0,
+            'max_object_reuse': int(self.object_reuse.max()) if len(self.object_reuse) else 0,
+            'total_dependency_bytes': self.total_dependency_bytes,
+            'cross_task_bytes': self.cross_task_bytes,
+        }
+        if num_nodes is not None:
+            summary['transfer_lower_bound'] = self.transfer_lower_bound(num_nodes)
+        return summary
+
+
+def trace_columns(trace_filename):
+    if columnartrace.is_columnar_trace(trace_filename):
+        return columnartrace.ColumnarTrace(trace_filename).columns()
+    (columns, _) = columnartrace.trace_columns(columnartrace.load_trace(trace_filename))
+    return columns
+
+
+def analyze_trace(trace_filename, use_cache=True):
+    """DagAnalytics of a trace, from the cache next to it if it is up to
+       date. Failing to write the cache is not an error."""
+    path = analytics_path(trace_filename)
+    source_stat = _source_stat(trace_filename)
+    if use_cache and os.path.isfile(path):
+        analytics = DagAnalytics.load(path, source_stat)
+        if analytics is not None:
+            return analytics
+    analytics = DagAnalytics.from_columns(trace_columns(trace_filename))
+    if use_cache:
+        try:
+            analytics.save(path, source_stat)
+        except (IOError, OSError):
+            pass
+    return analytics
+
+
+parser = argparse.ArgumentParser(description="Compute the DAG shape of traces: "
+        "critical path, parallelism, fan-in and fan-out, object reuse and "
+        "transfer volume.")
+parser.add_argument("traces", nargs='+')
+parser.add_argument("--num-nodes", default=None, type=int,
+                    help="Also report the transfer volume lower bound on this many nodes")
+parser.add_argument("--no-cache", action='store_true',
+                    help="Neither read nor write <trace>" + ANALYTICS_SUFFIX)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for trace_filename in args.traces:
+        analytics = analyze_trace(trace_filename, not args.no_cache)
+        print os.path.basename(trace_filename.rstrip('/'))
+        summary = analytics.summary(args.num_nodes)
+        for key in sorted(summary):
+            print '    {:24s} {}'.format(key, summary[key])
+        for (name, histogram) in [('fan_in', analytics.fan_in_histogram()),
+                                  ('fan_out', analytics.fan_out_histogram()),
+                                  ('object_reuse', analytics.reuse_histogram())]:
+            # (value, count) of the nonzero buckets
+            values = np.nonzero(histogram)[0]
+            print '    {:24s} {}'.format(name + '_histogram', zip(values.tolist(), histogram[values].tolist()))
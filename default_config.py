@@ -10,6 +10,8 @@ DB_MESSAGE_DELAY = 0
 
 # Scheduler name. Must match a key in replaytrace.py.
 SCHEDULER_NAME = "trivial"
+# Object cache policy. Must match a key in replaytrace.py.
+CACHE_POLICY = "lru"
 # Keyword arguments for instantiating the schedulers.
 GLOBAL_SCHEDULER_KWARGS = {}
 LOCAL_SCHEDULER_KWARGS = {}
@@ -18,3 +20,16 @@ LOCAL_SCHEDULER_KWARGS = {}
 TRACE_FILENAME = "traces/test/rnn_6layers_w3s2n1_attempt2.json"
 
 ENABLE_VERIFICATION = True
+
+# Pending event queue used by the simulator, either "heap" or "calendar".
+EVENT_QUEUE = "heap"
+
+# If set, profile the replay per event kind and handler, print a summary
+# table and write the profile to this JSON file. Same as passing
+# --profile <filename> to replaytrace.py.
+PROFILE_FILENAME = None
+
+# If positive, replay with the nodes sharded across this many worker
+# processes, synchronized in windows of DB_MESSAGE_DELAY, which must then
+# be positive. Same as passing --pdes <num_shards> to replaytrace.py.
+PDES_NUM_SHARDS = 0
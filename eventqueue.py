@@ -0,0 +1,226 @@
+import heapq
+import itertools
+
+
+################################################################
+#            Pending event queues for EventSimulation          #
+################################################################
+#
+# Entries are (t, seq, event) tuples. Both queues pop entries in
+# (t, seq) order; seq is unique so the event itself is never compared.
+
+class HeapEventQueue(object):
+    """Binary heap of pending events, O(log n) push and pop."""
+
+    def __init__(self):
+        self._heap = []
+
+    def push(self, entry):
+        heapq.heappush(self._heap, entry)
+
+    def pop(self):
+        return heapq.heappop(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class CalendarEventQueue(object):
+    """Calendar queue (R. Brown, CACM 1988) with O(1) amortized push and pop.
+
+       Time is divided into buckets of bucket_width. An event at time t
+       lives in bucket int(t / bucket_width) % num_buckets, so one pass
+       over the buckets covers one "year" of simulated time. The queue
+       doubles or halves the number of buckets as it grows and shrinks,
+       and re-estimates the bucket width from the spacing of the earliest
+       pending events each time it does so.
+
+       Each bucket is a small heap rather than the sorted list of the
+       original paper. Bursts of events at identical times (common with
+       schedule_immediate) land in a single bucket, and a heap keeps those
+       at O(log k) instead of O(k) per operation.
+    """
+
+    MIN_BUCKETS = 2
+    WIDTH_SAMPLE_SIZE = 25
+
+    def __init__(self, num_buckets=MIN_BUCKETS, bucket_width=1.0):
+        self._size = 0
+        self._last_t = 0
+        self._rebuild(num_buckets, bucket_width, [])
+
+    def _rebuild(self, num_buckets, bucket_width, entries):
+        self._num_buckets = num_buckets
+        self._width = float(bucket_width)
+        self._buckets = [[] for _ in xrange(num_buckets)]
+        for entry in entries:
+            self._buckets[int(entry[0] / self._width) % num_buckets].append(entry)
+        for bucket in self._buckets:
+            if len(bucket) > 1:
+                heapq.heapify(bucket)
+        # virtual bucket (i.e., unwrapped bucket index) to start the next
+        # pop's scan from, never past the earliest pending event
+        heads = [bucket[0][0] for bucket in self._buckets if bucket]
+        self._vb = int(min(heads or [self._last_t]) / self._width)
+        self._grow_threshold = 2 * num_buckets
+        if num_buckets > CalendarEventQueue.MIN_BUCKETS:
+            self._shrink_threshold = num_buckets / 2 - 2
+        else:
+            self._shrink_threshold = -1
+
+    def _estimate_width(self, entries):
+        sample = heapq.nsmallest(CalendarEventQueue.WIDTH_SAMPLE_SIZE, entries)
+        separations = [b[0] - a[0] for (a, b) in zip(sample, sample[1:])]
+        separations = [s for s in separations if s > 0]
+        if not separations:
+            return self._width
+        average = sum(separations) / len(separations)
+        # discard outliers, as in Brown's original scheme
+        separations = [s for s in separations if s <= 2 * average]
+        return 3.0 * sum(separations) / len(separations)
+
+    def _resize(self, num_buckets):
+        entries = list(itertools.chain.from_iterable(self._buckets))
+        self._rebuild(num_buckets, self._estimate_width(entries), entries)
+
+    def push(self, entry):
+        vb = int(entry[0] / self._width)
+        heapq.heappush(self._buckets[vb % self._num_buckets], entry)
+        if vb < self._vb:
+            # earlier than the last pop, restart the scan from its bucket
+            self._vb = vb
+        self._size += 1
+        if self._size > self._grow_threshold:
+            self._resize(2 * self._num_buckets)
+
+    def pop(self):
+        if not self._size:
+            raise IndexError('pop from empty calendar queue')
+        buckets = self._buckets
+        num_buckets = self._num_buckets
+        width = self._width
+        vb = self._vb
+        for _ in xrange(num_buckets):
+            bucket = buckets[vb % num_buckets]
+            if bucket and int(bucket[0][0] / width) <= vb:
+                return self._pop_bucket(bucket, vb)
+            vb += 1
+        # Nothing due within a full year, so jump directly to the bucket
+        # holding the earliest event.
+        bucket = min((b for b in buckets if b), key=lambda b: b[0])
+        return self._pop_bucket(bucket, int(bucket[0][0] / width))
+
+    def _pop_bucket(self, bucket, vb):
+        entry = heapq.heappop(bucket)
+        self._size -= 1
+        self._vb = vb
+        self._last_t = entry[0]
+        if self._size < self._shrink_threshold:
+            self._resize(self._num_buckets / 2)
+        return entry
+
+    def __len__(self):
+        return self._size
+
+
+################################################################
+#                 Timing wheel for EventLoop timers            #
+################################################################
+
+class TimingWheel(object):
+    """Hierarchical timing wheel (Varghese & Lauck, SOSP 1987) with O(1)
+       insertion and removal of timers.
+
+       Deadlines are bucketed into ticks of the given resolution. Level k
+       has num_slots slots, each spanning num_slots**k ticks, and holds the
+       timers whose tick first differs from the wheel's current tick in
+       digit k (in base num_slots). Timers too far out for the top level
+       wait in an overflow slot. Each slot is a dict keyed by timer id, so a
+       cancelled timer is deleted immediately rather than left behind.
+
+       Deadlines keep their exact value, the tick only decides placement.
+       pop_earliest() returns every timer sharing the earliest deadline, and
+       the slot it came from is cascaded down to the lower levels.
+    """
+
+    def __init__(self, resolution=0.001, num_slots=64, num_levels=4):
+        if num_slots & (num_slots - 1):
+            raise ValueError('num_slots must be a power of two')
+        self._resolution = float(resolution)
+        self._slot_bits = num_slots.bit_length() - 1
+        self._slot_mask = num_slots - 1
+        self._num_levels = num_levels
+        self._levels = [[{} for _ in xrange(num_slots)] for _ in xrange(num_levels)]
+        self._overflow = {}
+        # slot dict currently holding each timer id
+        self._location = {}
+        self._now_tick = 0
+
+    def __len__(self):
+        return len(self._location)
+
+    def _slot_for(self, tick):
+        diff = tick ^ self._now_tick
+        level = (diff.bit_length() - 1) // self._slot_bits if diff else 0
+        if level >= self._num_levels:
+            return self._overflow
+        return self._levels[level][(tick >> (level * self._slot_bits)) & self._slot_mask]
+
+    def add(self, timer_id, deadline, entry):
+        tick = int(deadline / self._resolution)
+        if tick < self._now_tick:
+            raise ValueError('Timer deadline {} is in the past'.format(deadline))
+        slot = self._slot_for(tick)
+        slot[timer_id] = (deadline, entry)
+        self._location[timer_id] = slot
+
+    def remove(self, timer_id):
+        """Remove a pending timer, returns False if it is not pending."""
+        slot = self._location.pop(timer_id, None)
+        if slot is None:
+            return False
+        del slot[timer_id]
+        return True
+
+    def _earliest_slot(self):
+        for level in xrange(self._num_levels):
+            slots = self._levels[level]
+            digit = (self._now_tick >> (level * self._slot_bits)) & self._slot_mask
+            # level 0 may hold timers in the current tick, higher levels
+            # only hold timers past the current digit
+            if level > 0:
+                digit += 1
+            for index in xrange(digit, len(slots)):
+                if slots[index]:
+                    return slots[index]
+        if self._overflow:
+            return self._overflow
+        return None
+
+    def next_deadline(self):
+        """Earliest pending deadline, or None if no timers are pending."""
+        slot = self._earliest_slot()
+        if slot is None:
+            return None
+        return min(deadline for (deadline, _) in slot.itervalues())
+
+    def pop_earliest(self):
+        """Remove and return the entries of all timers sharing the earliest
+           deadline, ordered by timer id, along with that deadline."""
+        slot = self._earliest_slot()
+        if slot is None:
+            return (None, [])
+        deadline = min(d for (d, _) in slot.itervalues())
+        due = sorted((timer_id, entry) for (timer_id, (d, entry)) in slot.iteritems() if d == deadline)
+        for (timer_id, _) in due:
+            del slot[timer_id]
+            del self._location[timer_id]
+        self._now_tick = int(deadline / self._resolution)
+        # cascade what remains of the slot relative to the new current tick
+        remaining = slot.items()
+        slot.clear()
+        for (timer_id, (d, entry)) in remaining:
+            target = self._slot_for(int(d / self._resolution))
+            target[timer_id] = (d, entry)
+            self._location[timer_id] = target
+        return (deadline, [entry for (_, entry) in due])
@@ -1,27 +1,75 @@
 import logging
+import os
+import weakref
+
+LOGGING_FORMAT = '%(timestamp).6f %(name)s %(message)s'
+
+# TimestampedLoggers whose debug_enabled flag is refreshed by setup_logging
+_timestamped_loggers = weakref.WeakSet()
 
 class TimestampedLogger():
+    """Logger that stamps records with simulated time.
+
+       Messages may be passed as a str.format() template with its arguments,
+       in which case formatting happens only if the record is emitted. Hot
+       call sites should additionally check debug_enabled first, so that a
+       disabled debug statement costs a single attribute lookup:
+
+           if self._pylogger.debug_enabled:
+               self._pylogger.debug('update {}', update)
+    """
+
     def __init__(self, name, system_time):
         self._logger = logging.getLogger(name)
         self._system_time = system_time
+        self.refresh_level()
+        _timestamped_loggers.add(self)
+
+    def refresh_level(self):
+        self.debug_enabled = self._logger.isEnabledFor(logging.DEBUG)
+
+    def _log(self, level, message, args):
+        if args:
+            message = message.format(*args)
+        self._logger.log(level, message, extra={'timestamp':self._system_time.get_time()})
+
+    def debug(self, message, *args):
+        if self.debug_enabled:
+            self._log(logging.DEBUG, message, args)
+
+    def info(self, message, *args):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, message, args)
 
-    def debug(self, message):
-        self._logger.debug(message, extra={'timestamp':self._system_time.get_time()})
+    def warning(self, message, *args):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, message, args)
 
-    def info(self, message):
-        self._logger.info(message, extra={'timestamp':self._system_time.get_time()})
+    def error(self, message, *args):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, message, args)
 
-    def warning(self, message):
-        self._logger.warning(message, extra={'timestamp':self._system_time.get_time()})
+    def critical(self, message, *args):
+        if self._logger.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, message, args)
 
-    def error(self, message):
-        self._logger.error(message, extra={'timestamp':self._system_time.get_time()})
 
-    def critical(self, message):
-        self._logger.critical(message, extra={'timestamp':self._system_time.get_time()})
+def refresh_log_levels():
+    """Propagate logging level changes to existing TimestampedLoggers."""
+    for timestamped_logger in list(_timestamped_loggers):
+        timestamped_logger.refresh_level()
 
 
-def setup_logging():
-    logging_format = '%(timestamp).6f %(name)s %(message)s'
-    logging.basicConfig(format=logging_format)
-    logging.getLogger().setLevel(logging.DEBUG)
+def setup_logging(level=None):
+    """Configure the root logger. The level defaults to the value of the
+       RAY_SCHED_LOG_LEVEL environment variable, or INFO if it is not set.
+    """
+    if level is None:
+        level = os.environ.get('RAY_SCHED_LOG_LEVEL', 'INFO')
+    if not isinstance(level, int):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError('Unknown logging level {}'.format(level))
+    logging.basicConfig(format=LOGGING_FORMAT)
+    logging.getLogger().setLevel(level)
+    refresh_log_levels()
@@ -0,0 +1,49 @@
+################################################################
+#                    Interning of trace ids                    #
+################################################################
+#
+# Task and object ids in traces are long strings. intern_id() maps each
+# id to the interned str of its name, which the simulator uses as a dict
+# key, so that every reference to an id shares one object: dict lookups
+# hit on identity and use the hash str caches, all in C. Ids print,
+# format, sort, pickle and encode as JSON as the string from the trace.
+#
+# There is no table of our own. The interpreter's table of interned
+# strings drops a string once nothing else refers to it, so ids die with
+# the computations that use them, and tools generating millions of ids
+# do not keep them alive for the life of the process. Unpickling, as
+# the trace cache does, gives strings that are not interned, but the
+# pickle memo still shares one string per id within an entry.
+#
+# Workloads composed of many jobs tag every id with its job, as
+# job_id(job, trace_id), so that statistics can be kept per job.
+
+
+def intern_id(trace_id):
+    """The interned id for a task or object id, given as a string or a
+       number."""
+    if type(trace_id) is not str:
+        trace_id = str(trace_id)
+    return intern(trace_id)
+
+
+def id_name(trace_id):
+    """The original string of an id."""
+    return str(trace_id)
+
+
+JOB_SEPARATOR = '/'
+
+
+def job_id(job, trace_id):
+    """The id of trace_id in a workload, tagged with its job."""
+    return '{}{}{}'.format(job, JOB_SEPARATOR, trace_id)
+
+
+def job_of(trace_id):
+    """The job an id is tagged with, or None if it is not tagged."""
+    (job, separator, _) = id_name(trace_id).partition(JOB_SEPARATOR)
+    if not separator:
+        return None
+    return job
+
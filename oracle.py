@@ -5,7 +5,12 @@ import copy
 
 #********** Data Structure (from original ray scheduling prototype)*************************
 
-class Task():
+# the model classes use __slots__ and tuples to keep large traces compact,
+# like the ones in replaystate.py
+
+class Task(object):
+    __slots__ = ('_task_id', '_phases', '_results')
+
     def __init__(self, task_id, phases, results):
         task_id_str = str(task_id)
         if not task_id_str:
@@ -22,8 +27,8 @@ class Task():
 
         # verification passed so initialize
         self._task_id = task_id_str
-        self._phases = phases
-        self._results = results
+        self._phases = tuple(phases)
+        self._results = tuple(results)
 
     def __str__(self):
         return "task_id={}".format(self._task_id)	
@@ -44,7 +49,9 @@ class Task():
         return self._results
 		
 		
-class TaskPhase():
+class TaskPhase(object):
+    __slots__ = ('phase_id', '_depends_on', '_schedules', 'duration', 'creates')
+
     def __init__(self, phase_id, depends_on, schedules, duration, creates=None):
         for s in schedules:
             if s.time_offset > duration:
@@ -52,13 +59,13 @@ class TaskPhase():
 
         # verification passed so initialize
         self.phase_id = phase_id
-        self._depends_on = map(lambda x: str(x), depends_on)
-        self._schedules = schedules
+        self._depends_on = tuple(map(str, depends_on))
+        self._schedules = tuple(schedules)
         self.duration = duration
         if creates is None:
-            self.creates = []
+            self.creates = ()
         else:
-            self.creates = creates
+            self.creates = tuple(creates)
 
     def get_depends_on(self):
         return self._depends_on
@@ -67,7 +74,9 @@ class TaskPhase():
         return self._schedules
 
 
-class TaskResult():
+class TaskResult(object):
+    __slots__ = ('object_id', 'size')
+
     def __init__(self, object_id, size):
         object_id_str = str(object_id)
         if not object_id_str:
@@ -79,7 +88,9 @@ class TaskResult():
         self.object_id = object_id_str
         self.size = size
 
-class TaskSubmit():
+class TaskSubmit(object):
+    __slots__ = ('task_id', 'time_offset')
+
     def __init__(self, task_id, time_offset):
         task_id_str = str(task_id)
         if not task_id_str:
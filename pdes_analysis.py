@@ -0,0 +1,125 @@
+import argparse
+import os
+from collections import defaultdict
+
+import replaystate
+from pdes_replay import PartitionedEventSimulation
+from replaytrace import schedulers, setup_simulation, finish_simulation
+from sim_benchmark import load_trace
+from statslogging import NoopLogger
+
+
+################################################################
+#   Lookahead and parallelism analysis for a node-sharded PDES  #
+################################################################
+#
+# Replays a trace with every event attributed to the partition that would
+# own it if the nodes were sharded across worker processes: node n lives
+# on shard n % num_shards, and the global scheduler with the scheduler
+# database on a shard of its own. The report shows
+#
+# - the lookahead, i.e. the smallest delay of any event one partition
+#   schedules for another, which bounds the width of a conservative
+#   synchronization window,
+# - the object directory lookups that read or subscribe to other nodes'
+#   object state synchronously, which the sharded replay of pdes_replay
+#   turns into delayed messages,
+# - an upper bound on the speedup of a conservative window engine, the
+#   number of events divided by the sum over windows of the busiest
+#   shard's events.
+
+# slack for float rounding when comparing delays, since (t + d) - t != d
+DELAY_TOLERANCE = 1e-9
+
+
+class PartitionTracingEventSimulation(PartitionedEventSimulation):
+    def __init__(self, num_shards):
+        PartitionedEventSimulation.__init__(self, num_shards)
+        # partition owning each queued event, keyed by id(event)
+        self._event_partitions = {}
+        self.event_partitions = []
+        self.cross_partition_delays = defaultdict(list)
+
+    def schedule_event_at(self, t, kind, target, payload=None):
+        event = replaystate.EventSimulation.schedule_event_at(self, t, kind, target, payload)
+        partition = self.target_partition(kind, target, payload)
+        self._event_partitions[id(event)] = partition
+        if partition != self.current_partition:
+            self.cross_partition_delays[(self.current_partition, partition)].append(t - self.get_time())
+        return event
+
+    def _run(self, t, event):
+        self.current_partition = self._event_partitions.pop(id(event))
+        self.event_partitions.append((t, self.current_partition))
+        replaystate.EventSimulation._run(self, t, event)
+
+
+def trace_directory_lookups(object_store, event_simulation):
+    """Count require_object calls that consult other nodes' object state."""
+    remote_lookups = defaultdict(int)
+    require_object = object_store.require_object
+    def traced_require_object(object_id, node_id, on_done):
+        if not object_store.is_locally_ready(object_id, node_id):
+            remote_lookups[event_simulation.current_partition] += 1
+        return require_object(object_id, node_id, on_done)
+    object_store.require_object = traced_require_object
+    return remote_lookups
+
+
+def window_speedup(event_partitions, window):
+    if window <= 0:
+        return (len(event_partitions), 1.0)
+    windows = defaultdict(lambda: defaultdict(int))
+    for (t, partition) in event_partitions:
+        windows[int(t / window)][partition] += 1
+    critical_path = sum(max(counts.itervalues()) for counts in windows.itervalues())
+    return (len(windows), float(len(event_partitions)) / critical_path)
+
+
+def analyze(computation, args):
+    event_simulation = PartitionTracingEventSimulation(args.num_shards)
+    simulation = setup_simulation(computation, schedulers[args.scheduler],
+                                  event_simulation, NoopLogger(event_simulation),
+                                  args.num_nodes, args.num_workers_per_node,
+                                  args.object_transfer_time_cost,
+                                  args.db_message_delay)
+    event_simulation.add_node_event_loops(simulation.local_event_loops)
+    remote_lookups = trace_directory_lookups(simulation.object_store, event_simulation)
+    finish_simulation(simulation)
+
+    print '{} nodes on {} shards plus the global scheduler, {} events'.format(
+        args.num_nodes, args.num_shards, len(event_simulation.event_partitions))
+    all_delays = [d for delays in event_simulation.cross_partition_delays.itervalues() for d in delays]
+    lookahead = min(all_delays) if all_delays else None
+    print '    cross-partition events {}, lookahead {}'.format(
+        len(all_delays), 'none' if lookahead is None else '{:.6g}'.format(lookahead))
+    for ((src, dst), delays) in sorted(event_simulation.cross_partition_delays.items()):
+        short_delays = [d for d in delays if d < args.db_message_delay - DELAY_TOLERANCE]
+        if short_delays:
+            print '    {} events from {} to {} below db_message_delay, min delay {:.6g}'.format(
+                len(short_delays), src, dst, min(short_delays))
+    print '    synchronous remote object directory lookups {}'.format(sum(remote_lookups.values()))
+    windows = [args.db_message_delay]
+    if lookahead is not None and lookahead < args.db_message_delay - DELAY_TOLERANCE:
+        windows.append(lookahead)
+    for window in windows:
+        (num_windows, speedup) = window_speedup(event_simulation.event_partitions, window)
+        print '    window {:.6g}: {} synchronization rounds, speedup bound {:.2f}x'.format(
+            window, num_windows, speedup)
+
+
+parser = argparse.ArgumentParser(description="Estimate the lookahead and "
+        "parallelism available to a node-sharded parallel replay.")
+parser.add_argument("traces", nargs='+')
+parser.add_argument("--num-shards", default=4, type=int)
+parser.add_argument("--scheduler", default='trivial', choices=schedulers.keys())
+parser.add_argument("--num-nodes", default=16, type=int)
+parser.add_argument("--num-workers-per-node", default=4, type=int)
+parser.add_argument("--object-transfer-time-cost", default=.00000001, type=float)
+parser.add_argument("--db-message-delay", default=.001, type=float)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for trace_filename in args.traces:
+        print os.path.basename(trace_filename)
+        analyze(load_trace(trace_filename), args)
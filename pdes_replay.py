@@ -0,0 +1,482 @@
+import cPickle as pickle
+import functools
+import heapq
+import itertools
+import multiprocessing
+import traceback
+from collections import defaultdict
+from cStringIO import StringIO
+
+import replaystate
+import replaytrace
+from eventqueue import HeapEventQueue
+from replaystate import EventKind, NodeRuntime, Task
+from schedulerbase import ObjectStatus
+from interning import id_name
+
+
+################################################################
+#       Conservative parallel replay with nodes in shards       #
+################################################################
+#
+# simulate_sharded() replays a trace with the nodes sharded across worker
+# processes: node n runs in shard n % num_shards, and the global scheduler
+# with the scheduler database in a process of its own. The coordinator,
+# the calling process, runs no events. It advances every shard in
+# conservative windows: the window starts at the earliest pending event
+# or message of any shard, and is db_message_delay wide. Every message
+# between shards carries at least that delay, so no shard can receive an
+# event inside the window it is running. Between windows the coordinator
+# routes the messages and replays the shards' logger calls, in timestamp
+# order, into the caller's logger.
+#
+# Scheduler database updates cross shards as they are. The object
+# directory is replicated instead. A shard learns of every change to
+# another shard's objects db_message_delay after it happened, so when a
+# node requires an object that no node it knows of holds, the copy is
+# started once the object's creation reaches the shard, from the time the
+# serial replay would have started it. Copies therefore finish at the
+# same times as in the serial replay. What differs is
+#
+# - events at the same time run in a different order, so that ties can
+#   be broken differently than in the serial replay,
+# - a copy may come from a different source node, and its use of the
+#   object on a source in another shard is accounted up to two
+#   db_message_delays late,
+# - get_object_size_locations() sees other shards' objects
+#   db_message_delay late.
+#
+# Each shard builds the whole simulation before it forks, then drops the
+# events of other shards, so schedulers need no changes. Profiling is not
+# supported.
+
+GLOBAL_PARTITION = 'global'
+
+
+class PartitionedEventSimulation(replaystate.EventSimulation):
+    """An event simulation that knows which partition owns each event: node
+       n belongs to partition n % num_shards, the global scheduler and the
+       scheduler database to GLOBAL_PARTITION."""
+
+    def __init__(self, num_shards, event_queue_class=HeapEventQueue):
+        replaystate.EventSimulation.__init__(self, event_queue_class)
+        self.num_shards = num_shards
+        self.current_partition = GLOBAL_PARTITION
+        # node id by id() of the node's event loop
+        self._node_event_loops = {}
+
+    def add_node_event_loops(self, local_event_loops):
+        for (node_id, event_loop) in local_event_loops.items():
+            self._node_event_loops[id(event_loop)] = node_id
+
+    def node_partition(self, node_id):
+        return int(node_id) % self.num_shards
+
+    def target_partition(self, kind, target, payload):
+        if isinstance(target, NodeRuntime):
+            return self.node_partition(target.node_id)
+        if kind == EventKind.GLOBAL_SCHEDULER_UPDATE:
+            return GLOBAL_PARTITION
+        if kind == EventKind.LOCAL_SCHEDULER_UPDATE:
+            return self.node_partition(payload.node_id)
+        if kind == EventKind.OBJECT_COPIED:
+            return self.node_partition(payload[3])
+        if kind == EventKind.TIMER:
+            node_id = self._node_event_loops.get(id(target))
+            if node_id is None:
+                return GLOBAL_PARTITION
+            return self.node_partition(node_id)
+        # replies and plain callbacks stay with the partition scheduling them
+        return self.current_partition
+
+
+class ShardedEventSimulation(PartitionedEventSimulation):
+    """The event simulation of one shard. Until start_shard() is called it
+       queues every event, as the serial simulation does, so that the
+       simulation can be set up before the shards fork."""
+
+    def __init__(self, num_shards, event_queue_class=HeapEventQueue):
+        PartitionedEventSimulation.__init__(self, num_shards, event_queue_class)
+        self.partition = None
+        self._window_end = None
+        # (partition, t, target reference, payload) of messages to other shards
+        self.outbox = []
+
+    def start_shard(self, partition):
+        """Drop the queued events of other partitions."""
+        self.partition = partition
+        self.current_partition = partition
+        entries = []
+        while self._scheduled:
+            entries.append(self._scheduled.pop())
+        for entry in entries:
+            event = entry[2]
+            if event.kind == EventKind.CANCELLED:
+                continue
+            # events queued during setup are owned like those scheduled later
+            self.current_partition = GLOBAL_PARTITION
+            owner = self.target_partition(event.kind, event.target, event.payload)
+            self.current_partition = partition
+            if owner == partition:
+                self._scheduled.push(entry)
+
+    def set_time(self, t):
+        """Move the clock of the coordinator, which runs no events."""
+        self._t = t
+
+    def send(self, partition, t, target_ref, payload):
+        if t < self._window_end:
+            raise RuntimeError('Message to partition {} at {} is inside the window ending at {}'.format(
+                partition, t, self._window_end))
+        self.outbox.append((partition, t, target_ref, payload))
+
+    def schedule_event_at(self, t, kind, target, payload=None):
+        if self.partition is not None:
+            partition = self.target_partition(kind, target, payload)
+            if partition != self.partition:
+                self.send(partition, t, (kind, target), payload)
+                # never queued here, so cancelling it has no effect
+                return replaystate.Event(kind, target, payload)
+        return PartitionedEventSimulation.schedule_event_at(self, t, kind, target, payload)
+
+    def next_event_time(self):
+        while self._scheduled:
+            entry = self._scheduled.pop()
+            if entry[2].kind != EventKind.CANCELLED:
+                self._scheduled.push(entry)
+                return entry[0]
+        return None
+
+    def run_window(self, window_end):
+        """Run every event before window_end. Unlike advance_until() the
+           clock stays at the last event run."""
+        self._window_end = window_end
+        while self._scheduled:
+            entry = self._scheduled.pop()
+            if entry[0] >= window_end:
+                self._scheduled.push(entry)
+                break
+            if entry[2].kind != EventKind.CANCELLED:
+                self._run(entry[0], entry[2])
+
+
+class RecordingLogger(object):
+    """Records every logger call with the simulated time it was made at, for
+       the coordinator to replay into the real logger."""
+
+    def __init__(self, system_time):
+        self._system_time = system_time
+        self._seq = itertools.count()
+        self.records = []
+
+    def record_at(self, t, name, *args):
+        self.records.append((t, next(self._seq), name, args))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def record(*args):
+            self.records.append((self._system_time.get_time(), next(self._seq), name, args))
+        setattr(self, name, record)
+        return record
+
+
+class ShardedObjectStoreRuntime(replaystate.ObjectStoreRuntime):
+    """The object store of one shard. The directory entries of other shards'
+       nodes are replicas, updated by messages from those shards. Waiters
+       for objects no known node holds carry the time they started waiting,
+       which is when the serial replay would have started their copy, if
+       the object already existed elsewhere."""
+
+    def _remote_partitions(self):
+        event_simulation = self._event_simulation
+        own_partition = event_simulation.partition
+        return [p for p in range(event_simulation.num_shards) if p != own_partition]
+
+    def _publish(self, object_id, node_id, status, object_size):
+        event_simulation = self._event_simulation
+        if event_simulation.partition is None:
+            return
+        t = event_simulation.get_time()
+        for partition in self._remote_partitions():
+            event_simulation.send(partition, t + self._db_message_delay, 'object_status',
+                                  (object_id, node_id, status, object_size, t))
+
+    def _is_local_node(self, node_id):
+        return self._event_simulation.node_partition(node_id) == self._event_simulation.partition
+
+    def expect_object(self, object_id, node_id):
+        replaystate.ObjectStoreRuntime.expect_object(self, object_id, node_id)
+        self._publish(object_id, node_id, ObjectStatus.EXPECTED, None)
+
+    def add_object(self, object_id, node_id, object_size):
+        self._logger.object_created(object_id, node_id, object_size)
+        self._object_locations[object_id][node_id] = ObjectStatus.READY
+        self._object_sizes[object_id] = object_size
+        self._get_object_cache(node_id).add_object(object_id, object_size)
+        self._yield_object_ready_update(object_id, node_id, object_size)
+        self._publish(object_id, node_id, ObjectStatus.READY, object_size)
+        waiters = self._awaiting_completion.pop(object_id, None)
+        if waiters is not None:
+            for (d_node_id, on_done, _) in waiters:
+                if node_id == d_node_id:
+                    on_done()
+                else:
+                    self._copy_object(object_id, d_node_id, node_id, on_done)
+
+    def require_object(self, object_id, node_id, on_done):
+        object_ready_locations = dict(filter(lambda (node_id, status): status == ObjectStatus.READY, self._object_locations[object_id].items()))
+        if node_id in object_ready_locations:
+            on_done()
+        elif not object_ready_locations:
+            self._awaiting_completion[object_id].append(
+                (node_id, on_done, self._event_simulation.get_time()))
+        else:
+            source_location = list(object_ready_locations.keys())[0]
+            self._copy_object(object_id, node_id, source_location, on_done)
+
+    def _copy_object(self, object_id, dst_node_id, src_node_id, on_done, start=None):
+        event_simulation = self._event_simulation
+        if start is None:
+            start = event_simulation.get_time()
+        if dst_node_id == src_node_id:
+            on_done()
+        elif (object_id, dst_node_id) in self._awaiting_copy:
+            self._awaiting_copy[(object_id, dst_node_id)].append(on_done)
+        elif self._object_locations[object_id].get(src_node_id) == ObjectStatus.READY:
+            if self._is_local_node(src_node_id):
+                self.use_object(object_id, src_node_id)
+            else:
+                event_simulation.send(event_simulation.node_partition(src_node_id),
+                                      event_simulation.get_time() + self._db_message_delay,
+                                      'object_use', (object_id, src_node_id))
+            object_size = self._object_sizes[object_id]
+            data_transfer_time = self._db_message_delay + object_size * self._data_transfer_time_cost
+            self._logger.record_at(start, 'object_transfer_started', object_id, object_size, src_node_id, dst_node_id)
+            self._awaiting_copy[(object_id, dst_node_id)].append(on_done)
+            event_simulation.schedule_event_at(start + data_transfer_time, EventKind.OBJECT_COPIED,
+                                               self, (object_id, object_size, src_node_id, dst_node_id))
+        else:
+            raise RuntimeError('Unexpected failure to copy object {} to {} from {}'.format(object_id, dst_node_id, src_node_id))
+
+    def _object_copied(self, object_id, object_size, src_node_id, dst_node_id):
+        self._publish(object_id, dst_node_id, ObjectStatus.READY, object_size)
+        replaystate.ObjectStoreRuntime._object_copied(self, object_id, object_size, src_node_id, dst_node_id)
+
+    def _remote_object_status(self, object_id, node_id, status, object_size, t):
+        """Apply a directory change made at time t in another shard."""
+        locations = self._object_locations[object_id]
+        if status != ObjectStatus.READY:
+            if locations.get(node_id) != ObjectStatus.READY:
+                locations[node_id] = status
+            return
+        locations[node_id] = ObjectStatus.READY
+        self._object_sizes[object_id] = object_size
+        waiters = self._awaiting_completion.pop(object_id, None)
+        if waiters is not None:
+            for (d_node_id, on_done, wait_start) in waiters:
+                self._copy_object(object_id, d_node_id, node_id, on_done, max(wait_start, t))
+
+    def _remote_object_use(self, object_id, node_id):
+        self.use_object(object_id, node_id)
+
+
+class _Shard():
+    """Runs one partition of a simulation in a worker process."""
+
+    def __init__(self, simulation, partition, conn):
+        self._simulation = simulation
+        self._event_simulation = simulation.event_simulation
+        self._partition = partition
+        self._conn = conn
+        self._computation = simulation.computation
+
+    def _handlers(self, kind, update):
+        scheduler_db = self._simulation.scheduler_db
+        if kind == EventKind.GLOBAL_SCHEDULER_UPDATE:
+            return scheduler_db._global_scheduler_update_handlers
+        return scheduler_db._local_scheduler_update_handlers[str(update.node_id)]
+
+    def _encode(self, target_ref, payload):
+        if isinstance(target_ref, str):
+            return (target_ref, payload)
+        (kind, target) = target_ref
+        if kind not in (EventKind.GLOBAL_SCHEDULER_UPDATE, EventKind.LOCAL_SCHEDULER_UPDATE):
+            raise RuntimeError('Event {} cannot cross shards'.format(EventKind.NAMES[kind]))
+        return ((kind, self._handlers(kind, payload).index(target)), payload)
+
+    def _deliver(self, t, target_ref, payload):
+        event_simulation = self._event_simulation
+        object_store = self._simulation.object_store
+        if target_ref == 'object_status':
+            event_simulation.schedule_event_at(t, EventKind.CALLBACK,
+                functools.partial(object_store._remote_object_status, *payload))
+        elif target_ref == 'object_use':
+            event_simulation.schedule_event_at(t, EventKind.CALLBACK,
+                functools.partial(object_store._remote_object_use, *payload))
+        else:
+            (kind, index) = target_ref
+            event_simulation.schedule_event_at(t, kind, self._handlers(kind, payload)[index], payload)
+
+    def _num_workers_executing(self):
+        return sum(runtime.num_workers_executing
+                   for (node_id, runtime) in self._simulation.local_runtimes.items()
+                   if self._event_simulation.node_partition(node_id) == self._partition)
+
+    def run(self):
+        event_simulation = self._event_simulation
+        logger = self._simulation.logger
+        event_simulation.start_shard(self._partition)
+        del logger.records[:]
+        self._send(event_simulation.next_event_time())
+        while True:
+            (command, window_end, messages) = self._recv()
+            if command == 'finish':
+                self._send((self._num_workers_executing(), event_simulation.get_time()))
+                return
+            for (t, _, _, target_ref, payload) in messages:
+                self._deliver(t, target_ref, payload)
+            event_simulation.run_window(window_end)
+            outbox = [(partition, t, self._encode(target_ref, payload))
+                      for (partition, t, target_ref, payload) in event_simulation.outbox]
+            del event_simulation.outbox[:]
+            records = list(logger.records)
+            del logger.records[:]
+            self._send((outbox, records, event_simulation.next_event_time()))
+
+    def _send(self, message):
+        self._conn.send_bytes(_dumps(self._computation, ('ok', message)))
+
+    def _recv(self):
+        return _loads(self._computation, self._conn.recv_bytes())
+
+
+# Tasks are sent by id and resolved against the receiver's copy of the
+# computation, which every process has.
+
+def _dumps(computation, message):
+    f = StringIO()
+    pickler = pickle.Pickler(f, 2)
+    def persistent_id(obj):
+        if isinstance(obj, Task):
+            return id_name(obj.id())
+        return None
+    pickler.persistent_id = persistent_id
+    pickler.dump(message)
+    return f.getvalue()
+
+def _loads(computation, data):
+    unpickler = pickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = computation.get_task
+    return unpickler.load()
+
+
+def _run_shard(simulation, partition, conn):
+    try:
+        _Shard(simulation, partition, conn).run()
+    except Exception:
+        try:
+            conn.send_bytes(_dumps(simulation.computation, ('error', traceback.format_exc())))
+        except IOError:
+            # the coordinator has gone away
+            pass
+    finally:
+        conn.close()
+
+
+def simulate_sharded(computation, scheduler_cls, event_simulation, logger, num_nodes,
+                     num_workers_per_node, object_transfer_time_cost, db_message_delay,
+                     global_scheduler_kwargs=None, local_scheduler_kwargs=None,
+                     enable_analysis=False, cache_policy_class=replaystate.NoopObjectCache):
+    """Like replaytrace.simulate(), with the nodes sharded across
+       event_simulation.num_shards worker processes. event_simulation is a
+       ShardedEventSimulation, whose clock the coordinator moves as it
+       replays the shards' logger calls into logger."""
+    if db_message_delay <= 0:
+        raise ValueError('A sharded replay needs a positive db_message_delay as lookahead')
+    event_simulation.num_shards = max(1, min(event_simulation.num_shards, num_nodes))
+    recorder = RecordingLogger(event_simulation)
+    simulation = replaytrace.setup_simulation(computation, scheduler_cls, event_simulation,
+                                              recorder, num_nodes, num_workers_per_node,
+                                              object_transfer_time_cost, db_message_delay,
+                                              global_scheduler_kwargs, local_scheduler_kwargs,
+                                              cache_policy_class, ShardedObjectStoreRuntime)
+    event_simulation.add_node_event_loops(simulation.local_event_loops)
+    partitions = [GLOBAL_PARTITION] + range(event_simulation.num_shards)
+
+    # logger calls by (t, source, seq, name, args), where the coordinator's
+    # own calls made during setup come first
+    records = [(t, -1, seq, name, args) for (t, seq, name, args) in recorder.records]
+    heapq.heapify(records)
+    del recorder.records[:]
+
+    conns = {}
+    processes = []
+    try:
+        for partition in partitions:
+            (parent_conn, child_conn) = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_shard,
+                                              args=(simulation, partition, child_conn))
+            process.start()
+            child_conn.close()
+            conns[partition] = parent_conn
+            processes.append(process)
+
+        def recv(partition):
+            (status, message) = _loads(computation, conns[partition].recv_bytes())
+            if status != 'ok':
+                raise RuntimeError('Shard {} failed:\n{}'.format(partition, message))
+            return message
+
+        def send(partition, message):
+            conns[partition].send_bytes(_dumps(computation, message))
+
+        def replay_records(horizon):
+            while records and (horizon is None or records[0][0] < horizon):
+                (t, _, _, name, args) = heapq.heappop(records)
+                event_simulation.set_time(t)
+                getattr(logger, name)(*args)
+
+        next_times = dict((partition, recv(partition)) for partition in partitions)
+        # messages by destination, as (t, source, seq, target, payload)
+        pending = defaultdict(list)
+        while True:
+            times = [t for t in next_times.values() if t is not None]
+            times.extend(message[0] for messages in pending.values() for message in messages)
+            if not times:
+                break
+            window_start = min(times)
+            window_end = window_start + db_message_delay
+            # later logger calls are made at window_start - db_message_delay or after
+            replay_records(window_start - db_message_delay)
+            active = [partition for partition in partitions
+                      if pending[partition] or (next_times[partition] is not None and
+                                                next_times[partition] < window_end)]
+            for partition in active:
+                messages = sorted(pending.pop(partition, []))
+                send(partition, ('window', window_end, messages))
+            for partition in active:
+                source = partitions.index(partition)
+                (outbox, shard_records, next_times[partition]) = recv(partition)
+                for (seq, (destination, t, (target_ref, payload))) in enumerate(outbox):
+                    pending[destination].append((t, source, seq, target_ref, payload))
+                for (t, seq, name, args) in shard_records:
+                    heapq.heappush(records, (t, source, seq, name, args))
+        replay_records(None)
+
+        num_workers_executing = 0
+        final_time = 0
+        for partition in partitions:
+            send(partition, ('finish', None, None))
+        for partition in partitions:
+            (shard_workers_executing, shard_time) = recv(partition)
+            num_workers_executing += shard_workers_executing
+            final_time = max(final_time, shard_time)
+    finally:
+        for conn in conns.values():
+            conn.close()
+        for process in processes:
+            process.join()
+    event_simulation.set_time(final_time)
+    return replaytrace.report_simulation(computation, event_simulation, logger,
+                                         num_workers_executing, enable_analysis)
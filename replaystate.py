@@ -7,6 +7,8 @@ from collections import defaultdict, namedtuple
 from collections import deque
 from schedulerbase import *
 from helpers import TimestampedLogger
+from interning import intern_id
+from eventqueue import HeapEventQueue, TimingWheel
 
 ################################################################
 #        Scheduler Database that Replays Saved Traces          #
@@ -82,17 +84,19 @@ class ReplaySchedulerDatabase(AbstractSchedulerDatabase):
             raise NotImplementedError('Unable to handle update of type {}'.format(type(nextUpdate)))
 
     def _yield_global_scheduler_update(self, update):
-        self._pylogger.debug('sending update to global scheduler: {}'.format(str(update)))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('sending update to global scheduler: {}', update)
         for handler in self._global_scheduler_update_handlers:
-            self._event_simulation.schedule_delayed(self._db_message_delay, lambda handler=handler:handler(update))
+            self._event_simulation.schedule_event_delayed(self._db_message_delay, EventKind.GLOBAL_SCHEDULER_UPDATE, handler, update)
 
     def _yield_local_scheduler_update(self, update):
-        self._pylogger.debug('sending update to node {} local scheduler: {}'.format(str(update.node_id), str(update)))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('sending update to node {} local scheduler: {}', update.node_id, update)
 #        print "yield locally targeting {}".format(update.node_id)
 #        print "lsh" + str(self._local_scheduler_update_handlers)
         for handler in self._local_scheduler_update_handlers[str(update.node_id)]:
 #            print "SDB sending update {} to node {}".format(update, update.node_id)
-            self._event_simulation.schedule_delayed(self._db_message_delay, lambda handler=handler: handler(update))
+            self._event_simulation.schedule_event_delayed(self._db_message_delay, EventKind.LOCAL_SCHEDULER_UPDATE, handler, update)
 
     def schedule(self, node_id, task_id):
         self._logger.task_scheduled(task_id, node_id, False)
@@ -226,7 +230,7 @@ class ObjectStoreRuntime():
         self._object_sizes[object_id] = object_size
         self._get_object_cache(node_id).add_object(object_id, object_size)
         self._yield_object_ready_update(object_id, node_id, object_size)
-        if object_id in self._awaiting_completion.keys():
+        if object_id in self._awaiting_completion:
             for (d_node_id, on_done) in self._awaiting_completion[object_id]:
                 if node_id == d_node_id:
                     on_done()
@@ -255,16 +259,16 @@ class ObjectStoreRuntime():
             self._event_simulation.schedule_delayed(self._db_message_delay, handler)
 
     def get_object_size_locations(self, object_id, result_handler):
-        if object_id in self._object_sizes.keys():
+        if object_id in self._object_sizes:
             size = self._object_sizes[object_id]
         else:
             size = None
-        if object_id in self._object_locations.keys():
+        if object_id in self._object_locations:
             location_status = self._object_locations[object_id]
         else:
             location_status = None
-        handler = lambda: result_handler(object_id, size, location_status)
-        self._event_simulation.schedule_delayed(self._db_message_delay, handler)
+        self._event_simulation.schedule_event_delayed(self._db_message_delay, EventKind.OBJECT_SIZE_LOCATIONS,
+                                                      result_handler, (object_id, size, location_status))
 
     def _yield_object_ready_update(self, object_id, node_id, object_size):
         self._yield_update(node_id, ObjectReadyUpdate(ObjectDescription(object_id, node_id, object_size), node_id))
@@ -280,7 +284,7 @@ class ObjectStoreRuntime():
 
     def require_object(self, object_id, node_id, on_done):
         object_ready_locations = dict(filter(lambda (node_id, status): status == ObjectStatus.READY, self._object_locations[object_id].items()))
-        if node_id in object_ready_locations.keys():
+        if node_id in object_ready_locations:
             # TODO - we aren't firing the ObjectReadyUpdate in this scenario. Should we be doing so?
 #            print "require has locally"
             on_done()
@@ -296,15 +300,16 @@ class ObjectStoreRuntime():
         if dst_node_id == src_node_id:
             on_done()
         else:
-            if (object_id, dst_node_id) in self._awaiting_copy.keys():
+            if (object_id, dst_node_id) in self._awaiting_copy:
                 self._awaiting_copy[(object_id, dst_node_id)].append(on_done)
-            elif src_node_id in self._object_locations[object_id].keys() and self._object_locations[object_id][src_node_id] == ObjectStatus.READY:
+            elif src_node_id in self._object_locations[object_id] and self._object_locations[object_id][src_node_id] == ObjectStatus.READY:
                 self.use_object(object_id, src_node_id)
                 object_size = self._object_sizes[object_id]
                 data_transfer_time = self._db_message_delay + object_size * self._data_transfer_time_cost
                 self._logger.object_transfer_started(object_id, object_size, src_node_id, dst_node_id)
                 self._awaiting_copy[(object_id, dst_node_id)].append(on_done)
-                self._event_simulation.schedule_delayed(data_transfer_time, lambda: self._object_copied(object_id, object_size, src_node_id, dst_node_id))
+                self._event_simulation.schedule_event_delayed(data_transfer_time, EventKind.OBJECT_COPIED,
+                                                              self, (object_id, object_size, src_node_id, dst_node_id))
             else:
                 raise RuntimeError('Unexpected failure to copy object {} to {} from {}'.format(object_id, dst_node_id, src_node_id))
 
@@ -321,7 +326,7 @@ class ObjectStoreRuntime():
 
 class ObjectDescription():
     def __init__(self, object_id, node_id, size):
-        self.object_id = str(object_id)
+        self.object_id = intern_id(object_id)
         self.node_id = node_id
         self.size = size
 
@@ -385,11 +390,12 @@ class NodeRuntime():
     def send_to_dispatcher(self, task, priority):
         for result in task.get_results():
         	self._object_store.expect_object(result.object_id, self.node_id)
-        self._pylogger.debug('Dispatcher at node {} received task {} with priority {}'.format(self.node_id, task.id(), priority))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('Dispatcher at node {} received task {} with priority {}', self.node_id, task.id(), priority)
         task_id = task.id()
         heapq.heappush(self._queue, (priority, self._queue_seq, task_id))
         self._queue_seq += 1
-        self._event_simulation.schedule_immediate(lambda: self._process_tasks())
+        self._event_simulation.schedule_event_immediate(EventKind.PROCESS_TASKS, self)
 
     def get_updates(self, update_handler):
         self._update_handlers.append(update_handler)
@@ -397,16 +403,6 @@ class NodeRuntime():
     def free_workers(self):
         return self.num_workers - self.num_workers_executing
 
-    class TaskSubmitted():
-        def __init__(self, submitted_task_id, phase_id):
-            self.submitted_task_id = submitted_task_id
-            self.phase_id = phase_id
-
-    class TaskPhaseComplete():
-        def __init__(self, task_id, phase_id):
-            self.task_id = task_id
-            self.phase_id = phase_id
-
     class Dependencies():
         def __init__(self, node_runtime, task_id, phase_id):
             self._node_runtime = node_runtime
@@ -444,27 +440,22 @@ class NodeRuntime():
             update_handler(update)
 
     def _execute_phase_immediate(self, task_id, phase_id):
-        self._pylogger.debug('executing task {} phase {}'.format(task_id, phase_id))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('executing task {} phase {}', task_id, phase_id)
         self._logger.task_phase_started(task_id, phase_id, self.node_id)
         task_phase = self._computation.get_task(task_id).get_phase(phase_id)
         for d_object_id in task_phase.depends_on:
             self._object_store.use_object(d_object_id, self.node_id)
         for put_event in task_phase.creates:
-            self._event_simulation.schedule_delayed(
-                    put_event.time_offset,
-                    lambda put_event=put_event:
-                    self._object_store.add_object(put_event.object_id,
-                        self.node_id, put_event.size)
-                    )
-            self._event_simulation.schedule_delayed(
-                    put_event.time_offset,
-                    lambda put_event=put_event:
-                    self._yield_update(ObjectReadyUpdate(ObjectDescription(put_event.object_id,
-                        self.node_id, put_event.size), self.node_id))
-                    )
+            self._event_simulation.schedule_event_delayed(put_event.time_offset, EventKind.OBJECT_PUT, self, put_event)
         for schedule_task in task_phase.submits:
-            self._event_simulation.schedule_delayed(schedule_task.time_offset, lambda s_task_id=schedule_task.task_id: self._handle_update(self.TaskSubmitted(s_task_id, 0)))
-        self._event_simulation.schedule_delayed(task_phase.duration, lambda: self._handle_update(self.TaskPhaseComplete(task_id, phase_id)))
+            self._event_simulation.schedule_event_delayed(schedule_task.time_offset, EventKind.TASK_SUBMITTED, self, schedule_task.task_id)
+        self._event_simulation.schedule_event_delayed(task_phase.duration, EventKind.TASK_PHASE_COMPLETE, self, (task_id, phase_id))
+
+    def _object_put(self, put_event):
+        self._object_store.add_object(put_event.object_id, self.node_id, put_event.size)
+        self._yield_update(ObjectReadyUpdate(ObjectDescription(put_event.object_id,
+            self.node_id, put_event.size), self.node_id))
 
     def _internal_scheduler_schedule(self, task_id, phase_id):
         task = self._computation.get_task(task_id)
@@ -481,35 +472,37 @@ class NodeRuntime():
                 self.num_workers += 1
             self._execute_phase_immediate(task_id, phase_id)
         else:
-            self._pylogger.debug('task {} phase {} waiting for dependencies: {}'.format(task_id, phase_id, str(needs.object_dependencies)))
-
-    def _handle_update(self, update):
-        if isinstance(update, self.TaskSubmitted):
-            task = self._computation.get_task(update.submitted_task_id)
-            self._logger.task_submitted(update.submitted_task_id, self.node_id, task.get_depends_on())
-            self._event_simulation.schedule_immediate(lambda: self._yield_update(SubmitTaskUpdate(task)))
-        elif isinstance(update, self.TaskPhaseComplete):
-            self._pylogger.debug('completed task {} phase {}'.format(update.task_id, update.phase_id))
-            self._logger.task_phase_finished(update.task_id, update.phase_id, self.node_id)
-            task = self._computation.get_task(update.task_id)
-            if update.phase_id < task.num_phases() - 1:
-                self._pylogger.debug('task {} has further phases'.format(update.task_id))
-                self._event_simulation.schedule_immediate(lambda: self._internal_scheduler_schedule(update.task_id, update.phase_id + 1))
-            else:
-                self._pylogger.debug('completed task {}'.format(update.task_id))
-                self._logger.task_finished(update.task_id, self.node_id)
-                for res in task.get_results():
-                    self._object_store.add_object(res. object_id, self.node_id, res.size)
-                self._yield_update(FinishTaskUpdate(update.task_id))
-                if task.is_root:
-                    self._yield_update(AddWorkerUpdate(increment=-1))
-                    self.num_workers -= 1
-                self.num_workers_executing -= 1
-                self._task_times.append(self._event_simulation.get_time() - self._task_start_times_map.get(update.task_id, 0)) 
-                #print "task_times: {}".format(self._task_times)
-                self._event_simulation.schedule_immediate(lambda: self._process_tasks())
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('task {} phase {} waiting for dependencies: {}', task_id, phase_id, needs.object_dependencies)
+
+    def _task_submitted(self, submitted_task_id):
+        task = self._computation.get_task(submitted_task_id)
+        self._logger.task_submitted(submitted_task_id, self.node_id, task.get_depends_on())
+        self._event_simulation.schedule_event_immediate(EventKind.NODE_UPDATE, self, SubmitTaskUpdate(task))
+
+    def _task_phase_complete(self, task_id, phase_id):
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('completed task {} phase {}', task_id, phase_id)
+        self._logger.task_phase_finished(task_id, phase_id, self.node_id)
+        task = self._computation.get_task(task_id)
+        if phase_id < task.num_phases() - 1:
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('task {} has further phases', task_id)
+            self._event_simulation.schedule_event_immediate(EventKind.SCHEDULE_PHASE, self, (task_id, phase_id + 1))
         else:
-            raise NotImplementedError('Unknown update: {}'.format(type(update)))
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('completed task {}', task_id)
+            self._logger.task_finished(task_id, self.node_id)
+            for res in task.get_results():
+                self._object_store.add_object(res. object_id, self.node_id, res.size)
+            self._yield_update(FinishTaskUpdate(task_id))
+            if task.is_root:
+                self._yield_update(AddWorkerUpdate(increment=-1))
+                self.num_workers -= 1
+            self.num_workers_executing -= 1
+            self._task_times.append(self._event_simulation.get_time() - self._task_start_times_map.get(task_id, 0)) 
+            #print "task_times: {}".format(self._task_times)
+            self._event_simulation.schedule_event_immediate(EventKind.PROCESS_TASKS, self)
 
 
 
@@ -524,38 +517,165 @@ class SystemTime():
     def get_time(self):
         return self._event_simulation.get_time()
 
+class EventKind():
+    CALLBACK = 0
+    GLOBAL_SCHEDULER_UPDATE = 1
+    LOCAL_SCHEDULER_UPDATE = 2
+    OBJECT_SIZE_LOCATIONS = 3
+    OBJECT_COPIED = 4
+    OBJECT_PUT = 5
+    TASK_SUBMITTED = 6
+    TASK_PHASE_COMPLETE = 7
+    NODE_UPDATE = 8
+    SCHEDULE_PHASE = 9
+    PROCESS_TASKS = 10
+    TIMER = 11
+    # set by EventSimulation.cancel_event, never dispatched
+    CANCELLED = 12
+
+    NAMES = ['CALLBACK', 'GLOBAL_SCHEDULER_UPDATE', 'LOCAL_SCHEDULER_UPDATE',
+             'OBJECT_SIZE_LOCATIONS', 'OBJECT_COPIED', 'OBJECT_PUT',
+             'TASK_SUBMITTED', 'TASK_PHASE_COMPLETE', 'NODE_UPDATE',
+             'SCHEDULE_PHASE', 'PROCESS_TASKS', 'TIMER', 'CANCELLED']
+
+
+class Event(object):
+    """A pending simulation event. The dispatch table entry for kind is
+       called with target and payload when the event fires, so the hot
+       path needs no per-event closure."""
+    __slots__ = ('kind', 'target', 'payload')
+
+    def __init__(self, kind, target, payload):
+        self.kind = kind
+        self.target = target
+        self.payload = payload
+
+    def __str__(self):
+        return 'Event({}, {}, {})'.format(EventKind.NAMES[self.kind], self.target, self.payload)
+
+
+def _dispatch_callback(fn, _):
+    fn()
+
+def _dispatch_update(handler, update):
+    handler(update)
+
+def _dispatch_object_size_locations(result_handler, (object_id, size, location_status)):
+    result_handler(object_id, size, location_status)
+
+def _dispatch_object_copied(object_store, (object_id, object_size, src_node_id, dst_node_id)):
+    object_store._object_copied(object_id, object_size, src_node_id, dst_node_id)
+
+def _dispatch_object_put(node_runtime, put_event):
+    node_runtime._object_put(put_event)
+
+def _dispatch_task_submitted(node_runtime, task_id):
+    node_runtime._task_submitted(task_id)
+
+def _dispatch_task_phase_complete(node_runtime, (task_id, phase_id)):
+    node_runtime._task_phase_complete(task_id, phase_id)
+
+def _dispatch_node_update(node_runtime, update):
+    node_runtime._yield_update(update)
+
+def _dispatch_schedule_phase(node_runtime, (task_id, phase_id)):
+    node_runtime._internal_scheduler_schedule(task_id, phase_id)
+
+def _dispatch_process_tasks(node_runtime, _):
+    node_runtime._process_tasks()
+
+def _dispatch_timer(event_loop, _):
+    event_loop._fire_timers()
+
+# indexed by EventKind
+_event_dispatch = [
+    _dispatch_callback,
+    _dispatch_update,
+    _dispatch_update,
+    _dispatch_object_size_locations,
+    _dispatch_object_copied,
+    _dispatch_object_put,
+    _dispatch_task_submitted,
+    _dispatch_task_phase_complete,
+    _dispatch_node_update,
+    _dispatch_schedule_phase,
+    _dispatch_process_tasks,
+    _dispatch_timer,
+]
+
+
 class EventSimulation():
-    def __init__(self):
+    def __init__(self, event_queue_class=HeapEventQueue):
         self._t = 0
-        self._scheduled = []
+        self._scheduled = event_queue_class()
         self._scheduled_seq = 0
         self._pylogger = TimestampedLogger(__name__+'.EventSimulation', self)
 
     def get_time(self):
         return self._t
 
-    def schedule_at(self, t, fn):
+    def num_events_scheduled(self):
+        return self._scheduled_seq
+
+    def schedule_event_at(self, t, kind, target, payload=None):
         if self._t > t:
             print 'invalid schedule request'
             sys.exit(1)
-        heapq.heappush(self._scheduled, (t, self._scheduled_seq, fn))
+        event = Event(kind, target, payload)
+        self._scheduled.push((t, self._scheduled_seq, event))
         self._scheduled_seq += 1
+        return event
+
+    def schedule_event_delayed(self, delta, kind, target, payload=None):
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('Scheduling {} at time {}', EventKind.NAMES[kind], self._t + delta)
+        return self.schedule_event_at(self._t + delta, kind, target, payload)
+
+    def schedule_event_immediate(self, kind, target, payload=None):
+        return self.schedule_event_at(self._t, kind, target, payload)
+
+    def cancel_event(self, event):
+        # The entry stays queued but is dropped without advancing the clock.
+        event.kind = EventKind.CANCELLED
+        event.target = None
+        event.payload = None
+
+    def schedule_at(self, t, fn):
+        self.schedule_event_at(t, EventKind.CALLBACK, fn)
 
     def schedule_delayed(self, delta, fn):
-        self._pylogger.debug('Scheduling {} {} at time {}'.format(fn,
-            fn.__name__, self._t + delta))
-        self.schedule_at(self._t + delta, fn)
+        self.schedule_event_delayed(delta, EventKind.CALLBACK, fn)
 
     def schedule_immediate(self, fn):
-        self.schedule_at(self._t, fn)
+        self.schedule_event_at(self._t, EventKind.CALLBACK, fn)
+
+    def _run(self, t, event):
+        self._t = t
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('Advancing to {} at time {}', EventKind.NAMES[event.kind], self._t)
+        _event_dispatch[event.kind](event.target, event.payload)
 
     def advance(self):
-        if len(self._scheduled) > 0:
-            (self._t, _, scheduled) = heapq.heappop(self._scheduled)
-            self._pylogger.debug('Advancing to {} {} at time '
-                '{}'.format(scheduled, scheduled.__name__, self._t))
-            scheduled()
-        return len(self._scheduled) > 0
+        while self._scheduled:
+            (t, _, event) = self._scheduled.pop()
+            if event.kind != EventKind.CANCELLED:
+                self._run(t, event)
+                break
+        return bool(self._scheduled)
+
+    def advance_until(self, t):
+        """Run every event scheduled at or before t, then move the clock
+           forward to t."""
+        while self._scheduled:
+            entry = self._scheduled.pop()
+            if entry[0] > t:
+                self._scheduled.push(entry)
+                break
+            if entry[2].kind != EventKind.CANCELLED:
+                self._run(entry[0], entry[2])
+        if t > self._t:
+            self._t = t
+        return bool(self._scheduled)
 
     def advance_fully(self):
         while self.advance():
@@ -570,37 +690,81 @@ class EventLoop():
             self.timer_id = timer_id
             self.handler = handler
             self.context = context
-            self.is_cancelled = False
 
-    def __init__(self, timesource):
+    def __init__(self, timesource, resolution=0.001, num_slots=64, num_levels=4):
         self._event_simulation = timesource
         self._timer_id_seq = 1
+        # active timers, including those popped from the wheel for the
+        # batch that is currently firing
         self._timers = {}
-
-    def timer_handler(self, context):
-        if context.timer_id not in self._timers.keys():
-            raise RuntimeError('Invalid timer')
-        del self._timers[context.timer_id]
-        if not context.is_cancelled:
-            context.handler(context.context)
+        self._wheel = TimingWheel(resolution, num_slots, num_levels)
+        self._num_cancelled = 0
+        # the one simulation event armed for the earliest deadline
+        self._armed_event = None
+        self._armed_time = None
+
+    def num_timers(self):
+        return len(self._timers)
+
+    def num_cancelled_timers(self):
+        return self._num_cancelled
+
+    def _arm(self):
+        deadline = self._wheel.next_deadline()
+        if deadline == self._armed_time:
+            return
+        if self._armed_event is not None:
+            self._event_simulation.cancel_event(self._armed_event)
+            self._armed_event = None
+            self._armed_time = None
+        if deadline is not None:
+            self._armed_event = self._event_simulation.schedule_event_at(deadline, EventKind.TIMER, self)
+            self._armed_time = deadline
+
+    def _fire_timers(self):
+        self._armed_event = None
+        self._armed_time = None
+        if self._wheel.next_deadline() == self._event_simulation.get_time():
+            (_, due) = self._wheel.pop_earliest()
+            for context in due:
+                # earlier handlers in the batch may have removed this timer
+                if context.timer_id in self._timers:
+                    del self._timers[context.timer_id]
+                    context.handler(context.context)
+        self._arm()
 
     def add_timer(self, delta, handler, context):
         timer_id = self._timer_id_seq
         self._timer_id_seq += 1
         context = EventLoop.EventLoopData(self, timer_id, handler, context)
         self._timers[timer_id] = context
-        self._event_simulation.schedule_delayed(delta, lambda: self.timer_handler(context))
+        deadline = self._event_simulation.get_time() + delta
+        self._wheel.add(timer_id, deadline, context)
+        if self._armed_time is None or deadline < self._armed_time:
+            self._arm()
         return timer_id
 
     def remove_timer(self, timer_id):
-        if timer_id not in self._timers.keys():
+        if timer_id not in self._timers:
             raise RuntimeError('Timer is not active')
-        self._timers[timer_id].is_cancelled = True
+        del self._timers[timer_id]
+        self._wheel.remove(timer_id)
+        self._num_cancelled += 1
+        # A stale armed event just fires early and re-arms, so only cancel
+        # it outright when no timers are left.
+        if not self._wheel and self._armed_event is not None:
+            self._arm()
 
 
 ################################################################
 #              Data model for saved computations               #
 ################################################################
+
+# Bump this whenever the trace model classes, the decoder or verify()
+# change. Pickles of traces, like the trace cache entries, record it and
+# are not loaded by code with a different version.
+MODEL_VERSION = 1
+
 class ComputationDescription():
     def __init__(self, root_task, tasks, is_combined=False):
         if root_task is None:
@@ -618,7 +782,7 @@ class ComputationDescription():
                 raise ValidationError('Task ids must be unique')
             tasks_map[task.id()] = task
 
-        self._root_task = str(root_task)
+        self._root_task = intern_id(root_task)
         self._tasks = tasks_map
         self._tasks[self._root_task].is_root = True
         #self.assign_task_depths()
@@ -671,136 +835,133 @@ class ComputationDescription():
 
 
     def verify(self):
-        tasks = self._tasks.values()
-        # all tasks should be called exactly once
+        # One pass over the tasks checks calls and object ids and builds the
+        # dependency graph. Errors are raised in the order of the checks
+        # below, whichever task they are found in.
         called_tasks = set([self._root_task])
-        for task in tasks:
-            for phase_id in range(0, task.num_phases()):
-                for task_id in map(lambda x: x.task_id, task.get_phase(phase_id).submits):
+        result_objects = set()
+        duplicate_object_error = None
+        dependencies = []
+        validation_dg = DirectedGraph()
+        get_id = validation_dg.get_id
+        add_edge = validation_dg.add_edge
+        for task in self._tasks.itervalues():
+            prev_phase_node = None
+            for phase in task.phases():
+                phase_node = get_id(phase)
+                if prev_phase_node is not None:
+                    # previous phase edge
+                    add_edge(prev_phase_node, phase_node)
+                for object_id in phase.depends_on:
+                    # phase dependency edge
+                    dependencies.append(object_id)
+                    add_edge(get_id(object_id), phase_node)
+                for submit in phase.submits:
+                    # all tasks should be called exactly once
+                    task_id = submit.task_id
                     if task_id in called_tasks:
                         raise ValidationError('Duplicate call to task {}'.format(task_id))
                     if task_id not in self._tasks:
                         raise ValidationError('Call to undefined task {}'.format(task_id))
                     called_tasks.add(task_id)
-        if len(called_tasks) < len(self._tasks.keys()):
+                    # phase schedules edge
+                    add_edge(phase_node, get_id(self._tasks[task_id].get_phase(0)))
+                for object_put in phase.creates:
+                    object_id = object_put.object_id
+                    if object_id in result_objects and duplicate_object_error is None:
+                        duplicate_object_error = 'Duplicate put object id {}'.format(object_id)
+                    result_objects.add(object_id)
+                    # phase creates object
+                    add_edge(phase_node, get_id(object_id))
+                prev_phase_node = phase_node
+            for task_result in task.get_results():
+                object_id = task_result.object_id
+                if object_id in result_objects and duplicate_object_error is None:
+                    duplicate_object_error = 'Duplicate result object id {}'.format(object_id)
+                result_objects.add(object_id)
+                # task result edge
+                add_edge(prev_phase_node, get_id(object_id))
+
+        if len(called_tasks) < len(self._tasks):
             task_ids_set = set(self._tasks.keys())
             tasks_not_called = task_ids_set.difference(called_tasks)
             raise ValidationError('Some tasks are not called: {}'.format(str(tasks_not_called)))
-        if len(called_tasks) > len(self._tasks.keys()):
-            raise ValidationError('Too many tasks are called - called {} tasks but have {} tasks'.format(len(called_tasks), len(self._tasks.keys())))
+        if len(called_tasks) > len(self._tasks):
+            raise ValidationError('Too many tasks are called - called {} tasks but have {} tasks'.format(len(called_tasks), len(self._tasks)))
 
+        if duplicate_object_error is not None:
+            raise ValidationError(duplicate_object_error)
         # no dependencies that don't get created
-        result_objects = set()
-        for task in tasks:
-            for phase_id in range(0, task.num_phases()):
-                for object_put in task.get_phase(phase_id).creates:
-                    if object_put.object_id in result_objects:
-                        raise ValidationError('Duplicate put object id {}'.format(object_put.object_id))
-                    result_objects.add(object_put.object_id)
-            for task_result in task.get_results():
-                object_id = task_result.object_id
-                if object_id in result_objects:
-                    raise ValidationError('Duplicate result object id {}'.format(object_id))
-                result_objects.add(object_id)
-
-        for task in tasks:
-            for phase_id in range(0, task.num_phases()):
-                for object_id in task.get_phase(phase_id).depends_on:
-                    if object_id not in result_objects:
-                        raise ValidationError('Dependency on missing object id {}'.format(object_id))
+        for object_id in dependencies:
+            if object_id not in result_objects:
+                raise ValidationError('Dependency on missing object id {}'.format(object_id))
 
         # no cycles, everything reachable from roots
-        validation_dg = DirectedGraph()
-        for task in tasks:
-            prev_phase = None
-            for phase_id in range(0, task.num_phases()):
-                phase = task.get_phase(phase_id)
-                if prev_phase:
-                    #print "EDGE: previous phase edge"
-                    validation_dg.add_edge(validation_dg.get_id(prev_phase), validation_dg.get_id(phase))
-                for object_id in phase.depends_on:
-                    #print "EDGE: phase dependency edge"
-                    validation_dg.add_edge(validation_dg.get_id(object_id), validation_dg.get_id(phase))
-                for submits in phase.submits:
-                    #print "EDGE: phase schedules edge"
-                    validation_dg.add_edge(validation_dg.get_id(phase), validation_dg.get_id(self._tasks[submits.task_id].get_phase(0)))
-                for creates in phase.creates:
-                    #print "EDGE: phase creates object"
-                    validation_dg.add_edge(validation_dg.get_id(phase), validation_dg.get_id(creates.object_id))
-
-                prev_phase = phase
-            for task_result in task.get_results():
-                #print "EDGE: task result edge"
-                validation_dg.add_edge(validation_dg.get_id(prev_phase), validation_dg.get_id(task_result.object_id))
-        validation_dg.verify_dag_root(validation_dg.get_id(self._tasks[self._root_task].get_phase(0)))
+        validation_dg.verify_dag_root(get_id(self._tasks[self._root_task].get_phase(0)))
 
     def analyze(self):
         # Build the task graph.
         load_dg = DirectedGraph()
+        get_id = load_dg.get_id
+        add_edge = load_dg.add_edge
         total_num_tasks = 0
         total_num_objects = 0
         total_objects_size = 0
-        tasks = self._tasks.values()
-        for task in tasks:
-            prev_phase = None
-            for phase_id in range(0, task.num_phases()):
-                phase = task.get_phase(phase_id)
-                if prev_phase:
-                    #print "EDGE: previous phase edge"
-                    load_dg.add_edge(prev_phase, phase)
+        for task in self._tasks.itervalues():
+            prev_phase_node = None
+            for phase in task.phases():
+                phase_node = get_id(phase)
+                if prev_phase_node is not None:
+                    # previous phase edge
+                    add_edge(prev_phase_node, phase_node)
                 for object_id in phase.depends_on:
-                    #print "EDGE: phase dependency edge"
-                    load_dg.add_edge(object_id, phase)
+                    # phase dependency edge
+                    add_edge(get_id(object_id), phase_node)
                 for submits in phase.submits:
-                    #print "EDGE: phase schedules edge"
-                    load_dg.add_edge(phase, self._tasks[submits.task_id].get_phase(0))
+                    # phase schedules edge
+                    add_edge(phase_node, get_id(self._tasks[submits.task_id].get_phase(0)))
                 for creates in phase.creates:
-                    #print "EDGE: phase creates object"
-                    load_dg.add_edge(phase, creates.object_id)
+                    # phase creates object
+                    add_edge(phase_node, get_id(creates.object_id))
                     total_num_objects += 1
                     total_objects_size += creates.size
 
-                prev_phase = phase
+                prev_phase_node = phase_node
             for task_result in task.get_results():
-                #print "EDGE: task result edge"
-                load_dg.add_edge(prev_phase, task_result.object_id)
+                # task result edge
+                add_edge(prev_phase_node, get_id(task_result.object_id))
                 total_num_objects += 1
                 total_objects_size += task_result.size
             total_num_tasks += 1
 
         #load measure:
-        topo_sort_nodes = load_dg.topo_sort(self._tasks[self._root_task].get_phase(0))
+        root_phase = self._tasks[self._root_task].get_phase(0)
+        topo_sort_nodes = load_dg.topo_sort(get_id(root_phase))
         total_tasks_durations = 0
         total_num_tasks_verify = 0
-        critical_path = {}
-        critical_path[self._tasks[self._root_task].get_phase(0)] = self._tasks[self._root_task].get_phase(0).duration
-        #print "topo sort nodes is {}".format(topo_sort_nodes)
+        # longest path ending at each node, indexed by node id
+        critical_path = [0] * load_dg.num_nodes()
+        critical_path[get_id(root_phase)] = root_phase.duration
         for n in topo_sort_nodes:
-            if isinstance(n, TaskPhase):
-                total_tasks_durations += n.duration
-                if n.phase_id == 0:
+            node = load_dg.get_node(n)
+            if isinstance(node, TaskPhase):
+                duration = node.duration
+                total_tasks_durations += duration
+                if node.phase_id == 0:
                     total_num_tasks_verify += 1
             else:
                 #TODO: this means this is an object_id. We need to have a map of (object_id, size) to calculate the object size average, or total object sizes
+                duration = 0
             #find critical path:
-                pass
             for u in load_dg.adj_in(n):
-                if isinstance(n, TaskPhase):
-                    #print "instance n is {}, instance u is {}".format(n, u)
-                    if critical_path.get(n,0) < critical_path[u] + n.duration:
-                        critical_path[n] = critical_path[u] + n.duration
-                else:
-                    if critical_path.get(n,0) < critical_path[u]:
-                        critical_path[n] = critical_path[u]
+                if critical_path[n] < critical_path[u] + duration:
+                    critical_path[n] = critical_path[u] + duration
         
         if total_num_tasks_verify != total_num_tasks:
             print "Error: Number of tasks in DAG does not match number of tasks in the trace"
             return             
         
-        critical_path_time = 0
-        for c in critical_path.keys():
-            if critical_path[c] > critical_path_time:
-                critical_path_time = critical_path[c]
+        critical_path_time = max([0] + critical_path)
 
         normalized_critical_path = critical_path_time / total_tasks_durations
         if total_num_objects > 0:
@@ -819,13 +980,30 @@ class ComputationDescription():
             return self._tasks[self._root_task]
 
     def get_task(self, task_id):
-        return self._tasks[task_id]
+        return self._tasks[intern_id(task_id)]
 
     def get_task_ids(self):
         return self._tasks.keys()
 
 
-class Task():
+# Trace model. A large trace holds millions of these objects, so they use
+# __slots__ instead of a __dict__ and store lists as tuples. Empty lists
+# are the shared empty tuple. Loaders pass TaskPhase a dependency_lists
+# dict, which shares identical depends_on tuples among the phases of one
+# decode and is dropped with it. The model is read-only once loaded; code
+# that edits a trace, like combine_traces, replaces the tuples rather than
+# mutating them.
+
+def _dependency_list(depends_on, dependency_lists):
+    depends_on = tuple(map(intern_id, depends_on))
+    if not depends_on or dependency_lists is None:
+        return depends_on
+    return dependency_lists.setdefault(depends_on, depends_on)
+
+
+class Task(object):
+    __slots__ = ('_task_id', '_phases', '_results', 'depth', 'is_root')
+
     def __init__(self, task_id, phases, results):
         task_id_str = str(task_id)
         if not task_id_str:
@@ -841,9 +1019,9 @@ class Task():
         #    raise ValidationError('Task: no results')
 
         # verification passed so initialize
-        self._task_id = task_id_str
-        self._phases = phases
-        self._results = results
+        self._task_id = intern_id(task_id_str)
+        self._phases = tuple(phases)
+        self._results = tuple(results)
 
         # Depth is assigned by ComputationDescription
         self.depth = None
@@ -863,33 +1041,38 @@ class Task():
         return len(self._phases)
 
     def phases(self):
-        return self._phases[:]
+        return list(self._phases)
 
     def get_results(self):
         return self._results
 
     def add_result(self, result):
-        self._results.append(result)
+        self._results += (result,)
 
 
-class TaskPhase():
-    def __init__(self, phase_id, depends_on, submits, duration, creates=None):
+class TaskPhase(object):
+    __slots__ = ('phase_id', 'depends_on', 'submits', 'duration', 'creates')
+
+    def __init__(self, phase_id, depends_on, submits, duration, creates=None,
+                 dependency_lists=None):
         for s in submits:
             if s.time_offset > duration:
                 raise ValidationError('TaskPhase: submits beyond phase duration')
 
         # verification passed so initialize
         self.phase_id = phase_id
-        self.depends_on = map(lambda x: str(x), depends_on)
-        self.submits = submits
+        self.depends_on = _dependency_list(depends_on, dependency_lists)
+        self.submits = tuple(submits)
         self.duration = duration
         if creates is None:
-            self.creates = []
+            self.creates = ()
         else:
-            self.creates = creates
+            self.creates = tuple(creates)
+
 
+class TaskResult(object):
+    __slots__ = ('object_id', 'size')
 
-class TaskResult():
     def __init__(self, object_id, size):
         object_id_str = str(object_id)
         if not object_id_str:
@@ -898,22 +1081,26 @@ class TaskResult():
             raise ValidationError('TaskResult: invalid size - {}'.format(size))
 
         # verification passed so initialize
-        self.object_id = object_id_str
+        self.object_id = intern_id(object_id_str)
         self.size = size
 
 
-class TaskSubmit():
+class TaskSubmit(object):
+    __slots__ = ('task_id', 'time_offset')
+
     def __init__(self, task_id, time_offset):
         task_id_str = str(task_id)
         if not task_id_str:
             raise ValidationError('TaskSubmit: no task id')
 
         # verification passed so initialize
-        self.task_id = task_id_str
+        self.task_id = intern_id(task_id_str)
         self.time_offset = time_offset
 
 
-class ObjectPut():
+class ObjectPut(object):
+    __slots__ = ('object_id', 'size', 'time_offset')
+
     def __init__(self, object_id, size, time_offset):
         object_id_str = str(object_id)
         if not object_id_str:
@@ -922,16 +1109,26 @@ class ObjectPut():
             raise ValidationError('TaskResult: invalid size - {}'.format(size))
 
         # verification passed so initialize
-        self.object_id = object_id_str
+        self.object_id = intern_id(object_id_str)
         self.size = size
         self.time_offset = time_offset
 
 
 class DirectedGraph():
+    """Directed graph over node ids handed out by get_id(). Forward and
+       reverse adjacency are indexed in CSR form when first queried, so
+       adj_out(), adj_in() and traversals take time linear in the result.
+    """
+
     def __init__(self):
         self._id_ct = 0
         self._id_map = {}
+        self._nodes = []
         self._edges = []
+        # (offsets, targets) of the forward and reverse adjacency, built on
+        # demand and dropped by add_edge
+        self._out_index = None
+        self._in_index = None
 
     def get_id(self, x):
         if x in self._id_map:
@@ -941,84 +1138,119 @@ class DirectedGraph():
             #print 'missing id for {}'.format(x)
             new_id = self._id_ct
             self._id_map[x] = new_id
+            self._nodes.append(x)
             self._id_ct += 1
         #print 'id for {} is {}'.format(x, new_id)
         return new_id
 
+    def get_node(self, node_id):
+        return self._nodes[node_id]
+
+    def num_nodes(self):
+        return self._id_ct
+
     def add_edge(self, a, b):
-        #id_a = self._get_id(a)
-        #id_b = self._get_id(b)
         #print 'EDGE: {} => {}'.format(a, b)
-        #print 'EDGE: {} -> {}'.format(id_a, id_b)
-        #self._edges.append((id_a, id_b))
         self._edges.append((a, b))
+        self._out_index = None
+        self._in_index = None
+
+    def _csr(self, reverse=False):
+        """Adjacency of the graph in CSR form: the successors of node n, or
+           its predecessors if reverse is True, are
+           targets[offsets[n]:offsets[n + 1]], in the order of add_edge."""
+        if reverse:
+            edges = [(b, a) for (a, b) in self._edges]
+        else:
+            edges = self._edges
+        offsets = [0] * (self._id_ct + 1)
+        for (a, _) in edges:
+            offsets[a + 1] += 1
+        for i in xrange(self._id_ct):
+            offsets[i + 1] += offsets[i]
+        fill = offsets[:-1]
+        targets = [0] * len(edges)
+        for (a, b) in edges:
+            targets[fill[a]] = b
+            fill[a] += 1
+        return (offsets, targets)
+
+    def _out(self):
+        if self._out_index is None:
+            self._out_index = self._csr()
+        return self._out_index
+
+    def _in(self):
+        if self._in_index is None:
+            self._in_index = self._csr(reverse=True)
+        return self._in_index
 
     def verify_dag_root(self, root):
-        root_id = root
         # check that
         #  1/ we have a DAG
         #  2/ all nodes reachable from the root
-        # we do this by depth-first search
-        # Map from source node ID to list of destination node IDs.
-        edge_lists = dict(map(lambda (src_id, edges): (src_id, map(lambda x: x[1], edges)), itertools.groupby(self._edges, lambda x: x[0])))
-
-        to_visit = [(root_id, ())]
-        visited = set()
-        while to_visit:
-            node, chain = to_visit.pop()
-            if node in set(chain):
-                raise ValidationError('Cyclic dependencies')
-            if node in visited:
+        # we do this by an iterative depth-first search. Nodes are white
+        # until visited, grey while on the DFS path and black once all their
+        # successors are done, so an edge to a grey node closes a cycle.
+        (offsets, targets) = self._out()
+        white, grey, black = 0, 1, 2
+        color = [white] * self._id_ct
+        color[root] = grey
+        num_visited = 1
+        # the DFS path, and for each node on it the next edge to follow
+        path = [root]
+        next_edge = [offsets[root]]
+        while path:
+            node = path[-1]
+            i = next_edge[-1]
+            if i == offsets[node + 1]:
+                color[node] = black
+                path.pop()
+                next_edge.pop()
                 continue
-            visited.add(node)
-            # Add ourselves to this DFS branch.
-            chain = chain + (node, )
-            if node not in edge_lists:
-                continue
-            for destination_node in edge_lists[node]:
-                to_visit.append((destination_node, chain))
+            next_edge[-1] = i + 1
+            destination_node = targets[i]
+            destination_color = color[destination_node]
+            if destination_color == grey:
+                raise ValidationError('Cyclic dependencies')
+            if destination_color == white:
+                color[destination_node] = grey
+                num_visited += 1
+                path.append(destination_node)
+                next_edge.append(offsets[destination_node])
 
-        if len(visited) != self._id_ct:
+        if num_visited != self._id_ct:
             raise ValidationError('Reachability from root')
 
 
     def topo_sort(self, root):
-        #print "root task is {}".format(root)
-        #print "edges is {}".format(self._edges)
-        topo_sorted_list = []
-        q = deque()
-        in_count = {}
-        for e in self._edges:
-            in_count[e[1]] = in_count.get(e[1], 0) + 1
+        """Nodes reachable from root in topological order, by Kahn's
+           algorithm."""
+        (offsets, targets) = self._out()
+        (in_offsets, _) = self._in()
+        in_count = [in_offsets[i + 1] - in_offsets[i] for i in xrange(self._id_ct)]
         #assuming we have only 1 root task! if we have several root tasks (a forest of jobs) this will have to change to "for a in nodes: if in_count[a] == 0: q.push(a)
-        q.append(root)
-        #print "current q in topo_sort is {}".format(q)
-        while q:
-           cur = q[0]
-           topo_sorted_list.append(cur)
-           q.popleft()
-           #sprint "cur is {}".format(cur)
-           for nxt in self.adj_out(cur):
-               in_count[nxt] -= 1
-               if in_count[nxt] == 0:
-                   q.append(nxt)
+        topo_sorted_list = [root]
+        # topo_sorted_list doubles as the queue, i is its head
+        i = 0
+        while i < len(topo_sorted_list):
+            cur = topo_sorted_list[i]
+            i += 1
+            for nxt in targets[offsets[cur]:offsets[cur + 1]]:
+                in_count[nxt] -= 1
+                if in_count[nxt] == 0:
+                    topo_sorted_list.append(nxt)
         return topo_sorted_list
 
 
     def adj_out(self, x):
-        result = []
-        for e in self._edges:
-            if e[0] == x:
-                result.append(e[1])
-        return result 
+        (offsets, targets) = self._out()
+        return targets[offsets[x]:offsets[x + 1]]
 
 
     def adj_in(self, x):
-        result = []
-        for e in self._edges:
-            if e[1] == x:
-                result.append(e[0])
-        return result 
+        (offsets, sources) = self._in()
+        return sources[offsets[x]:offsets[x + 1]]
  
 
 class ValidationError(Exception):
@@ -1026,12 +1258,13 @@ class ValidationError(Exception):
         super(ValidationError, self).__init__(message)
 
 
-def computation_decoder(dict):
+def computation_decoder(dict, dependency_lists=None):
     keys = frozenset(dict.keys())
     if keys == frozenset([u'timeOffset', 'taskId']):
         return TaskSubmit(dict[u'taskId'], dict[u'timeOffset'])
     if keys == frozenset([u'duration', u'phaseId', u'submits', u'dependsOn', u'creates']):
-        return TaskPhase(dict[u'phaseId'], dict[u'dependsOn'], dict[u'submits'], dict[u'duration'], dict[u'creates'])
+        return TaskPhase(dict[u'phaseId'], dict[u'dependsOn'], dict[u'submits'], dict[u'duration'], dict[u'creates'],
+                         dependency_lists)
     if keys == frozenset([u'phases', u'results', u'taskId']):
         return Task(dict[u'taskId'], dict[u'phases'], dict[u'results'])
     if keys == frozenset([u'tasks', u'rootTask']):
@@ -1045,3 +1278,10 @@ def computation_decoder(dict):
     else:
         print "unexpected map: {}".format(keys)
         sys.exit(1)
+
+
+def make_computation_decoder():
+    """A computation_decoder hook for decoding one trace, which shares
+       identical depends_on tuples among the phases of that trace."""
+    dependency_lists = {}
+    return lambda dict: computation_decoder(dict, dependency_lists)
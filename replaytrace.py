@@ -1,13 +1,17 @@
 import replaystate
+import eventqueue
 from trivialscheduler import *
-import json
-import gzip
 
+import os
 import sys
 import imp
+import pickle
+import traceback
 
 from helpers import TimestampedLogger
 import statslogging
+import simprofile
+import tracecache
 
 schedulers = {
     'trivial' : TrivialScheduler,
@@ -30,33 +34,79 @@ cache_policies = {
   'lru' : replaystate.LRUObjectCache
 }
 
+event_queues = {
+  'heap' : eventqueue.HeapEventQueue,
+  'calendar' : eventqueue.CalendarEventQueue
+}
+
 def usage():
-    print("Usage: python replaytrace.py <config filename>; example config can "
-          "be found in default_config.py")
-    print("OR test_scheduler num_nodes num_workers_per_node "
-          "object_transfer_time_cost db_message_delay "
+    print("Usage: python replaytrace.py [--profile profile.json] [--pdes NUM_SHARDS] "
+          "<config filename>; example config can be found in default_config.py")
+    print("OR [--profile profile.json] [--pdes NUM_SHARDS] test_scheduler "
+          "num_nodes num_workers_per_node object_transfer_time_cost db_message_delay "
           "scheduler cache_policy"
           "enable_verification=<true|false> input.json")
+    print("The trace may be JSON, gzipped JSON or a columnar trace directory "
+          "written by columnartrace.py")
     print("Available Schedulers: %s" %schedulers.keys())
     print("Available Cache Policies: %s" %cache_policies.keys())
+    print("Available Event Queues: %s" %event_queues.keys())
+
+
+class Simulation():
+    """The runtime objects of one replay, as built by setup_simulation()."""
+
+    def __init__(self, computation, event_simulation, logger, object_store,
+                 scheduler_db, local_runtimes, local_event_loops, schedulers):
+        self.computation = computation
+        self.event_simulation = event_simulation
+        self.logger = logger
+        self.object_store = object_store
+        self.scheduler_db = scheduler_db
+        self.local_runtimes = local_runtimes
+        self.local_event_loops = local_event_loops
+        self.schedulers = schedulers
+
+    def set_object_transfer_time_cost(self, object_transfer_time_cost):
+        # only affects transfers started from now on
+        self.object_store._data_transfer_time_cost = object_transfer_time_cost
+        self.scheduler_db._data_transfer_time_cost = object_transfer_time_cost
+
+    def set_db_message_delay(self, db_message_delay):
+        # only affects messages sent from now on
+        self.object_store._db_message_delay = db_message_delay
+        self.scheduler_db._db_message_delay = db_message_delay
 
 
 def simulate(computation, scheduler_cls, event_simulation, logger, num_nodes,
              num_workers_per_node, object_transfer_time_cost, db_message_delay,
              global_scheduler_kwargs=None, local_scheduler_kwargs=None,
              enable_analysis=False, cache_policy_class=replaystate.NoopObjectCache):
+    simulation = setup_simulation(computation, scheduler_cls, event_simulation,
+                                  logger, num_nodes, num_workers_per_node,
+                                  object_transfer_time_cost, db_message_delay,
+                                  global_scheduler_kwargs, local_scheduler_kwargs,
+                                  cache_policy_class)
+    return finish_simulation(simulation, enable_analysis)
+
+def setup_simulation(computation, scheduler_cls, event_simulation, logger, num_nodes,
+                     num_workers_per_node, object_transfer_time_cost, db_message_delay,
+                     global_scheduler_kwargs=None, local_scheduler_kwargs=None,
+                     cache_policy_class=replaystate.NoopObjectCache,
+                     object_store_class=replaystate.ObjectStoreRuntime):
     if global_scheduler_kwargs is None:
         global_scheduler_kwargs = {}
     if local_scheduler_kwargs is None:
         local_scheduler_kwargs = {}
-    object_store = replaystate.ObjectStoreRuntime(event_simulation,
-                                                  logger,
-                                                  object_transfer_time_cost,
-                                                  db_message_delay,
-                                                  cache_policy_class)
+    object_store = object_store_class(event_simulation,
+                                      logger,
+                                      object_transfer_time_cost,
+                                      db_message_delay,
+                                      cache_policy_class)
     scheduler_db = replaystate.ReplaySchedulerDatabase(event_simulation, logger, computation, num_nodes, num_workers_per_node, object_transfer_time_cost, db_message_delay)
     local_nodes = {}
     local_runtimes = {}
+    local_event_loops = {}
     for node_id in range(0, num_nodes):
         local_runtime = replaystate.NodeRuntime(event_simulation, object_store,
                                                 logger, computation, node_id,
@@ -64,36 +114,113 @@ def simulate(computation, scheduler_cls, event_simulation, logger, num_nodes,
         local_event_loop = replaystate.EventLoop(event_simulation)
         local_nodes[node_id] = (local_runtime, local_event_loop)
         local_runtimes[node_id] = local_runtime
+        local_event_loops[node_id] = local_event_loop
     schedulers = scheduler_cls(replaystate.SystemTime(event_simulation), scheduler_db,
                                replaystate.EventLoop(event_simulation),
                                global_scheduler_kwargs, local_scheduler_kwargs,
                                local_nodes=local_nodes)
-    global_scheduler = schedulers.get_global_scheduler()
     scheduler_db.schedule_root(0)
+    return Simulation(computation, event_simulation, logger, object_store,
+                      scheduler_db, local_runtimes, local_event_loops, schedulers)
+
+def finish_simulation(simulation, enable_analysis=False):
+    event_simulation = simulation.event_simulation
     event_simulation.advance_fully()
     num_workers_executing = 0
-    for node_id, local_runtime in local_runtimes.items():
+    for node_id, local_runtime in simulation.local_runtimes.items():
         num_workers_executing += local_runtime.num_workers_executing
+    return report_simulation(simulation.computation, event_simulation,
+                             simulation.logger, num_workers_executing,
+                             enable_analysis)
+
+def report_simulation(computation, event_simulation, logger,
+                      num_workers_executing, enable_analysis=False):
+    """Print the outcome of a replay that has run to completion and end the
+       job in logger. Returns whether every task finished."""
     if enable_analysis:
         total_num_tasks, normalized_critical_path, total_tasks_durations, total_num_objects, total_objects_size = computation.analyze()
     else:
         total_num_tasks, normalized_critical_path, total_tasks_durations, total_num_objects, total_objects_size = [-1] * 5
     if num_workers_executing > 0:
         pylogger = TimestampedLogger(__name__+'.simulate', event_simulation)
-        pylogger.debug("failed to execute fully".format(num_workers_executing))
+        pylogger.debug("failed to execute fully")
         print "{:.6f}: Simulation Error. Total Number of Tasks: {}, DAG Normalized Critical Path: {}, Total Tasks Durations: {}".format(event_simulation.get_time(), total_num_tasks, normalized_critical_path, total_tasks_durations)
         print "-1: {} : {} : {} : {} : {}".format(event_simulation.get_time(), total_num_tasks, total_tasks_durations, total_num_objects, total_objects_size, normalized_critical_path)
-        return False
+        success = False
     else:
         logger.job_ended()
         print "{:.6f}: Simulation finished successfully. Total Number of Tasks: {}, DAG Normalized Critical Path: {}, Total Tasks Durations: {}".format(event_simulation.get_time(), total_num_tasks, normalized_critical_path, total_tasks_durations)
         print "{:.6f}: {} : {} : {} : {} : {}".format(event_simulation.get_time(), total_num_tasks, total_tasks_durations, total_num_objects, total_objects_size, normalized_critical_path)
-        return True
+        success = True
+    if isinstance(event_simulation, simprofile.ProfilingEventSimulation):
+        event_simulation.report()
+    return success
+
+def fork_simulation(simulation, t, branches):
+    """Replay a simulation up to simulated time t once, then continue it in
+       one forked child process per branch. Each branch is a callable taking
+       the Simulation, for instance to change a parameter and then call
+       finish_simulation(), and returning a picklable result. Copy-on-write
+       fork means the branches share the replayed prefix without copying or
+       serializing simulator state.
+
+       Returns the branch results in order. The parent's simulation is left
+       at time t and may be continued or forked again. Loggers that write
+       files when the job ends write to the same paths in every branch.
+    """
+    simulation.event_simulation.advance_until(t)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    children = []
+    for branch in branches:
+        (read_fd, write_fd) = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                try:
+                    data = pickle.dumps((True, branch(simulation)), 2)
+                except Exception:
+                    # failed in the branch or in pickling its result
+                    data = pickle.dumps((False, traceback.format_exc()), 2)
+                f = os.fdopen(write_fd, 'wb')
+                f.write(data)
+                f.close()
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    results = []
+    errors = []
+    for (i, (pid, read_fd)) in enumerate(children):
+        try:
+            f = os.fdopen(read_fd, 'rb')
+            data = f.read()
+            f.close()
+        finally:
+            os.waitpid(pid, 0)
+        if not data:
+            errors.append('branch {} exited without a result'.format(i))
+            continue
+        try:
+            (succeeded, result) = pickle.loads(data)
+        except Exception as e:
+            errors.append('branch {} returned an unreadable result: {}'.format(i, e))
+            continue
+        if not succeeded:
+            errors.append('branch {} failed:\n{}'.format(i, result))
+        results.append(result)
+    if errors:
+        raise RuntimeError('Simulation fork failed - {}'.format('\n'.join(errors)))
+    return results
 
 def run_replay(num_nodes, num_workers_per_node, object_transfer_time_cost,
                db_message_delay, scheduler_name, cache_policy_name, trace_filename,
                global_scheduler_kwargs, local_scheduler_kwargs,
-               enable_verification=True):
+               enable_verification=True, event_queue_name='heap',
+               profile_filename=None, num_shards=0):
     scheduler_cls = schedulers.get(scheduler_name)
     if scheduler_cls is None:
         print 'Error - unrecognized scheduler'
@@ -102,29 +229,43 @@ def run_replay(num_nodes, num_workers_per_node, object_transfer_time_cost,
     if cache_policy_class is None:
         print 'Error - unrecognized cache policy'
         sys.exit(1)
-    if trace_filename.endswith('.gz'):
-        f = gzip.open(trace_filename, 'rb')
-    else:
-        f = open(trace_filename, 'r')
-    try:
-      computation = json.load(f, object_hook=replaystate.computation_decoder)
-    finally:
-        f.close()
-    if enable_verification:
-        computation.verify()
+    event_queue_class = event_queues.get(event_queue_name)
+    if event_queue_class is None:
+        print 'Error - unrecognized event queue'
+        sys.exit(1)
+    computation = tracecache.load_trace(trace_filename, enable_verification)
 
     setup_logging()
-    event_simulation = replaystate.EventSimulation()
-    printing_logger = statslogging.PrintingLogger(event_simulation)
-    stats_logger = statslogging.StatsLogger(event_simulation)
-    event_log_logger = statslogging.EventLogLogger(event_simulation)
-    logger = statslogging.CompoundLogger([printing_logger, stats_logger, event_log_logger])
+    if num_shards > 0:
+        if profile_filename is not None:
+            print 'Error - profiling is not supported in a sharded replay'
+            sys.exit(1)
+        import pdes_replay
+        event_simulation = pdes_replay.ShardedEventSimulation(num_shards, event_queue_class)
+    elif profile_filename is None:
+        event_simulation = replaystate.EventSimulation(event_queue_class)
+    else:
+        event_simulation = simprofile.ProfilingEventSimulation(event_queue_class,
+                                                               profile_filename)
+    loggers = [statslogging.PrintingLogger(event_simulation),
+               statslogging.StatsLogger(event_simulation),
+               statslogging.EventLogLogger(event_simulation)]
+    if profile_filename is not None:
+        loggers = [simprofile.ProfilingLogger(l, event_simulation) for l in loggers]
+    logger = statslogging.CompoundLogger(loggers)
+    if num_shards > 0:
+        pdes_replay.simulate_sharded(computation, scheduler_cls, event_simulation, logger,
+                                     num_nodes, num_workers_per_node,
+                                     object_transfer_time_cost, db_message_delay,
+                                     global_scheduler_kwargs, local_scheduler_kwargs,
+                                     cache_policy_class=cache_policy_class)
+        return
     simulate(computation, scheduler_cls, event_simulation, logger, num_nodes,
              num_workers_per_node, object_transfer_time_cost, db_message_delay,
              global_scheduler_kwargs, local_scheduler_kwargs,
              cache_policy_class=cache_policy_class)
 
-def run_replay_from_sys_argv(args):
+def run_replay_from_sys_argv(args, profile_filename=None, num_shards=0):
     num_nodes = int(args[1])
     num_workers_per_node = int(args[2])
     object_transfer_time_cost = float(args[3])
@@ -136,9 +277,10 @@ def run_replay_from_sys_argv(args):
     run_replay(num_nodes, num_workers_per_node, object_transfer_time_cost,
                db_message_delay, scheduler_name, cache_policy_name,
                trace_filename, {}, {},
-               enable_verification=enable_verification)
+               enable_verification=enable_verification,
+               profile_filename=profile_filename, num_shards=num_shards)
 
-def run_replay_from_config(config_filename):
+def run_replay_from_config(config_filename, profile_filename=None, num_shards=None):
     import default_config
     config = imp.load_source("config", config_filename)
 
@@ -151,6 +293,8 @@ def run_replay_from_config(config_filename):
                                default_config.DB_MESSAGE_DELAY)
     scheduler_name = getattr(config, 'SCHEDULER_NAME',
                              default_config.SCHEDULER_NAME)
+    cache_policy_name = getattr(config, 'CACHE_POLICY',
+                                default_config.CACHE_POLICY)
     global_scheduler_kwargs = getattr(config, 'GLOBAL_SCHEDULER_KWARGS',
                                       default_config.GLOBAL_SCHEDULER_KWARGS)
     local_scheduler_kwargs = getattr(config, 'LOCAL_SCHEDULER_KWARGS',
@@ -159,16 +303,43 @@ def run_replay_from_config(config_filename):
                              default_config.TRACE_FILENAME)
     enable_verification = getattr(config, 'ENABLE_VERIFICATION',
             default_config.ENABLE_VERIFICATION)
+    event_queue_name = getattr(config, 'EVENT_QUEUE',
+                               default_config.EVENT_QUEUE)
+    if profile_filename is None:
+        profile_filename = getattr(config, 'PROFILE_FILENAME',
+                                   default_config.PROFILE_FILENAME)
+    if num_shards is None:
+        num_shards = getattr(config, 'PDES_NUM_SHARDS',
+                             default_config.PDES_NUM_SHARDS)
     run_replay(num_nodes, num_workers_per_node, object_transfer_time_cost,
-               db_message_delay, scheduler_name, trace_filename,
-               global_scheduler_kwargs, local_scheduler_kwargs,
-               enable_verification=enable_verification)
+               db_message_delay, scheduler_name, cache_policy_name,
+               trace_filename, global_scheduler_kwargs, local_scheduler_kwargs,
+               enable_verification=enable_verification,
+               event_queue_name=event_queue_name,
+               profile_filename=profile_filename, num_shards=num_shards)
 
 if __name__ == '__main__':
-    if len(sys.argv) == 2:
-        run_replay_from_config(sys.argv[1])
-    elif len(sys.argv) == 9:
-        run_replay_from_sys_argv(sys.argv)
+    argv = list(sys.argv)
+    profile_filename = None
+    if '--profile' in argv:
+        index = argv.index('--profile')
+        if index + 1 >= len(argv):
+            usage()
+            sys.exit(-1)
+        profile_filename = argv[index + 1]
+        del argv[index:index + 2]
+    num_shards = None
+    if '--pdes' in argv:
+        index = argv.index('--pdes')
+        if index + 1 >= len(argv):
+            usage()
+            sys.exit(-1)
+        num_shards = int(argv[index + 1])
+        del argv[index:index + 2]
+    if len(argv) == 2:
+        run_replay_from_config(argv[1], profile_filename, num_shards)
+    elif len(argv) == 9:
+        run_replay_from_sys_argv(argv, profile_filename, num_shards or 0)
     else:
         usage()
         sys.exit(-1)
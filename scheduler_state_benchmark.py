@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import replaystate
+from replaystate import Task, TaskPhase, TaskResult
+from schedulerbase import FinishTaskUpdate, ForwardTaskUpdate, RegisterNodeUpdate
+from trivialscheduler import GlobalSchedulerState
+
+
+################################################################
+#       Throughput of the global scheduler state at scale      #
+################################################################
+#
+# Drives a GlobalSchedulerState through the life of num_tasks tasks without
+# a simulation around it: every task is added, then tasks are started in
+# runnable order and finished one by one, which promotes the pending tasks
+# waiting for their results. Shapes:
+#
+#   chain   each task depends on the result of the one before, so every
+#           task but the first waits in pending_tasks
+#   wide    no dependencies, so every task waits in runnable_tasks
+#   dag     each task depends on the results of up to fan_in random
+#           earlier tasks
+
+NODE_ID = '0'
+
+
+def synthetic_tasks(shape, num_tasks, fan_in=2, seed=0):
+    import random
+    rng = random.Random(seed)
+    tasks = []
+    for i in xrange(num_tasks):
+        if shape == 'chain':
+            depends_on = ['r{}'.format(i - 1)] if i > 0 else []
+        elif shape == 'wide':
+            depends_on = []
+        else:
+            depends_on = sorted(set('r{}'.format(rng.randrange(i)) for _ in xrange(min(i, fan_in))))
+        tasks.append(Task('t{}'.format(i), [TaskPhase(0, depends_on, [], .001)],
+                          [TaskResult('r{}'.format(i), 100)]))
+    return tasks
+
+
+def run(tasks):
+    """Times adding, then starting and finishing, every task. Returns
+       (seconds to add, seconds to run)."""
+    state = GlobalSchedulerState(replaystate.EventSimulation())
+    state.update(RegisterNodeUpdate(NODE_ID, len(tasks)), 0)
+    start = time.time()
+    for task in tasks:
+        state.update(ForwardTaskUpdate(task, NODE_ID, False), 0)
+    added = time.time()
+    num_finished = 0
+    while state.runnable_tasks:
+        task_id = next(iter(state.runnable_tasks))
+        state.set_executing(task_id, NODE_ID, 0)
+        state.update(FinishTaskUpdate(task_id), 0)
+        num_finished += 1
+    finished = time.time()
+    if num_finished != len(tasks) or state.pending_tasks:
+        raise RuntimeError('{} of {} tasks finished'.format(num_finished, len(tasks)))
+    return (added - start, finished - added)
+
+
+parser = argparse.ArgumentParser(description="Benchmark the global scheduler "
+        "state on synthetic tasks.")
+parser.add_argument("--num-tasks", default=1000000, type=int)
+parser.add_argument("--shapes", nargs='+', default=['chain', 'wide', 'dag'],
+                    choices=['chain', 'wide', 'dag'])
+parser.add_argument("--fan-in", default=2, type=int)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for shape in args.shapes:
+        tasks = synthetic_tasks(shape, args.num_tasks, args.fan_in)
+        (add_seconds, run_seconds) = run(tasks)
+        print '{}: {} tasks, add {:.2f} s ({:.0f} tasks/s), start and finish {:.2f} s ({:.0f} tasks/s)'.format(
+            shape, len(tasks), add_seconds, len(tasks) / add_seconds,
+            run_seconds, len(tasks) / run_seconds)
@@ -1,6 +1,8 @@
 import abc
 import types
 
+from interning import intern_id
+
 class AddWorkerUpdate():
     def __init__(self, node_id=None, increment=1):
         self.node_id = str(node_id)
@@ -66,7 +68,7 @@ class ScheduleTaskUpdate():
 
 class FinishTaskUpdate():
     def __init__(self, task_id):
-        self.task_id = str(task_id)
+        self.task_id = intern_id(task_id)
 
     def __str__(self):
         return 'FinishTask({})'.format(self.task_id)
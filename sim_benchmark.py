@@ -0,0 +1,140 @@
+import argparse
+import glob
+import logging
+import os
+import random
+import sys
+import time
+
+import replaystate
+from columnartrace import load_trace
+from helpers import LOGGING_FORMAT, setup_logging
+from replaytrace import schedulers, event_queues, simulate
+from statslogging import NoopLogger
+
+
+class Timing():
+    def __init__(self, name):
+        self.name = name
+        self.wall_times = []
+        self.num_events = None
+        self.end_time = None
+
+    def best(self):
+        return min(self.wall_times)
+
+    def events_per_second(self):
+        return self.num_events / self.best()
+
+
+def replay_once(computation, event_queue_class, args):
+    event_simulation = replaystate.EventSimulation(event_queue_class)
+    logger = NoopLogger(event_simulation)
+    # the schedulers print progress to stdout, keep it out of the timings
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        simulate(computation, schedulers[args.scheduler], event_simulation,
+                 logger, args.num_nodes, args.num_workers_per_node,
+                 args.object_transfer_time_cost, args.db_message_delay)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return elapsed, event_simulation.num_events_scheduled(), event_simulation.get_time()
+
+
+def configure_logging(level):
+    # Debug records are fully formatted but discarded, so that enabling
+    # debug logging is timed without the cost of terminal output.
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler(open(os.devnull, 'w'))
+        handler.setFormatter(logging.Formatter(LOGGING_FORMAT))
+        root.addHandler(handler)
+    setup_logging(level)
+
+
+def benchmark_trace(trace_filename, args):
+    computation = load_trace(trace_filename)
+    log_levels = ['INFO', 'DEBUG'] if args.debug_logging else ['INFO']
+    timings = []
+    for log_level in log_levels:
+        configure_logging(log_level)
+        for name in args.event_queues:
+            if len(log_levels) > 1:
+                timing = Timing('{} {}'.format(name, log_level.lower()))
+            else:
+                timing = Timing(name)
+            for _ in range(args.iterations):
+                elapsed, timing.num_events, timing.end_time = replay_once(
+                    computation, event_queues[name], args)
+                timing.wall_times.append(elapsed)
+            timings.append(timing)
+
+    print os.path.basename(trace_filename)
+    baseline = timings[0]
+    for timing in timings:
+        print '    {:14s} {:8d} events  {:8.3f} s  {:10.0f} events/s  {:5.2f}x  simulated end {:.6f}'.format(
+            timing.name, timing.num_events, timing.best(),
+            timing.events_per_second(), baseline.best() / timing.best(),
+            timing.end_time)
+        if timing.end_time != baseline.end_time or timing.num_events != baseline.num_events:
+            print '    WARNING: {} diverged from {}'.format(timing.name, baseline.name)
+
+
+def benchmark_hold(num_pending, num_operations, args):
+    """Classic hold model: keep num_pending events queued, repeatedly pop the
+       earliest and push a replacement at a random later time."""
+    print 'hold model with {} pending events'.format(num_pending)
+    baseline = None
+    for name in args.event_queues:
+        rng = random.Random(0)
+        queue = event_queues[name]()
+        for seq in xrange(num_pending):
+            queue.push((rng.expovariate(1.0), seq, None))
+        seq = num_pending
+        start = time.time()
+        for _ in xrange(num_operations):
+            (t, _, _) = queue.pop()
+            queue.push((t + rng.expovariate(1.0), seq, None))
+            seq += 1
+        elapsed = time.time() - start
+        if baseline is None:
+            baseline = elapsed
+        print '    {:10s} {:8.3f} s  {:10.0f} holds/s  {:5.2f}x'.format(
+            name, elapsed, num_operations / elapsed, baseline / elapsed)
+
+
+parser = argparse.ArgumentParser(description="Compare simulator event queue "
+        "implementations by replaying traces.")
+parser.add_argument("traces", nargs='*',
+                    help="Trace files, defaults to traces/sweep/*")
+parser.add_argument("--event-queues", nargs='+', default=['heap', 'calendar'],
+                    choices=event_queues.keys())
+parser.add_argument("--scheduler", default='trivial', choices=schedulers.keys())
+parser.add_argument("--num-nodes", default=4, type=int)
+parser.add_argument("--num-workers-per-node", default=4, type=int)
+parser.add_argument("--object-transfer-time-cost", default=.00000001, type=float)
+parser.add_argument("--db-message-delay", default=.001, type=float)
+parser.add_argument("--iterations", default=3, type=int,
+                    help="Replays per configuration, the best time is reported")
+parser.add_argument("--debug-logging", action='store_true',
+                    help="Also replay with debug logging enabled (output is "
+                         "discarded) to measure the cost of logging")
+parser.add_argument("--hold", nargs='*', type=int, metavar='NUM_PENDING',
+                    help="Run the hold model with these queue sizes instead "
+                         "of replaying traces")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.hold is not None:
+        for num_pending in args.hold or [1000, 100000, 1000000]:
+            benchmark_hold(num_pending, 200000, args)
+        sys.exit(0)
+    trace_filenames = args.traces
+    if not trace_filenames:
+        trace_filenames = sorted(glob.glob(os.path.join('traces', 'sweep', '*.json*')))
+    for trace_filename in trace_filenames:
+        benchmark_trace(trace_filename, args)
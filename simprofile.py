@@ -0,0 +1,187 @@
+import json
+import time
+from collections import defaultdict
+
+import replaystate
+from eventqueue import HeapEventQueue
+from replaystate import EventKind
+
+
+################################################################
+#            Per-handler profiling of the event simulator      #
+################################################################
+#
+# ProfilingEventSimulation attributes the wall-clock time of every event
+# it runs to the event kind and, for plain callbacks, to the function
+# that was scheduled. Loggers wrapped in ProfilingLogger report the time
+# spent in each logger method, which is subtracted from the time of the
+# event that made the call, so every row of the profile is exclusive and
+# the rows add up to the replay's wall time. Time spent pushing and
+# popping the pending event queue is reported separately, and likewise
+# excluded from the events.
+
+_clock = time.time
+
+# event kinds whose target is a callable rather than a runtime object
+_CALLABLE_TARGET_KINDS = frozenset([EventKind.CALLBACK,
+                                    EventKind.GLOBAL_SCHEDULER_UPDATE,
+                                    EventKind.LOCAL_SCHEDULER_UPDATE,
+                                    EventKind.OBJECT_SIZE_LOCATIONS])
+
+
+def callback_owner(fn):
+    """Name of the class and method, or the function, behind a callback."""
+    owner = getattr(fn, '__self__', None)
+    if owner is not None:
+        return '{}.{}'.format(owner.__class__.__name__, fn.__name__)
+    code = getattr(fn, '__code__', None)
+    if code is not None and fn.__name__ == '<lambda>':
+        return '<lambda> {}:{}'.format(code.co_filename.rsplit('/', 1)[-1], code.co_firstlineno)
+    return getattr(fn, '__name__', type(fn).__name__)
+
+
+class ProfiledEventQueue(object):
+    """Wraps an event queue, timing its push and pop calls."""
+
+    def __init__(self, queue):
+        self._queue = queue
+        self.num_pushes = 0
+        self.push_seconds = 0
+        self.num_pops = 0
+        self.pop_seconds = 0
+
+    def push(self, entry):
+        start = _clock()
+        self._queue.push(entry)
+        self.push_seconds += _clock() - start
+        self.num_pushes += 1
+
+    def pop(self):
+        start = _clock()
+        entry = self._queue.pop()
+        self.pop_seconds += _clock() - start
+        self.num_pops += 1
+        return entry
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class ProfilingEventSimulation(replaystate.EventSimulation):
+    """EventSimulation that records wall-clock time and call counts per
+       event kind and handler. If profile_filename is given, report()
+       also writes the profile there as JSON.
+    """
+
+    def __init__(self, event_queue_class=HeapEventQueue, profile_filename=None):
+        replaystate.EventSimulation.__init__(self, event_queue_class)
+        self._scheduled = ProfiledEventQueue(self._scheduled)
+        self.profile_filename = profile_filename
+        # (kind name, owner) -> [calls, exclusive seconds]
+        self._event_stats = defaultdict(lambda: [0, 0])
+        # (logger class, method) -> [calls, seconds]
+        self._logger_stats = defaultdict(lambda: [0, 0])
+        self._logger_seconds = 0
+        self._start_time = None
+        self._end_time = None
+
+    def _run(self, t, event):
+        if event.kind in _CALLABLE_TARGET_KINDS:
+            owner = callback_owner(event.target)
+            if event.kind != EventKind.CALLBACK and event.kind != EventKind.OBJECT_SIZE_LOCATIONS:
+                owner = '{} {}'.format(owner, event.payload.__class__.__name__)
+        else:
+            owner = event.target.__class__.__name__
+        key = (EventKind.NAMES[event.kind], owner)
+        nested_seconds = self._logger_seconds + self._scheduled.push_seconds
+        start = self._mark()
+        replaystate.EventSimulation._run(self, t, event)
+        elapsed = self._mark() - start
+        nested_seconds = self._logger_seconds + self._scheduled.push_seconds - nested_seconds
+        stats = self._event_stats[key]
+        stats[0] += 1
+        stats[1] += elapsed - nested_seconds
+
+    def _mark(self):
+        # the profiled wall time runs from the first event or logger call
+        # to the last one
+        now = _clock()
+        if self._start_time is None:
+            self._start_time = now
+        self._end_time = now
+        return now
+
+    def record_logger_call(self, logger_name, method, start):
+        seconds = self._mark() - start
+        stats = self._logger_stats[(logger_name, method)]
+        stats[0] += 1
+        stats[1] += seconds
+        self._logger_seconds += seconds
+
+    def profile(self):
+        """The profile as a JSON-serializable dict."""
+        if self._start_time is None:
+            wall_seconds = 0
+        else:
+            wall_seconds = self._end_time - self._start_time
+        queue = self._scheduled
+        return {
+            'wall_seconds': wall_seconds,
+            'simulated_time': self.get_time(),
+            'num_events': sum(calls for (calls, _) in self._event_stats.itervalues()),
+            'events': [{'kind': kind, 'owner': owner, 'calls': calls, 'seconds': seconds}
+                       for ((kind, owner), (calls, seconds)) in sorted(self._event_stats.items())],
+            'loggers': [{'logger': logger_name, 'method': method, 'calls': calls, 'seconds': seconds}
+                        for ((logger_name, method), (calls, seconds)) in sorted(self._logger_stats.items())],
+            'event_queue': {'pushes': queue.num_pushes, 'push_seconds': queue.push_seconds,
+                            'pops': queue.num_pops, 'pop_seconds': queue.pop_seconds},
+        }
+
+    def report(self):
+        """Print a summary table and write the JSON profile, if requested."""
+        profile = self.profile()
+        wall_seconds = profile['wall_seconds']
+        rows = [(event['seconds'], event['calls'], event['kind'], event['owner'])
+                for event in profile['events']]
+        rows.extend((logger['seconds'], logger['calls'], 'logger',
+                     '{}.{}'.format(logger['logger'], logger['method']))
+                    for logger in profile['loggers'])
+        queue = profile['event_queue']
+        rows.append((queue['push_seconds'], queue['pushes'], 'event queue', 'push'))
+        rows.append((queue['pop_seconds'], queue['pops'], 'event queue', 'pop'))
+        rows.sort(reverse=True)
+        other_seconds = wall_seconds - sum(row[0] for row in rows)
+        print 'Simulation profile: {} events, {:.3f} s wall'.format(profile['num_events'], wall_seconds)
+        print '    {:24s} {:56s} {:>9s} {:>10s} {:>7s} {:>9s}'.format(
+            'kind', 'owner', 'calls', 'seconds', 'share', 'us/call')
+        for (seconds, calls, kind, owner) in rows + [(other_seconds, 0, 'other', '')]:
+            print '    {:24s} {:56s} {:9d} {:10.4f} {:6.1f}% {:9.2f}'.format(
+                kind, owner[:56], calls, seconds,
+                100.0 * seconds / wall_seconds if wall_seconds else 0,
+                1e6 * seconds / calls if calls else 0)
+        if self.profile_filename is not None:
+            with open(self.profile_filename, 'w') as f:
+                json.dump(profile, f, indent=2, sort_keys=True)
+        return profile
+
+
+class ProfilingLogger(object):
+    """Forwards every call to logger, charging the time it takes to the
+       profiling event simulation."""
+
+    def __init__(self, logger, event_simulation):
+        self._logger = logger
+        self._logger_name = logger.__class__.__name__
+        self._event_simulation = event_simulation
+
+    def __getattr__(self, name):
+        method = getattr(self._logger, name)
+        if not callable(method):
+            return method
+        def profiled(*args):
+            start = self._event_simulation._mark()
+            try:
+                return method(*args)
+            finally:
+                self._event_simulation.record_logger_call(self._logger_name, name, start)
+        return profiled
@@ -5,6 +5,7 @@ import heapq
 
 from collections import defaultdict
 from helpers import TimestampedLogger
+from interning import id_name, job_of
 
 class NoopLogger(object):
     def __init__(self, system_time):
@@ -52,41 +53,41 @@ class PrintingLogger(object):
         self._pylogger = TimestampedLogger(__name__+'.PrintingLogger', system_time)
 
     def task_submitted(self, task_id, node_id, dependencies):
-        self._pylogger.debug('submitted task {} on node {} - dependencies {}'.format(task_id, node_id, str(dependencies)))
+        self._pylogger.debug('submitted task {} on node {} - dependencies {}', task_id, node_id, dependencies)
 
     def task_scheduled(self, task_id, node_id, is_scheduled_locally):
         if is_scheduled_locally:
             how_scheduled = 'locally'
         else:
             how_scheduled = 'globally'
-        self._pylogger.debug('scheduled task {} on node {} - scheduled {}'.format(task_id, node_id, how_scheduled))
+        self._pylogger.debug('scheduled task {} on node {} - scheduled {}', task_id, node_id, how_scheduled)
 
     def task_started(self, task_id, node_id):
-        self._pylogger.debug('started task {} on node {}'.format(task_id, node_id))
+        self._pylogger.debug('started task {} on node {}', task_id, node_id)
 
     def task_finished(self, task_id, node_id):
-        self._pylogger.debug('finished task {} on node {}'.format(task_id, node_id))
+        self._pylogger.debug('finished task {} on node {}', task_id, node_id)
 
     def task_phase_started(self, task_id, phase_id, node_id):
-        self._pylogger.debug('started task {} phase {} on node {}'.format(task_id, phase_id, node_id))
+        self._pylogger.debug('started task {} phase {} on node {}', task_id, phase_id, node_id)
 
     def task_phase_finished(self, task_id, phase_id, node_id):
-        self._pylogger.debug('finished task {} phase {} on node {}'.format(task_id, phase_id, node_id))
+        self._pylogger.debug('finished task {} phase {} on node {}', task_id, phase_id, node_id)
 
     def object_created(self, object_id, node_id, object_size):
-        self._pylogger.debug('created object {} of size {} on node {}'.format(object_id, object_size, node_id))
+        self._pylogger.debug('created object {} of size {} on node {}', object_id, object_size, node_id)
 
     def object_instance_added(self, object_id, node_id, object_size):
-        self._pylogger.debug('new instance of object {} of size {} on node {}'.format(object_id, object_size, node_id))
+        self._pylogger.debug('new instance of object {} of size {} on node {}', object_id, object_size, node_id)
 
     def object_used(self, object_id, node_id, object_size, cache_depth_items, cache_depth_object_size):
-        self._pylogger.debug('used object {} at depth {} items {} bytes on node {}'.format(object_id, cache_depth_items, cache_depth_object_size, node_id))
+        self._pylogger.debug('used object {} at depth {} items {} bytes on node {}', object_id, cache_depth_items, cache_depth_object_size, node_id)
 
     def object_transfer_started(self, object_id, object_size, src_node_id, dst_node_id):
-        self._pylogger.debug('started transfer of object {} of size {} from node {} to node {}'.format(object_id, object_size, src_node_id, dst_node_id))
+        self._pylogger.debug('started transfer of object {} of size {} from node {} to node {}', object_id, object_size, src_node_id, dst_node_id)
 
     def object_transfer_finished(self, object_id, object_size, src_node_id, dst_node_id):
-        self._pylogger.debug('finished transfer of object {} of size {} from node {} to node {}'.format(object_id, object_size, src_node_id, dst_node_id))
+        self._pylogger.debug('finished transfer of object {} of size {} from node {} to node {}', object_id, object_size, src_node_id, dst_node_id)
 
     def job_ended(self):
         self._pylogger.debug('end of job')
@@ -172,6 +173,11 @@ class SummaryStats(object):
 
         self._object_lifetime_trackers = {}
 
+        # first submission and last task finished of each job, for tasks
+        # tagged with a job in composed workloads
+        self._job_submitted = {}
+        self._job_finished = {}
+
 
     class Timer():
         def __init__(self, name, system_time):
@@ -290,6 +296,9 @@ class SummaryStats(object):
         self._submit_to_activation_timer.start(task_id)
         if self._activation_tracker.task_submitted(task_id, dependencies):
             self._activated(task_id)
+        job = job_of(task_id)
+        if job is not None and job not in self._job_submitted:
+            self._job_submitted[job] = self._system_time.get_time()
 
     def task_scheduled(self, task_id, node_id, is_scheduled_locally):
         self._num_tasks_scheduled += 1
@@ -308,6 +317,9 @@ class SummaryStats(object):
         self._task_execution_time += self._task_timer.finish((task_id, node_id))
         self._last_task_finished = self._system_time.get_time()
         self._node_worker_tracker.task_finished(node_id)
+        job = job_of(task_id)
+        if job is not None:
+            self._job_finished[job] = self._last_task_finished
 
     def task_phase_started(self, task_id, phase_id, node_id):
         self._task_phase_timer.start((task_id, phase_id, node_id))
@@ -389,6 +401,14 @@ class SummaryStats(object):
         stats['max_cache_precise_items'] = max(map(lambda x: x[0], max_cache_info))
         stats['max_cache_precise_size'] = max(map(lambda x: x[1], max_cache_info))
 
+        if self._job_submitted:
+            job_completion_times = dict((job, self._job_finished[job] - submitted)
+                                        for (job, submitted) in self._job_submitted.iteritems())
+            stats['job_completion_times'] = job_completion_times
+            stats['mean_job_completion_time'] = \
+                sum(job_completion_times.itervalues()) / len(job_completion_times)
+            stats['max_job_completion_time'] = max(job_completion_times.itervalues())
+
         self.completed_successfully = True
         self.stats = stats
 
@@ -598,14 +618,19 @@ class StatsLogger(SummaryStats):
 
         if self._stats.completed_successfully:
             stats = self._stats.stats
-            self._pylogger.info('number of tasks executed {}'.format(stats['num_tasks']))
-            self._pylogger.info('total task execution time {}'.format(stats['task_time']))
+            self._pylogger.info('number of tasks executed {}', stats['num_tasks'])
+            self._pylogger.info('total task execution time {}', stats['task_time'])
 
-            self._pylogger.info('number of objects transferred {}'.format(stats['num_object_transfers']))
-            self._pylogger.info('size of objects transferred {}'.format(stats['object_transfer_size']))
-            self._pylogger.info('amount of time in object transfer {}'.format(stats['object_transfer_time']))
+            self._pylogger.info('number of objects transferred {}', stats['num_object_transfers'])
+            self._pylogger.info('size of objects transferred {}', stats['object_transfer_size'])
+            self._pylogger.info('amount of time in object transfer {}', stats['object_transfer_time'])
         else:
-            self._pylogger.info('Error computing stats - {}'.format(self._stats.err))
+            self._pylogger.info('Error computing stats - {}', self._stats.err)
+
+        if self.completed_successfully and 'job_completion_times' in self.stats:
+            self._pylogger.info('number of jobs {}', len(self.stats['job_completion_times']))
+            self._pylogger.info('mean job completion time {}', self.stats['mean_job_completion_time'])
+            self._pylogger.info('max job completion time {}', self.stats['max_job_completion_time'])
 
 
 class EventLogLogger():
@@ -617,41 +642,41 @@ class EventLogLogger():
         self._event_log.append({'timestamp': self._system_time.get_time(), 'event_name': event_name, 'event_data': event_data})
 
     def task_submitted(self, task_id, node_id, dependencies):
-        self._add_event('task_submitted', { 'task_id': task_id, 'node_id': node_id, 'dependencies': dependencies })
+        self._add_event('task_submitted', { 'task_id': id_name(task_id), 'node_id': node_id, 'dependencies': map(id_name, dependencies) })
 
     def task_scheduled(self, task_id, node_id, is_scheduled_locally):
-        self._add_event('task_scheduled', { 'task_id': task_id, 'node_id': node_id, 'is_scheduled_locally': is_scheduled_locally })
+        self._add_event('task_scheduled', { 'task_id': id_name(task_id), 'node_id': node_id, 'is_scheduled_locally': is_scheduled_locally })
 
     def task_started(self, task_id, node_id):
-        self._add_event('task_started', { 'task_id': task_id, 'node_id': node_id })
+        self._add_event('task_started', { 'task_id': id_name(task_id), 'node_id': node_id })
 
     def task_finished(self, task_id, node_id):
-        self._add_event('task_finished', { 'task_id': task_id, 'node_id': node_id })
+        self._add_event('task_finished', { 'task_id': id_name(task_id), 'node_id': node_id })
 
     def task_phase_started(self, task_id, phase_id, node_id):
-        self._add_event('task_phase_started', { 'task_id': task_id, 'phase_id': phase_id, 'node_id': node_id })
+        self._add_event('task_phase_started', { 'task_id': id_name(task_id), 'phase_id': phase_id, 'node_id': node_id })
 
     def task_phase_finished(self, task_id, phase_id, node_id):
-        self._add_event('task_phase_finished', { 'task_id': task_id, 'phase_id': phase_id, 'node_id': node_id })
+        self._add_event('task_phase_finished', { 'task_id': id_name(task_id), 'phase_id': phase_id, 'node_id': node_id })
 
     def object_created(self, object_id, node_id, object_size):
-        self._add_event('object_created', { 'object_id': object_id, 'node_id': node_id, 'object_size': object_size })
+        self._add_event('object_created', { 'object_id': id_name(object_id), 'node_id': node_id, 'object_size': object_size })
 
     def object_instance_added(self, object_id, node_id, object_size):
-        self._add_event('object_instance_added', { 'object_id': object_id, 'node_id': node_id, 'object_size': object_size })
+        self._add_event('object_instance_added', { 'object_id': id_name(object_id), 'node_id': node_id, 'object_size': object_size })
 
     def object_used(self, object_id, node_id, object_size, cache_depth_items, cache_depth_object_size):
         self._add_event('object_used', {
-            'object_id': object_id, 'node_id': node_id, 'object_size': object_size,
+            'object_id': id_name(object_id), 'node_id': node_id, 'object_size': object_size,
             'cache_depth_items': cache_depth_items,
             'cache_depth_object_size': cache_depth_object_size})
 
     def object_transfer_started(self, object_id, object_size, src_node_id, dst_node_id):
-        self._add_event('object_transfer_started', { 'object_id': object_id, 'object_size': object_size,
+        self._add_event('object_transfer_started', { 'object_id': id_name(object_id), 'object_size': object_size,
             'src_node_id': src_node_id, 'dst_node_id': dst_node_id })
 
     def object_transfer_finished(self, object_id, object_size, src_node_id, dst_node_id):
-        self._add_event('object_transfer_finished', { 'object_id': object_id, 'object_size': object_size,
+        self._add_event('object_transfer_finished', { 'object_id': id_name(object_id), 'object_size': object_size,
             'src_node_id': src_node_id, 'dst_node_id': dst_node_id })
 
     def job_ended(self):
@@ -0,0 +1,268 @@
+import argparse
+import array
+import math
+import random
+import time
+
+from tracewriter import TraceWriter
+
+
+################################################################
+#          Streaming generators of synthetic DAG traces        #
+################################################################
+#
+# Each generator lays out the tasks of a common Ray workload shape:
+#
+#   tree_reduce         leaves aggregated fan_in at a time, like tree_reduce.py
+#   map_shuffle_reduce  groups of fan_in mappers, each partitioning its output
+#                       for the fan_in reducers of its group
+#   wavefront           a stencil of width cells stepped in time, each cell
+#                       reading fan_in neighbouring cells of the step before
+#   rnn                 an RNN of width layers unrolled in time, like
+#                       workloads/rnn
+#   parameter_server    iterations of width gradient tasks on the current
+#                       parameters, aggregated fan_in at a time into the next
+#                       parameters, like workloads/rl_pong
+#
+# Task durations and result sizes are drawn from the given distributions
+# with a seeded random generator, so a seed always gives the same trace.
+# Tasks are written as they are generated and generators only remember the
+# task numbers they will still depend on, so traces of tens of millions of
+# tasks can be made for scale tests. As in synmultiply's traces, the driver
+# submits every task in its first phase and waits for the sink objects in
+# its second; it is written last, with its submits streamed.
+
+ROOT_TASK_ID = 't0'
+SUBMIT_INTERVAL = .000001
+DRIVER_WAIT = .001
+
+
+def task_id(n):
+    return 't{}'.format(n)
+
+
+def result_id(n, partition=None):
+    if partition is None:
+        return 'r{}'.format(n)
+    return 'r{}_{}'.format(n, partition)
+
+
+def parse_distribution(spec, rng):
+    """A function drawing from the distribution given as NAME:ARGS, one of
+       const:VALUE, uniform:LOW,HIGH, exp:MEAN, lognormal:MU,SIGMA or
+       pareto:SCALE,ALPHA."""
+    (name, _, args) = spec.partition(':')
+    try:
+        args = [float(arg) for arg in args.split(',')] if args else []
+    except ValueError:
+        raise ValueError('Bad distribution arguments in {}'.format(spec))
+    if name == 'const' and len(args) == 1:
+        value = args[0]
+        return lambda: value
+    if name == 'uniform' and len(args) == 2:
+        return lambda: rng.uniform(args[0], args[1])
+    if name == 'exp' and len(args) == 1:
+        return lambda: rng.expovariate(1. / args[0])
+    if name == 'lognormal' and len(args) == 2:
+        return lambda: rng.lognormvariate(args[0], args[1])
+    if name == 'pareto' and len(args) == 2:
+        return lambda: args[0] * rng.paretovariate(args[1])
+    raise ValueError('Unknown distribution {}'.format(spec))
+
+
+class SyntheticTrace():
+    """Writes tasks numbered 1, 2, ... as the generators make them. Task n
+       returns object result_id(n), or result_id(n, p) for each partition p
+       if it is partitioned."""
+
+    def __init__(self, writer, duration, size):
+        self.writer = writer
+        self.duration = duration
+        self.size = size
+        self.num_tasks = 0
+        # tasks whose results the driver waits for
+        self.sinks = array.array('l')
+
+    def task(self, depends_on, num_partitions=None):
+        """Write a task of one phase depending on the results of the given
+           tasks, or on the given object ids, and return its number."""
+        self.num_tasks += 1
+        n = self.num_tasks
+        if num_partitions is None:
+            results = [result_id(n)]
+        else:
+            results = [result_id(n, p) for p in xrange(num_partitions)]
+        self.writer.write_task({
+            'taskId': task_id(n),
+            'phases': [{
+                'phaseId': 0,
+                'dependsOn': [result_id(d) if isinstance(d, (int, long)) else d
+                              for d in depends_on],
+                'submits': [],
+                'duration': self.duration(),
+                'creates': [],
+                }],
+            'results': [{'objectId': object_id, 'size': int(round(self.size()))}
+                        for object_id in results],
+            })
+        return n
+
+    def sink(self, n):
+        self.sinks.append(n)
+
+    def finish(self):
+        """Write the driver and close the trace."""
+        num_tasks = self.num_tasks
+        self.writer.write_large_task({
+            'taskId': ROOT_TASK_ID,
+            'phases': [{
+                'phaseId': 0,
+                'dependsOn': [],
+                'submits': ({'taskId': task_id(n), 'timeOffset': (n - 1) * SUBMIT_INTERVAL}
+                            for n in xrange(1, num_tasks + 1)),
+                'duration': num_tasks * SUBMIT_INTERVAL,
+                'creates': [],
+                }, {
+                'phaseId': 1,
+                'dependsOn': (result_id(n) for n in self.sinks),
+                'submits': [],
+                'duration': DRIVER_WAIT,
+                'creates': [],
+                }],
+            'results': [],
+            })
+        self.writer.close(ROOT_TASK_ID)
+
+
+def reduce_tasks(trace, inputs, fan_in):
+    """Aggregate the results of the given tasks fan_in at a time until one
+       remains, and return its task."""
+    while len(inputs) > 1:
+        groups = [inputs[i:i + fan_in] for i in xrange(0, len(inputs), fan_in)]
+        inputs = [trace.task(group) if len(group) > 1 else group[0] for group in groups]
+    return inputs[0]
+
+
+def gen_tree_reduce(trace, num_tasks, fan_in, width):
+    fan_in = max(2, fan_in)
+    num_leaves = max(1, num_tasks * (fan_in - 1) // fan_in)
+    # levels[k] holds the results at height k not yet aggregated, so at most
+    # fan_in per level are remembered
+    levels = []
+    for _ in xrange(num_leaves):
+        n = trace.task([])
+        k = 0
+        while True:
+            if len(levels) == k:
+                levels.append([])
+            levels[k].append(n)
+            if len(levels[k]) < fan_in:
+                break
+            n = trace.task(levels[k])
+            levels[k] = []
+            k += 1
+    trace.sink(reduce_tasks(trace, [n for level in levels for n in level], fan_in))
+
+
+def gen_map_shuffle_reduce(trace, num_tasks, fan_in, width):
+    fan_in = max(1, fan_in)
+    for _ in xrange(max(1, num_tasks // (2 * fan_in))):
+        mappers = [trace.task([], fan_in) for _ in xrange(fan_in)]
+        for p in xrange(fan_in):
+            trace.sink(trace.task([result_id(m, p) for m in mappers]))
+
+
+def gen_wavefront(trace, num_tasks, fan_in, width):
+    if width is None:
+        width = max(1, int(math.sqrt(num_tasks)))
+    fan_in = max(1, fan_in)
+    row = [trace.task([]) for _ in xrange(width)]
+    for _ in xrange(1, max(1, num_tasks // width)):
+        next_row = []
+        for x in xrange(width):
+            start = max(0, x - (fan_in - 1) // 2)
+            next_row.append(trace.task(row[start:min(width, start + fan_in)]))
+        row = next_row
+    for n in row:
+        trace.sink(n)
+
+
+def gen_rnn(trace, num_tasks, fan_in, width):
+    num_layers = width or 6
+    state = [None] * num_layers
+    for _ in xrange(max(1, num_tasks // num_layers)):
+        below = None
+        for layer in xrange(num_layers):
+            depends_on = [n for n in [below, state[layer]] if n is not None]
+            state[layer] = below = trace.task(depends_on)
+        # the driver collects the output of every step
+        trace.sink(below)
+
+
+def gen_parameter_server(trace, num_tasks, fan_in, width):
+    num_workers = width or 10
+    fan_in = max(2, fan_in)
+    params = trace.task([])
+    while True:
+        gradients = [trace.task([params]) for _ in xrange(num_workers)]
+        params = trace.task([params, reduce_tasks(trace, gradients, fan_in)])
+        if trace.num_tasks >= num_tasks:
+            break
+    trace.sink(params)
+
+
+GENERATORS = {
+    'tree_reduce': gen_tree_reduce,
+    'map_shuffle_reduce': gen_map_shuffle_reduce,
+    'wavefront': gen_wavefront,
+    'rnn': gen_rnn,
+    'parameter_server': gen_parameter_server,
+}
+
+
+def generate(name, trace_filename, num_tasks, fan_in=2, width=None,
+             duration='exp:0.01', size='const:100000', seed=0):
+    """Write a synthetic trace of about num_tasks tasks. Returns the number
+       of tasks written, with the driver."""
+    rng = random.Random(seed)
+    writer = TraceWriter(trace_filename)
+    trace = SyntheticTrace(writer, parse_distribution(duration, rng),
+                           parse_distribution(size, rng))
+    try:
+        GENERATORS[name](trace, num_tasks, fan_in, width)
+        trace.finish()
+    except:
+        writer.abort()
+        raise
+    return writer.num_tasks
+
+
+def output_filename(name, num_tasks):
+    return 'traces/sweep/trace_syn_{}_{}.json.gz'.format(name, num_tasks)
+
+
+parser = argparse.ArgumentParser(description="Generate a synthetic trace.")
+parser.add_argument("generator", choices=sorted(GENERATORS))
+parser.add_argument("--num-tasks", default=10000, type=int)
+parser.add_argument("--fan-in", default=2, type=int,
+                    help="Inputs per aggregation, shuffle group size or stencil width")
+parser.add_argument("--width", default=None, type=int,
+                    help="Wavefront cells, RNN layers or parameter server workers")
+parser.add_argument("--duration", default='exp:0.01',
+                    help="Task duration distribution in seconds, e.g. const:0.01, "
+                         "uniform:0.001,0.1, exp:0.01, lognormal:-5,1 or pareto:0.001,2")
+parser.add_argument("--size", default='const:100000',
+                    help="Result size distribution in bytes")
+parser.add_argument("--seed", default=0, type=int)
+parser.add_argument("--output", default=None,
+                    help="Trace filename, traces/sweep/trace_syn_<generator>_<num tasks>.json.gz "
+                         "by default")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    trace_filename = args.output or output_filename(args.generator, args.num_tasks)
+    start = time.time()
+    num_tasks = generate(args.generator, trace_filename, args.num_tasks, args.fan_in,
+                         args.width, args.duration, args.size, args.seed)
+    print 'wrote {} tasks to {} in {:.1f} s'.format(num_tasks, trace_filename,
+                                                    time.time() - start)
@@ -1,5 +1,10 @@
 import unittest
+import logging
 import os
+import json
+import gzip
+import shutil
+import tempfile
 from collections import namedtuple
 
 # TODO both of these needed?
@@ -9,10 +14,44 @@ from replaystate import *
 import schedulerbase
 
 from replaytrace import schedulers
-from replaytrace import simulate
+from replaytrace import simulate, setup_simulation, finish_simulation, fork_simulation
+
+from helpers import setup_logging, TimestampedLogger
+from interning import intern_id, id_name, job_id, job_of
+from statslogging import PrintingLogger, NoopLogger, SummaryStats
+from simprofile import ProfilingEventSimulation, ProfilingLogger
+import columnartrace
+import tracedecoder
+import tracecache
+import daganalytics
+import trace_catalog
+import build_trace
+import combine_traces
+import syngen
+import tracewriter
+import workload_composer
+import trace_slice
+import trace_fusion
+import pdes_replay
+import pdes_analysis
+import trivialscheduler
+import scheduler_state_benchmark
+try:
+    import fakeredis
+    import build_trace_ng
+    import trace_extract_benchmark
+except ImportError:
+    fakeredis = None
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Base for tests that write files, to self.tmpdir."""
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
 
-from helpers import setup_logging
-from statslogging import PrintingLogger, NoopLogger
 
 class TestEventLoopTimers(unittest.TestCase):
     def setUp(self):
@@ -89,8 +128,11 @@ class TestEventLoopTimers(unittest.TestCase):
         callback = TestEventLoopTimers.ActiveCallback(self, start_time + 2, failure_action)
         timer_id = self.event_loop.add_timer(2, TestEventLoopTimers.active_handler, callback)
         self.event_loop.remove_timer(timer_id)
+        self.assertEquals(0, self.event_loop.num_timers())
+        self.assertEquals(1, self.event_loop.num_cancelled_timers())
         self.ts.advance_fully()
-        self.assertEquals(start_time + 2, self.ts.get_time())
+        # cancelled timers are removed, so they don't advance the clock
+        self.assertEquals(start_time, self.ts.get_time())
         self.assertFalse(callback.did_execute)
 
         # cancel during the advance by scheduling another callback
@@ -105,8 +147,100 @@ class TestEventLoopTimers(unittest.TestCase):
         self.ts.advance_fully()
         self.assertFalse(callback_ts_5.did_execute)
         self.assertTrue(callback_ts_2.did_execute)
-        self.assertEquals(start_time + 5, self.ts.get_time())
+        self.assertEquals(start_time + 2, self.ts.get_time())
+
+    def test_same_deadline_batch(self):
+        start_time = self.ts.get_time()
+        fired = []
+        def cancel_action():
+            fired.append(1)
+            self.event_loop.remove_timer(timer_id_2)
+        self.event_loop.add_timer(3, TestEventLoopTimers.active_handler, TestEventLoopTimers.ActiveCallback(self, start_time + 3, cancel_action))
+        timer_id_2 = self.event_loop.add_timer(3, TestEventLoopTimers.active_handler, TestEventLoopTimers.ActiveCallback(self, start_time + 3, lambda: fired.append(2)))
+        self.event_loop.add_timer(3, TestEventLoopTimers.active_handler, TestEventLoopTimers.ActiveCallback(self, start_time + 3, lambda: fired.append(3)))
+        self.ts.advance_fully()
+        self.assertEquals([1, 3], fired)
+        self.assertEquals(start_time + 3, self.ts.get_time())
+        self.assertEquals(0, self.event_loop.num_timers())
+
+    def test_exact_deadlines(self):
+        # timers spread over every wheel level and the overflow, some added
+        # while others fire, run at exactly their deadlines and in order
+        import random
+        rng = random.Random(0)
+        fired = []
+        num_added = [0]
+        def add_timer():
+            delta = rng.choice([0, 0.0004, 0.5, 3.0, 70.0, 5000.0, 1e5]) * rng.random()
+            deadline = self.ts.get_time() + delta
+            self.event_loop.add_timer(delta, handler, (deadline, num_added[0]))
+            num_added[0] += 1
+        def handler(context):
+            fired.append(context)
+            self.assertEquals(context[0], self.ts.get_time())
+            if num_added[0] < 4000 and rng.random() < 0.5:
+                add_timer()
+                add_timer()
+        for _ in range(2000):
+            add_timer()
+        self.ts.advance_fully()
+        self.assertEquals(num_added[0], len(fired))
+        self.assertEquals(sorted(fired), fired)
+
+
+
+class TestEventQueues(unittest.TestCase):
+    def _check_order(self, times):
+        import random
+        from eventqueue import HeapEventQueue, CalendarEventQueue
+        rng = random.Random(0)
+        heap_queue = HeapEventQueue()
+        calendar_queue = CalendarEventQueue()
+        heap_order = []
+        calendar_order = []
+        for (seq, t) in enumerate(times):
+            heap_queue.push((t, seq, None))
+            calendar_queue.push((t, seq, None))
+            # interleave pops so the calendar queue also shrinks and regrows
+            if rng.random() < 0.3:
+                heap_order.append(heap_queue.pop())
+                calendar_order.append(calendar_queue.pop())
+        while len(heap_queue):
+            heap_order.append(heap_queue.pop())
+            calendar_order.append(calendar_queue.pop())
+        self.assertEquals(0, len(calendar_queue))
+        self.assertEquals(heap_order, calendar_order)
+
+    def test_random_times(self):
+        import random
+        rng = random.Random(1)
+        self._check_order([rng.uniform(0, 1000) for _ in range(5000)])
+
+    def test_identical_times(self):
+        self._check_order([5.0] * 1000 + [1.0] * 1000)
+
+    def test_sparse_times(self):
+        self._check_order([0.0, 1e-9, 1e6, 3.0, 1e6 + 1e-9, 2e9, 7.5])
+
+
+class TestTimestampedLogger(unittest.TestCase):
+    class Unformattable():
+        def __str__(self):
+            raise AssertionError('debug message formatted while debug logging is disabled')
+
+    def tearDown(self):
+        setup_logging()
+
+    def test_debug_enabled_follows_level(self):
+        pylogger = TimestampedLogger(__name__+'.TestTimestampedLogger', EventSimulation())
+        setup_logging(logging.INFO)
+        self.assertFalse(pylogger.debug_enabled)
+        pylogger.debug('lazily formatted {}', TestTimestampedLogger.Unformattable())
+        setup_logging('DEBUG')
+        self.assertTrue(pylogger.debug_enabled)
 
+    def test_unknown_level(self):
+        self.assertRaises(ValueError, setup_logging, 'LOUD')
 
 class TestInvalidTrace(unittest.TestCase):
     def __init__(self, name):
@@ -151,7 +285,7 @@ class TestValidTrace(unittest.TestCase):
 
     class TaskTiming():
         def __init__(self, task_id, start_timestamp, end_timestamp):
-            self.task_id = str(task_id)
+            self.task_id = intern_id(task_id)
             self.start_timestamp = float(start_timestamp)
             self.end_timestamp = float(end_timestamp)
 
@@ -275,6 +409,544 @@ class TestCompletion(unittest.TestCase):
         logger.verify_all_finished()
 
 
+class TestSimulationFork(unittest.TestCase):
+    def _setup(self):
+        import json
+        trace_f = open(os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json'), 'r')
+        computation = json.load(trace_f, object_hook=computation_decoder)
+        trace_f.close()
+        event_simulation = EventSimulation()
+        return setup_simulation(computation, schedulers['trivial'], event_simulation,
+                                NoopLogger(event_simulation), 2, 2, .001, .0001)
+
+    @staticmethod
+    def _finish(simulation, db_message_delay=None):
+        if db_message_delay is not None:
+            simulation.set_db_message_delay(db_message_delay)
+        return (finish_simulation(simulation), simulation.event_simulation.get_time())
+
+    def test_fork_matches_full_runs(self):
+        full_run = self._finish(self._setup())
+        fork_time = full_run[1] / 2
+
+        what_if = self._setup()
+        what_if.event_simulation.advance_until(fork_time)
+        what_if_run = self._finish(what_if, .01)
+        self.assertNotEqual(full_run, what_if_run)
+
+        simulation = self._setup()
+        results = fork_simulation(simulation, fork_time,
+                                  [TestSimulationFork._finish,
+                                   lambda s: TestSimulationFork._finish(s, .01)])
+        self.assertEquals([full_run, what_if_run], results)
+        # the branches ran in child processes, the parent is still at fork_time
+        self.assertEquals(fork_time, simulation.event_simulation.get_time())
+        self.assertEquals(full_run, self._finish(simulation))
+
+    def test_failed_branch(self):
+        def fail(simulation):
+            raise ValueError('branch failure')
+        self.assertRaises(RuntimeError, fork_simulation, self._setup(), 0, [fail])
+
+    def test_unpicklable_result(self):
+        # a lambda cannot be pickled; the other branch still runs and is reaped
+        with self.assertRaises(RuntimeError) as context:
+            fork_simulation(self._setup(), 0, [lambda s: lambda: None, lambda s: 1])
+        self.assertIn('branch 0 failed', str(context.exception))
+        self.assertNotIn('branch 1', str(context.exception))
+
+
+class TestPdesReplay(unittest.TestCase):
+    def _replay(self, trace_name, scheduler_str, num_shards):
+        computation = load_test_trace(trace_name)
+        if num_shards:
+            event_simulation = pdes_replay.ShardedEventSimulation(num_shards)
+            replay = pdes_replay.simulate_sharded
+        else:
+            event_simulation = EventSimulation()
+            replay = simulate
+        # records every logger call with its time
+        logger = pdes_replay.RecordingLogger(event_simulation)
+        success = replay(computation, schedulers[scheduler_str], event_simulation,
+                         logger, 4, 1, .000001, .001)
+        return (success, event_simulation.get_time(), logger.records)
+
+    @staticmethod
+    def _logged(records):
+        # uses of copy sources in other shards are accounted late
+        return sorted((t, name, args) for (t, _, name, args) in records
+                      if name != 'object_used')
+
+    def test_matches_serial_replay(self):
+        for trace_name in ['forkjoin', 'rnn_6layers_w3s2n1', 'two_results', 'two_phase']:
+            for scheduler_str in ['trivial', 'location_aware', 'trivial_local', 'delay']:
+                (success, t, records) = self._replay(trace_name, scheduler_str, 0)
+                (sharded_success, sharded_t, sharded_records) = self._replay(trace_name, scheduler_str, 2)
+                self.assertTrue(sharded_success)
+                self.assertEquals((success, t), (sharded_success, sharded_t))
+                self.assertEquals(self._logged(records), self._logged(sharded_records))
+                # the coordinator replays logger calls in time order
+                times = [record[0] for record in sharded_records]
+                self.assertEquals(sorted(times), times)
+
+    def test_more_shards_than_nodes(self):
+        (success, t, _) = self._replay('forkjoin', 'trivial', 0)
+        self.assertEquals((success, t), self._replay('forkjoin', 'trivial', 16)[:2])
+
+    def test_requires_lookahead(self):
+        event_simulation = pdes_replay.ShardedEventSimulation(2)
+        self.assertRaises(ValueError, pdes_replay.simulate_sharded, load_test_trace('forkjoin'),
+                          schedulers['trivial'], event_simulation,
+                          NoopLogger(event_simulation), 4, 2, .000001, 0)
+
+
+class TestPdesAnalysis(unittest.TestCase):
+    def test_partitions_and_lookahead(self):
+        computation = load_test_trace('rnn_6layers_w3s2n1')
+        event_simulation = pdes_analysis.PartitionTracingEventSimulation(2)
+        simulation = setup_simulation(computation, schedulers['trivial'], event_simulation,
+                                      NoopLogger(event_simulation), 4, 1, .000001, .001)
+        event_simulation.add_node_event_loops(simulation.local_event_loops)
+        self.assertTrue(finish_simulation(simulation))
+        partitions = set(p for (_, p) in event_simulation.event_partitions)
+        self.assertEquals(set([pdes_replay.GLOBAL_PARTITION, 0, 1]), partitions)
+        # scheduler database updates carry db_message_delay across partitions
+        delays = event_simulation.cross_partition_delays
+        self.assertTrue((pdes_replay.GLOBAL_PARTITION, 0) in delays)
+        self.assertTrue((0, pdes_replay.GLOBAL_PARTITION) in delays)
+        for ((src, dst), partition_delays) in delays.items():
+            self.assertTrue(min(partition_delays) >= .001 - pdes_analysis.DELAY_TOLERANCE)
+        (num_windows, speedup) = pdes_analysis.window_speedup(event_simulation.event_partitions, .001)
+        self.assertTrue(num_windows > 0)
+        self.assertTrue(1 <= speedup <= 3)
+
+    def test_window_speedup(self):
+        event_partitions = [(0, 'a'), (0, 'b'), (0.5, 'a'), (1.5, 'a'), (1.5, 'a'), (1.7, 'b')]
+        # windows [0, 1) and [1, 2) have critical paths of 2 events each
+        self.assertEquals((2, 1.5), pdes_analysis.window_speedup(event_partitions, 1))
+        self.assertEquals((6, 1.0), pdes_analysis.window_speedup(event_partitions, 0))
+
+
+class TestProfilingEventSimulation(unittest.TestCase):
+    def _replay(self, event_simulation, logger):
+        import json
+        trace_f = open(os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json'), 'r')
+        computation = json.load(trace_f, object_hook=computation_decoder)
+        trace_f.close()
+        return simulate(computation, schedulers['trivial'], event_simulation,
+                        logger, 2, 2, .001, .0001)
+
+    def test_profile_matches_plain_replay(self):
+        import json
+        plain = EventSimulation()
+        self.assertTrue(self._replay(plain, NoopLogger(plain)))
+
+        profile_f = tempfile.NamedTemporaryFile(suffix='.json')
+        profiled = ProfilingEventSimulation(profile_filename=profile_f.name)
+        logger = ProfilingLogger(NoopLogger(profiled), profiled)
+        self.assertTrue(self._replay(profiled, logger))
+        self.assertEquals(plain.get_time(), profiled.get_time())
+        self.assertEquals(plain.num_events_scheduled(), profiled.num_events_scheduled())
+
+        profile = json.load(open(profile_f.name))
+        profile_f.close()
+        self.assertEquals(profile['num_events'], sum(e['calls'] for e in profile['events']))
+        self.assertEquals(plain.num_events_scheduled(), profile['event_queue']['pushes'])
+        kinds = set(e['kind'] for e in profile['events'])
+        self.assertTrue(set(['GLOBAL_SCHEDULER_UPDATE', 'LOCAL_SCHEDULER_UPDATE',
+                             'TASK_PHASE_COMPLETE']) <= kinds)
+        logger_calls = dict((l['method'], l['calls']) for l in profile['loggers']
+                            if l['logger'] == 'NoopLogger')
+        self.assertEquals(1, logger_calls['job_ended'])
+        self.assertEquals(logger_calls['task_submitted'], logger_calls['task_finished'])
+
+
+class TestInterning(unittest.TestCase):
+    def test_intern_id(self):
+        task_id = intern_id('a1b2c3')
+        self.assertTrue(task_id is intern_id('a1b2c3'))
+        self.assertTrue(task_id is intern_id(task_id))
+        self.assertTrue(intern_id(12) is intern_id('12'))
+        self.assertNotEqual(task_id, intern_id('a1b2c4'))
+        self.assertTrue(task_id)
+
+    def test_prints_as_name(self):
+        task_id = intern_id('a1b2c3')
+        self.assertEquals('a1b2c3', str(task_id))
+        self.assertEquals('a1b2c3', id_name(task_id))
+        self.assertEquals('a1b2c3', id_name('a1b2c3'))
+        self.assertEquals('task a1b2c3', 'task {}'.format(task_id))
+        self.assertEquals("['a1b2c3']", str([task_id]))
+
+    def test_pickle_reinterns(self):
+        import pickle
+        task_id = intern_id('a1b2c3')
+        loaded = pickle.loads(pickle.dumps(task_id, 2))
+        self.assertEquals(task_id, loaded)
+        self.assertTrue(task_id is intern_id(loaded))
+
+    def test_model_ids_interned(self):
+        phase = TaskPhase(0, ['7'], [TaskSubmit('2', 0)], 1.0, [ObjectPut('8', 10, 0)])
+        task = Task('1', [phase], [TaskResult('9', 10)])
+        self.assertTrue(task.id() is intern_id('1'))
+        self.assertTrue(phase.depends_on[0] is intern_id('7'))
+        self.assertTrue(phase.submits[0].task_id is intern_id('2'))
+        self.assertTrue(phase.creates[0].object_id is intern_id('8'))
+        self.assertTrue(task.get_results()[0].object_id is intern_id('9'))
+        computation = ComputationDescription('1', [task, Task('2', [TaskPhase(0, [], [], 1.0)], [])])
+        self.assertTrue(computation.get_task('1') is task)
+
+    def test_native_str(self):
+        task_id = intern_id(u'a1b2c3')
+        self.assertTrue(type(task_id) is str)
+        self.assertTrue(task_id is intern('a1b2c3'))
+        self.assertEquals('"a1b2c3"', json.dumps(task_id))
+        self.assertEquals('a1b2c3, 12', ', '.join([task_id, intern_id(12)]))
+
+    def test_unreferenced_ids_freed(self):
+        # build the name at run time: a literal would keep it interned
+        task = Task(''.join(['freed-', 'a1b2c3']), [TaskPhase(0, [], [], 1.0)], [])
+        self.assertTrue(task.id() is intern_id(''.join(['freed-', 'a1b2c3'])))
+        del task
+        # nothing holds the old id, so a fresh copy of the name is interned
+        name = ''.join(['freed-', 'a1b2c3'])
+        self.assertTrue(intern_id(name) is name)
+
+    def test_replay_with_debug_logging(self):
+        class ListHandler(logging.Handler):
+            def __init__(self):
+                logging.Handler.__init__(self)
+                self.messages = []
+
+            def emit(self, record):
+                self.messages.append(record.getMessage())
+
+        handler = ListHandler()
+        root_logger = logging.getLogger()
+        root_handlers = root_logger.handlers
+        root_logger.handlers = [handler]
+        try:
+            setup_logging('DEBUG')
+            computation = load_test_trace('forkjoin')
+            event_simulation = EventSimulation()
+            self.assertTrue(simulate(computation, schedulers['trivial'], event_simulation,
+                                     NoopLogger(event_simulation), 2, 2, .00001, .001))
+        finally:
+            root_logger.handlers = root_handlers
+            setup_logging()
+        runnable = [m for m in handler.messages if m.startswith('Runnable tasks are ')]
+        self.assertTrue(runnable)
+        for message in runnable:
+            (listed, checked) = message[len('Runnable tasks are '):].split(', checking task ')
+            self.assertIn(checked, listed.split(', '))
+            self.assertTrue(computation.get_task(checked).id() in computation.get_task_ids())
+
+
+class TestCompactTaskModel(unittest.TestCase):
+    def test_slots(self):
+        phase = TaskPhase(0, ['7'], [TaskSubmit('2', 0)], 1.0, [ObjectPut('8', 10, 0)])
+        task = Task('1', [phase], [TaskResult('9', 10)])
+        for obj in [task, phase, phase.submits[0], phase.creates[0], task.get_results()[0]]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_shared_lists(self):
+        dependency_lists = {}
+        phase1 = TaskPhase(0, ['7', '8'], [], 1.0, None, dependency_lists)
+        phase2 = TaskPhase(0, [intern_id('7'), '8'], [], 1.0, None, dependency_lists)
+        empty = TaskPhase(1, [], [], 1.0, None, dependency_lists)
+        self.assertTrue(phase1.depends_on is phase2.depends_on)
+        self.assertEquals((intern_id('7'), intern_id('8')), phase1.depends_on)
+        self.assertTrue(empty.depends_on is ())
+        self.assertEquals(1, len(dependency_lists))
+        # without a table, nothing outlives the phase
+        self.assertFalse(TaskPhase(0, ['7', '8'], [], 1.0).depends_on is phase1.depends_on)
+        self.assertTrue(empty.submits is ())
+        self.assertTrue(empty.creates is ())
+
+    def test_accessors(self):
+        phases = [TaskPhase(0, ['7'], [], 1.0), TaskPhase(1, ['8'], [], 1.0)]
+        task = Task('1', phases, [])
+        self.assertEquals([intern_id('7')], list(task.get_depends_on()))
+        self.assertTrue(task.get_phase(1) is phases[1])
+        self.assertEquals(phases, task.phases())
+        task.add_result(TaskResult('9', 10))
+        self.assertEquals([intern_id('9')], [result.object_id for result in task.get_results()])
+
+
+class TestColumnarTrace(TempDirTestCase):
+    def setUp(self):
+        super(TestColumnarTrace, self).setUp()
+        trace_filename = os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json')
+        self.computation = columnartrace.load_trace(trace_filename)
+        self.path = os.path.join(self.tmpdir, 'rnn.columnar')
+        columnartrace.write_columnar_trace(self.computation, self.path)
+
+    @staticmethod
+    def _task_fields(task):
+        phases = [(p.phase_id, p.depends_on, p.duration,
+                   [(s.task_id, s.time_offset) for s in p.submits],
+                   [(c.object_id, c.size, c.time_offset) for c in p.creates])
+                  for p in task.phases()]
+        results = [(r.object_id, r.size) for r in task.get_results()]
+        return (task.id(), task.is_root, phases, results)
+
+    def test_round_trip(self):
+        columnar = columnartrace.load_trace(self.path)
+        self.assertTrue(isinstance(columnar, columnartrace.ColumnarComputationDescription))
+        self.assertItemsEqual(self.computation.get_task_ids(), columnar.get_task_ids())
+        for task_id in self.computation.get_task_ids():
+            self.assertEquals(self._task_fields(self.computation.get_task(task_id)),
+                              self._task_fields(columnar.get_task(task_id)))
+        columnar.verify()
+
+    def test_tasks_built_on_demand(self):
+        columnar = columnartrace.load_columnar_trace(self.path)
+        self.assertEquals(1, columnar._tasks.num_materialized())
+        submit = columnar.get_root_task().get_phase(0).submits[0]
+        task = columnar.get_task(submit.task_id)
+        self.assertEquals(2, columnar._tasks.num_materialized())
+        self.assertTrue(task is columnar.get_task(submit.task_id))
+
+    def test_replay_matches_json(self):
+        end_times = []
+        for computation in [self.computation, columnartrace.load_columnar_trace(self.path)]:
+            event_simulation = EventSimulation()
+            self.assertTrue(simulate(computation, schedulers['trivial'], event_simulation,
+                                     NoopLogger(event_simulation), 2, 2, .001, .0001))
+            end_times.append(event_simulation.get_time())
+        self.assertEquals(end_times[0], end_times[1])
+
+
+class TestStreamingTraceDecoder(unittest.TestCase):
+    COMBINED_TRACE = '''{"is_combined": true, "tasks": [
+        {"taskId": "0", "results": [], "phases": [
+            {"phaseId": 0, "duration": 0, "dependsOn": [], "creates": [],
+             "submits": [{"taskId": "1", "timeOffset": 0}, {"taskId": "2", "timeOffset": 0}]},
+            {"phaseId": 1, "duration": 0, "dependsOn": ["11", "12"], "creates": [], "submits": []}]},
+        {"taskId": "1", "results": [{"objectId": "11", "size": 100}], "phases": [
+            {"phaseId": 0, "duration": 1.5, "dependsOn": [], "creates": [], "submits": []}]},
+        {"taskId": "2", "results": [{"objectId": "12", "size": 1200}], "phases": [
+            {"phaseId": 0, "duration": 2.25, "dependsOn": [], "submits": [],
+             "creates": [{"objectId": "13", "size": 10, "timeOffset": 1}]}]}
+        ], "rootTask": "0"}'''
+
+    @staticmethod
+    def _decode(text, chunk_size):
+        from StringIO import StringIO
+        decoder = tracedecoder.StreamingTraceDecoder(StringIO(text), chunk_size)
+        computation = decoder.decode()
+        return (computation, decoder)
+
+    def _assert_same(self, expected, computation):
+        self.assertEquals(expected.is_combined, computation.is_combined)
+        self.assertEquals(expected.get_root_task().id(), computation.get_root_task().id())
+        self.assertItemsEqual(expected.get_task_ids(), computation.get_task_ids())
+        for task_id in expected.get_task_ids():
+            self.assertEquals(TestColumnarTrace._task_fields(expected.get_task(task_id)),
+                              TestColumnarTrace._task_fields(computation.get_task(task_id)))
+
+    def test_trace_files(self):
+        import json
+        for name in ['rnn_6layers_w3s2n1.json', 'forkjoin.json', 'two_phase.json']:
+            trace_filename = os.path.join(script_path(), 'traces', 'test', name)
+            expected = json.load(open(trace_filename), object_hook=computation_decoder)
+            text = open(trace_filename).read()
+            for chunk_size in [1, 7, 4096]:
+                (computation, decoder) = self._decode(text, chunk_size)
+                self._assert_same(expected, computation)
+                self.assertEquals(len(text), decoder.bytes_decoded)
+                self.assertEquals(len(expected.get_task_ids()), decoder.num_tasks)
+
+    def test_combined_trace(self):
+        import json
+        expected = json.loads(self.COMBINED_TRACE, object_hook=computation_decoder)
+        for chunk_size in [1, 5, 4096]:
+            (computation, _) = self._decode(self.COMBINED_TRACE, chunk_size)
+            self._assert_same(expected, computation)
+            self.assertTrue(computation.is_combined)
+            self.assertTrue(computation.get_task('1').is_root)
+            self.assertTrue(computation.get_task('2').is_root)
+
+    def test_truncated_trace(self):
+        self.assertRaises(ValueError, self._decode, self.COMBINED_TRACE[:-20], 16)
+
+    def test_dependency_lists_per_decode(self):
+        text = self.COMBINED_TRACE.replace('"dependsOn": [], "creates": [], "submits": []',
+                                           '"dependsOn": ["11", "12"], "creates": [], "submits": []')
+        (first, _) = self._decode(text, 4096)
+        (second, _) = self._decode(text, 4096)
+        depends_on = first.get_task('0').get_phase(1).depends_on
+        self.assertTrue(first.get_task('1').get_depends_on() is depends_on)
+        self.assertFalse(second.get_task('1').get_depends_on() is depends_on)
+
+
+class TestDagAnalytics(TempDirTestCase):
+    @staticmethod
+    def _computation():
+        # a and c run in parallel, b starts when a's first phase creates oa2
+        tasks = [Task('a', [TaskPhase(0, [], [], 2.0, [ObjectPut('oa2', 50, 1.0)]), TaskPhase(1, [], [], 1.0)],
+                      [TaskResult('oa', 10)]),
+                 Task('b', [TaskPhase(0, ['oa2'], [], 3.0)], [TaskResult('ob', 20)]),
+                 Task('c', [TaskPhase(0, ['oa'], [], 1.0)], [TaskResult('oc', 30)])]
+        submits = [TaskSubmit('a', 0), TaskSubmit('b', 0), TaskSubmit('c', 0.5)]
+        root = Task('root', [TaskPhase(0, [], submits, 1.0), TaskPhase(1, ['oa', 'ob', 'oc'], [], 0)], [])
+        return ComputationDescription('root', [root] + tasks)
+
+    def test_levels(self):
+        (columns, _) = columnartrace.trace_columns(self._computation())
+        analytics = daganalytics.DagAnalytics.from_columns(columns)
+        self.assertEquals([0, 0, 1.0, 3.0], [analytics.top_level(t) for t in ['root', 'a', 'b', 'c']])
+        self.assertEquals(4.0, analytics.critical_path)
+        self.assertEquals(4.0, analytics.bottom_level('root'))
+        self.assertEquals(4.0, analytics.bottom_level('a'))
+        self.assertEquals(3.0, analytics.bottom_level('b'))
+        self.assertEquals(8.0, analytics.total_work)
+        self.assertEquals(2, analytics.max_parallelism())
+
+    def test_fan_and_transfers(self):
+        (columns, _) = columnartrace.trace_columns(self._computation())
+        analytics = daganalytics.DagAnalytics.from_columns(columns)
+        self.assertEquals([1, 3], [analytics.task_fan_out[analytics.task_index(t)] for t in ['b', 'a']])
+        self.assertEquals(3, analytics.task_fan_in[analytics.task_index('root')])
+        self.assertEquals([0, 3, 1], analytics.reuse_histogram().tolist())
+        self.assertEquals(10 + 10 + 50 + 20 + 30, analytics.total_dependency_bytes)
+        self.assertEquals(analytics.total_dependency_bytes, analytics.cross_task_bytes)
+        # only oa has two consumer tasks
+        self.assertEquals(10, analytics.transfer_lower_bound(2))
+        self.assertEquals(0, analytics.transfer_lower_bound(1))
+
+    def test_cache(self):
+        trace_filename = os.path.join(self.tmpdir, 'trace.json')
+        with open(os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json')) as f:
+            text = f.read()
+        with open(trace_filename, 'w') as f:
+            f.write(text)
+        analytics = daganalytics.analyze_trace(trace_filename)
+        path = daganalytics.analytics_path(trace_filename)
+        self.assertTrue(os.path.isfile(path))
+        cached = daganalytics.analyze_trace(trace_filename)
+        self.assertEquals(analytics.summary(4), cached.summary(4))
+        self.assertEquals(analytics.task_bottom_level.tolist(), cached.task_bottom_level.tolist())
+        # a changed trace is analyzed again
+        os.utime(trace_filename, (0, 0))
+        source_stat = daganalytics._source_stat(trace_filename)
+        self.assertEquals(None, daganalytics.DagAnalytics.load(path, source_stat))
+        daganalytics.analyze_trace(trace_filename)
+        self.assertNotEquals(None, daganalytics.DagAnalytics.load(path, source_stat))
+
+
+class TestTraceCatalog(TempDirTestCase):
+    def setUp(self):
+        super(TestTraceCatalog, self).setUp()
+        self.root = os.path.join(self.tmpdir, 'traces')
+        os.makedirs(os.path.join(self.root, 'test'))
+        for name in ['rnn_6layers_w3s2n1.json', 'forkjoin.json']:
+            shutil.copy(os.path.join(script_path(), 'traces', 'test', name),
+                        os.path.join(self.root, 'test', name))
+        with open(os.path.join(self.root, 'test', 'broken.json'), 'w') as f:
+            f.write('[]')
+        self.catalog = os.path.join(self.tmpdir, 'catalog.sqlite')
+
+    def _path(self, name):
+        return os.path.join(self.root, 'test', name)
+
+    def test_select(self):
+        self.assertEquals(3, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        self.assertEquals([self._path('forkjoin.json'), self._path('rnn_6layers_w3s2n1.json')],
+                          trace_catalog.select_traces(self.catalog, order_by='num_tasks'))
+        self.assertEquals([self._path('rnn_6layers_w3s2n1.json')],
+                          trace_catalog.select_traces(self.catalog, min_num_tasks=10))
+        self.assertEquals([self._path('forkjoin.json')],
+                          trace_catalog.select_traces(self.catalog, max_critical_path=3.2))
+        self.assertRaises(ValueError, trace_catalog.select_traces, self.catalog, min_size=1)
+
+    def test_incremental(self):
+        trace_catalog.update_catalog([self.root], self.catalog, 1)
+        self.assertEquals(0, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        # touched but unchanged
+        os.utime(self._path('forkjoin.json'), (0, 0))
+        self.assertEquals(0, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        with open(self._path('forkjoin.json'), 'a') as f:
+            f.write(' ')
+        self.assertEquals(1, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        os.remove(self._path('forkjoin.json'))
+        self.assertEquals(0, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        self.assertEquals([self._path('rnn_6layers_w3s2n1.json')],
+                          trace_catalog.select_traces(self.catalog))
+
+    def test_columnar_columns_hashed(self):
+        import numpy as np
+        path = self._path('forkjoin.columnar')
+        columnartrace.write_columnar_trace(columnartrace.load_trace(self._path('forkjoin.json')), path)
+        os.remove(self._path('forkjoin.json'))
+        trace_catalog.update_catalog([self.root], self.catalog, 1)
+        self.assertEquals([path], trace_catalog.select_traces(self.catalog, max_critical_path=3.2))
+        # same header, longer phases
+        duration_filename = os.path.join(path, 'phase_duration.npy')
+        np.save(duration_filename, np.load(duration_filename) * 10)
+        os.utime(os.path.join(path, columnartrace.HEADER_FILENAME), (0, 0))
+        self.assertEquals(1, trace_catalog.update_catalog([self.root], self.catalog, 1))
+        self.assertEquals([], trace_catalog.select_traces(self.catalog, max_critical_path=3.2))
+
+
+class TestTraceCache(TempDirTestCase):
+    def setUp(self):
+        super(TestTraceCache, self).setUp()
+        self.trace_filename = os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json')
+        self.cache = tracecache.TraceCache(os.path.join(self.tmpdir, 'cache'), 1 << 30)
+
+    def test_hit_matches_trace(self):
+        expected = columnartrace.load_trace(self.trace_filename)
+        tracecache.load_trace(self.trace_filename, True, self.cache)
+        self.assertEquals((0, 1), (self.cache.hits, self.cache.misses))
+        computation = tracecache.load_trace(self.trace_filename, True, self.cache)
+        self.assertEquals((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertItemsEqual(expected.get_task_ids(), computation.get_task_ids())
+        for task_id in expected.get_task_ids():
+            self.assertEquals(TestColumnarTrace._task_fields(expected.get_task(task_id)),
+                              TestColumnarTrace._task_fields(computation.get_task(task_id)))
+        self.assertEquals(expected.get_root_task().id(), computation.get_root_task().id())
+
+    def test_verified_flag(self):
+        key = self.cache.key(self.trace_filename)
+        tracecache.load_trace(self.trace_filename, False, self.cache)
+        self.assertFalse(self.cache.get(key)[0])
+        tracecache.load_trace(self.trace_filename, True, self.cache)
+        self.assertTrue(self.cache.get(key)[0])
+
+    def test_model_version_invalidates(self):
+        tracecache.load_trace(self.trace_filename, True, self.cache)
+        model_version = replaystate.MODEL_VERSION
+        try:
+            replaystate.MODEL_VERSION = model_version + 1
+            tracecache.load_trace(self.trace_filename, True, self.cache)
+        finally:
+            replaystate.MODEL_VERSION = model_version
+        self.assertEquals((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_unreadable_entry(self):
+        key = self.cache.key(self.trace_filename)
+        tracecache.load_trace(self.trace_filename, True, self.cache)
+        with open(self.cache._entry_path(key), 'wb') as f:
+            f.write('truncated')
+        self.assertEquals(None, self.cache.get(key))
+        self.assertEquals([], self.cache.entries())
+
+    def test_lru_eviction(self):
+        computation = columnartrace.load_trace(self.trace_filename)
+        for key in ['a', 'b', 'c']:
+            self.cache.put(key, computation, True)
+            path = self.cache._entry_path(key)
+            os.utime(path, (0, {'a': 100, 'b': 200, 'c': 300}[key]))
+        self.cache.get('a')
+        entry_size = os.path.getsize(self.cache._entry_path('a'))
+        self.cache.max_bytes = 2 * entry_size
+        self.cache.evict()
+        self.assertEquals(None, self.cache.get('b'))
+        self.assertNotEquals(None, self.cache.get('a'))
+        self.assertNotEquals(None, self.cache.get('c'))
+
+
 def trace_scheduler_matrix_suite():
     import glob
     files = glob.glob(os.path.join(script_path(), 'traces', 'test', '*.json'))
@@ -287,6 +959,10 @@ def trace_scheduler_matrix_suite():
 def script_path():
     return os.path.dirname(os.path.realpath(__file__))
 
+def load_test_trace(trace_name):
+    with open(os.path.join(script_path(), 'traces', 'test', trace_name + '.json')) as f:
+        return json.load(f, object_hook=computation_decoder)
+
 
 class TestComputationObjects(unittest.TestCase):
 
@@ -295,6 +971,86 @@ class TestComputationObjects(unittest.TestCase):
         self.assertEquals(FinishTaskUpdate(task_id = 1), FinishTaskUpdate(task_id = '1'))
 
 
+class TestComputationVerify(unittest.TestCase):
+    @staticmethod
+    def _computation(tasks, root_submits):
+        root = Task('root', [TaskPhase(0, [], [TaskSubmit(task_id, 0) for task_id in root_submits], 1.0)], [])
+        return ComputationDescription('root', [root] + tasks)
+
+    def test_deep_nesting(self):
+        # each task submits the next one, so the DFS path is as long as the
+        # trace
+        n = 20000
+        tasks = [Task('t{}'.format(i),
+                      [TaskPhase(0, [], [TaskSubmit('t{}'.format(i + 1), 0)] if i + 1 < n else [], 1.0)],
+                      [TaskResult('o{}'.format(i), 1)])
+                 for i in xrange(n)]
+        self._computation(tasks, ['t0']).verify()
+
+    def test_cycle(self):
+        tasks = [Task('a', [TaskPhase(0, ['ob'], [], 1.0)], [TaskResult('oa', 1)]),
+                 Task('b', [TaskPhase(0, ['oa'], [], 1.0)], [TaskResult('ob', 1)])]
+        computation = self._computation(tasks, ['a', 'b'])
+        with self.assertRaisesRegexp(ValidationError, 'Cyclic dependencies'):
+            computation.verify()
+
+    def test_cycle_between_phases(self):
+        # b's second phase waits for an object that a only creates after
+        # b's first phase depends on a's result
+        tasks = [Task('a', [TaskPhase(0, [], [], 1.0), TaskPhase(1, ['ob'], [], 1.0)], [TaskResult('oa', 1)]),
+                 Task('b', [TaskPhase(0, ['oa'], [], 1.0)], [TaskResult('ob', 1)])]
+        computation = self._computation(tasks, ['a', 'b'])
+        with self.assertRaisesRegexp(ValidationError, 'Cyclic dependencies'):
+            computation.verify()
+
+    def test_error_order(self):
+        # a duplicate call is reported before a duplicate object found earlier
+        tasks = [Task('a', [TaskPhase(0, [], [], 1.0)], [TaskResult('o', 1)]),
+                 Task('b', [TaskPhase(0, [], [TaskSubmit('a', 0)], 1.0)], [TaskResult('o', 1)])]
+        computation = self._computation(tasks, ['a', 'b'])
+        with self.assertRaisesRegexp(ValidationError, 'Duplicate call to task a'):
+            computation.verify()
+        tasks = [Task('a', [TaskPhase(0, ['missing'], [], 1.0)], [TaskResult('o', 1)]),
+                 Task('b', [TaskPhase(0, [], [], 1.0)], [TaskResult('o', 1)])]
+        computation = self._computation(tasks, ['a', 'b'])
+        with self.assertRaisesRegexp(ValidationError, 'Duplicate result object id o'):
+            computation.verify()
+        tasks = [Task('a', [TaskPhase(0, ['missing'], [], 1.0)], [TaskResult('o', 1)])]
+        computation = self._computation(tasks, ['a'])
+        with self.assertRaisesRegexp(ValidationError, 'Dependency on missing object id missing'):
+            computation.verify()
+
+
+class TestDirectedGraph(unittest.TestCase):
+    def test_adjacency(self):
+        dg = DirectedGraph()
+        (a, b, c, d) = map(dg.get_id, ['a', 'b', 'c', 'd'])
+        # edges from a are not contiguous in the edge list
+        for (src, dst) in [(a, b), (b, d), (a, c), (c, d)]:
+            dg.add_edge(src, dst)
+        self.assertEquals([b, c], dg.adj_out(a))
+        self.assertEquals([b, c], dg.adj_in(d))
+        self.assertEquals([], dg.adj_in(a))
+        self.assertEquals('c', dg.get_node(c))
+        self.assertEquals([a, b, c, d], dg.topo_sort(a))
+        dg.add_edge(d, dg.get_id('e'))
+        self.assertEquals([a, b, c, d, dg.get_id('e')], dg.topo_sort(a))
+
+    def test_analyze(self):
+        tasks = [Task('a', [TaskPhase(0, [], [], 2.0)], [TaskResult('oa', 10)]),
+                 Task('b', [TaskPhase(0, ['oa'], [], 3.0)], [TaskResult('ob', 20)]),
+                 Task('c', [TaskPhase(0, [], [], 1.0)], [TaskResult('oc', 30)])]
+        root = Task('root', [TaskPhase(0, [], [TaskSubmit(task_id, 0) for task_id in 'abc'], 1.0)], [])
+        computation = ComputationDescription('root', [root] + tasks)
+        (num_tasks, normalized_critical_path, total_tasks_durations,
+         num_objects, objects_size) = computation.analyze()
+        self.assertEquals(4, num_tasks)
+        self.assertEquals(7.0, total_tasks_durations)
+        # root -> a -> oa -> b
+        self.assertAlmostEquals(6.0 / 7.0, normalized_critical_path)
+        self.assertEquals((3, 60), (num_objects, objects_size))
+
+
 class TestSchedulerObjects(unittest.TestCase):
     def test_equality(self):
         phase_0_0 = TaskPhase(phase_id = 0, depends_on = [], submits = [], duration = 1.0)
@@ -1013,6 +1769,622 @@ class TestNodeRuntime(unittest.TestCase):
         self.object_store._install_object(2, node_id)
         self._advance()
         self.assertItemsEqual([(4.2, FinishTaskUpdate(task_0.id()))], self.updates)
+class TestStreamingTraceBuilder(TempDirTestCase):
+    @staticmethod
+    def event_logs():
+        def schedule(time, task_id, depends_on):
+            return {'event': 'SCHEDULE', 'time': time, 'taskId': task_id, 'dependsOn': depends_on}
+        def begin(time, task_id):
+            return {'event': 'BEGIN', 'time': time, 'taskId': task_id}
+        def end(time, result_id):
+            return {'event': 'END', 'time': time, 'results': [{'objectId': result_id, 'size': 100}]}
+        driver = [{'event': 'DRIVER_BEGIN', 'time': 1.},
+                  schedule(1.1, 'a', []),
+                  schedule(1.2, 'b', ['ra']),
+                  {'event': 'DRIVER_END', 'time': 5.}]
+        worker1 = [begin(2., 'a'),
+                   {'event': 'PUT', 'time': 2.1, 'objectId': 'pa', 'size': 10},
+                   end(2.5, 'ra')]
+        worker2 = [begin(3., 'b'),
+                   {'event': 'PHASE_END', 'time': 3.1},
+                   {'event': 'PHASE_BEGIN', 'time': 3.5, 'dependsOn': ['pa']},
+                   end(4., 'rb')]
+        return [driver, worker1, worker2]
+
+    def stream(self, event_logs, trace_filename='trace.json'):
+        trace_filename = os.path.join(self.tmpdir, trace_filename)
+        num_tasks = build_trace.stream_trace(event_logs, trace_filename)
+        computation = columnartrace.load_trace(trace_filename)
+        computation.verify()
+        self.assertEquals(num_tasks, len(computation.get_task_ids()))
+        return computation
+
+    def test_matches_batch_build(self):
+        event_logs = self.event_logs()
+        task_dependencies = build_trace.build_dependencies(event_logs)
+        task_roots = []
+        tasks = []
+        for event_log in event_logs:
+            tasks += build_trace.build_tasks(task_dependencies, event_log, task_roots)
+        expected = json.loads(json.dumps({'rootTask': task_roots[0], 'tasks': tasks}),
+                              object_hook=computation_decoder)
+        computation = self.stream(event_logs, 'trace.json.gz')
+        self.assertEquals(build_trace.ROOT_TASK_ID, id_name(computation.get_root_task().id()))
+        self.assertItemsEqual(expected.get_task_ids(), computation.get_task_ids())
+        for task_id in expected.get_task_ids():
+            self.assertEquals(TestColumnarTrace._task_fields(expected.get_task(task_id)),
+                              TestColumnarTrace._task_fields(computation.get_task(task_id)))
+
+    def test_build_tasks_per_log(self):
+        (driver, worker1, worker2) = self.event_logs()
+        task_dependencies = {'a': [], 'b': ['ra']}
+        task_roots = []
+        tasks = build_trace.build_tasks(task_dependencies, worker2, task_roots)
+        self.assertEquals([], task_roots)
+        self.assertEquals(['b'], [task['taskId'] for task in tasks])
+        self.assertEquals([['ra'], ['pa']], [phase['dependsOn'] for phase in tasks[0]['phases']])
+        tasks = build_trace.build_tasks(task_dependencies, driver, task_roots)
+        self.assertEquals([build_trace.ROOT_TASK_ID], task_roots)
+        self.assertEquals([['a', 'b']], [[submit['taskId'] for submit in phase['submits']]
+                                         for phase in tasks[0]['phases']])
+        self.assertEquals([], build_trace.build_tasks(task_dependencies, [], task_roots))
+
+    def test_begin_before_schedule(self):
+        (driver, worker1, worker2) = self.event_logs()
+        # clock skew puts b's BEGIN and END before its SCHEDULE
+        for event in worker2:
+            event['time'] -= 2.
+        computation = self.stream([driver, worker1, worker2])
+        self.assertEquals(['ra'], [id_name(object_id) for object_id in
+                                   computation.get_task('b').get_phase(0).depends_on])
+
+    def test_root_task_written_last(self):
+        trace_filename = os.path.join(self.tmpdir, 'trace.json')
+        build_trace.stream_trace(self.event_logs(), trace_filename)
+        with open(trace_filename) as f:
+            trace = json.load(f)
+        self.assertEquals(['a', 'b', build_trace.ROOT_TASK_ID],
+                          [task['taskId'] for task in trace['tasks']])
+
+    def test_log_dir(self):
+        for (i, event_log) in enumerate(self.event_logs()):
+            with open(os.path.join(self.tmpdir, 'worker{}.log'.format(i)), 'w') as f:
+                for event in event_log:
+                    f.write(json.dumps(event) + '\n')
+        computation = self.stream(build_trace.iter_json_dir(self.tmpdir))
+        self.assertEquals(3, len(computation.get_task_ids()))
+
+    def test_no_root(self):
+        trace_filename = os.path.join(self.tmpdir, 'trace.json')
+        self.assertEquals(0, build_trace.stream_trace(self.event_logs()[1:], trace_filename))
+        self.assertFalse(os.path.exists(trace_filename))
+
+class TestCombineTraces(unittest.TestCase):
+    def load(self):
+        trace_filename = os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json')
+        with open(trace_filename) as f:
+            return json.load(f, object_hook=computation_decoder)
+
+    def test_merge_repetitions(self):
+        num_tasks = len(self.load().get_task_ids())
+        computation = combine_traces.merge_computations([self.load() for _ in range(3)],
+                                                        [0, 1., 1.])
+        computation.verify()
+        self.assertEquals(3 * num_tasks + 1, len(computation.get_task_ids()))
+        root_task = computation.get_root_task()
+        self.assertEquals([0, 1., 2.], [submit.time_offset for submit in
+                                        root_task.get_phase(0).submits])
+        self.assertEquals(3, len(root_task.get_phase(1).depends_on))
+
+    def test_remap_ids(self):
+        computation = self.load()
+        root_task_id = computation.get_root_task().id()
+        task = computation.get_task(computation.get_root_task().get_phase(0).submits[0].task_id)
+        (task_id, object_id) = (task.id(), task.get_results()[0].object_id)
+        combine_traces.remap_ids(computation, {root_task_id: 'root', task_id: 'task'},
+                                 {object_id: 'object'})
+        computation.verify()
+        self.assertEquals('root', id_name(computation.get_root_task().id()))
+        self.assertEquals('object', id_name(computation.get_task('task').get_results()[0].object_id))
+        self.assertFalse(task_id in computation.get_task_ids())
+
+    def test_remap_unknown_object(self):
+        with self.assertRaises(Exception):
+            combine_traces.replace_object_id(self.load(), 'no such object', 'object')
+
+class TestSyntheticTraces(TempDirTestCase):
+    def generate(self, name, num_tasks=200, fan_in=3, **kwargs):
+        trace_filename = os.path.join(self.tmpdir, '{}.json.gz'.format(name))
+        num_written = syngen.generate(name, trace_filename, num_tasks, fan_in, **kwargs)
+        return (trace_filename, num_written)
+
+    def test_generators_verify(self):
+        for name in syngen.GENERATORS:
+            (trace_filename, num_written) = self.generate(name)
+            computation = columnartrace.load_trace(trace_filename)
+            computation.verify()
+            self.assertEquals(num_written, len(computation.get_task_ids()))
+            self.assertTrue(150 < num_written < 250, '{} wrote {} tasks'.format(name, num_written))
+            self.assertEquals(syngen.ROOT_TASK_ID, id_name(computation.get_root_task().id()))
+
+    def test_shapes(self):
+        analytics = daganalytics.DagAnalytics.from_columns(daganalytics.trace_columns(
+            self.generate('rnn', 60, width=3, duration='const:1')[0]))
+        # 20 steps of 3 layers, plus the driver's wait
+        self.assertAlmostEquals(22 + syngen.DRIVER_WAIT, analytics.critical_path)
+        analytics = daganalytics.DagAnalytics.from_columns(daganalytics.trace_columns(
+            self.generate('tree_reduce', 16, fan_in=2, duration='const:1')[0]))
+        # the 8 leaves and the driver
+        self.assertEquals(9, analytics.max_parallelism())
+
+    def test_seed(self):
+        (trace_filename, _) = self.generate('wavefront', duration='exp:0.01',
+                                            size='uniform:1,1000', seed=1)
+        with gzip.open(trace_filename) as f:
+            first = f.read()
+        self.generate('wavefront', duration='exp:0.01', size='uniform:1,1000', seed=1)
+        with gzip.open(trace_filename) as f:
+            self.assertEquals(first, f.read())
+        self.generate('wavefront', duration='exp:0.01', size='uniform:1,1000', seed=2)
+        with gzip.open(trace_filename) as f:
+            self.assertNotEquals(first, f.read())
+
+    def test_bad_distribution(self):
+        with self.assertRaises(ValueError):
+            syngen.parse_distribution('uniform:1', None)
+
+    def test_large_task(self):
+        trace_filename = os.path.join(self.tmpdir, 'trace.json')
+        writer = tracewriter.TraceWriter(trace_filename)
+        writer.write_task({'taskId': 'a', 'phases': [], 'results': []})
+        writer.write_large_task({'taskId': 'b', 'phases': ({'ids': (str(i) for i in range(3))}
+                                                          for _ in range(2)), 'results': []})
+        writer.close('b')
+        with open(trace_filename) as f:
+            trace = json.load(f)
+        self.assertEquals('b', trace['rootTask'])
+        self.assertEquals([{'ids': ['0', '1', '2']}] * 2, trace['tasks'][1]['phases'])
+
+class TestWorkloadComposer(TempDirTestCase):
+    SOURCES = [os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json'),
+               os.path.join(script_path(), 'traces', 'test', 'forkjoin.json')]
+
+    def setUp(self):
+        super(TestWorkloadComposer, self).setUp()
+        self.trace_filename = os.path.join(self.tmpdir, 'workload.json.gz')
+
+    def compose(self, sources=SOURCES, **kwargs):
+        workload_composer.compose_workload(sources, self.trace_filename, **kwargs)
+        computation = columnartrace.load_trace(self.trace_filename)
+        computation.verify()
+        self.assertTrue(computation.is_combined)
+        return computation
+
+    def test_job_tags(self):
+        self.assertEquals('j3', job_of(intern_id(job_id('j3', 'a/b'))))
+        self.assertEquals(None, job_of('a'))
+
+    def test_trace_arrivals(self):
+        arrivals_filename = os.path.join(self.tmpdir, 'arrivals')
+        with open(arrivals_filename, 'w') as f:
+            f.write('0 0\n1.5 1\n3 0\n')
+        computation = self.compose(arrivals='trace:' + arrivals_filename)
+        sources = [columnartrace.load_trace(filename) for filename in self.SOURCES]
+        self.assertEquals(2 * len(sources[0].get_task_ids()) + len(sources[1].get_task_ids()) + 1,
+                          len(computation.get_task_ids()))
+        submits = computation.get_root_task().get_phase(0).submits
+        self.assertEquals([0, 1.5, 3], [submit.time_offset for submit in submits])
+        self.assertEquals(['j0', 'j1', 'j2'], [job_of(submit.task_id) for submit in submits])
+
+    def test_scaling(self):
+        source = columnartrace.load_trace(self.SOURCES[0])
+        computation = self.compose(self.SOURCES[:1], arrivals='poisson:1', num_jobs=1,
+                                   duration_scale='const:2', size_scale='const:3')
+        for task_id in source.get_task_ids():
+            task = source.get_task(task_id)
+            scaled = computation.get_task(job_id('j0', task_id))
+            self.assertAlmostEquals(2 * task.get_phase(0).duration, scaled.get_phase(0).duration)
+            self.assertEquals([3 * result.size for result in task.get_results()],
+                              [result.size for result in scaled.get_results()][:len(task.get_results())])
+
+    def test_per_job_completion_times(self):
+        computation = self.compose(arrivals='bursty:1,10,2', num_jobs=6, seed=3)
+        event_simulation = replaystate.EventSimulation()
+        logger = SummaryStats(event_simulation)
+        simulate(computation, schedulers['trivial'], event_simulation, logger, 2, 4, .001, .0001,
+                 cache_policy_class=replaystate.LRUObjectCache)
+        self.assertTrue(logger.completed_successfully, logger.err)
+        job_completion_times = logger.stats['job_completion_times']
+        self.assertItemsEqual(['j{}'.format(i) for i in range(6)], job_completion_times.keys())
+        self.assertTrue(all(t > 0 for t in job_completion_times.values()))
+        self.assertEquals(max(job_completion_times.values()), logger.stats['max_job_completion_time'])
+
+    def test_needs_an_end(self):
+        with self.assertRaises(ValueError):
+            workload_composer.compose_workload(self.SOURCES, self.trace_filename, 'poisson:1')
+
+
+class TestTraceSlice(TempDirTestCase):
+    RNN_TRACE = os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json')
+
+    def wavefront(self):
+        trace_filename = os.path.join(self.tmpdir, 'wavefront.json.gz')
+        syngen.generate('wavefront', trace_filename, 40, fan_in=3, width=4,
+                        duration='const:0.01', size='uniform:10,1000')
+        return columnartrace.load_trace(trace_filename)
+
+    def check_slice(self, computation, task_ids, sliced):
+        sliced.verify()
+        sliced_ids = set(sliced.get_task_ids())
+        self.assertTrue(task_ids <= sliced_ids)
+        sizes = {}
+        for task_id in computation.get_task_ids():
+            for result in computation.get_task(task_id).get_results():
+                sizes[result.object_id] = result.size
+        for task_id in sliced_ids - task_ids:
+            task = sliced.get_task(task_id)
+            if task is sliced.get_root_task():
+                continue
+            self.assertTrue(id_name(task_id).startswith(trace_slice.SOURCE_TASK_PREFIX))
+            self.assertEquals(0, task.get_phase(0).duration)
+            for result in task.get_results():
+                self.assertEquals(sizes[result.object_id], result.size)
+
+    def test_nominal_schedule(self):
+        computation = self.wavefront()
+        (submit_times, levels) = trace_slice.nominal_schedule(computation)
+        self.assertEquals(41, len(submit_times))
+        self.assertAlmostEquals(9 * syngen.SUBMIT_INTERVAL, submit_times[intern_id(syngen.task_id(10))])
+        # the cells of each step depend on those of the step before
+        self.assertEquals(1, levels[intern_id(syngen.task_id(4))])
+        self.assertEquals(2, levels[intern_id(syngen.task_id(5))])
+        self.assertEquals(10, levels[intern_id(syngen.task_id(40))])
+
+    def test_window(self):
+        computation = self.wavefront()
+        (submit_times, levels) = trace_slice.nominal_schedule(computation)
+        start = submit_times[intern_id(syngen.task_id(9))]
+        end = submit_times[intern_id(syngen.task_id(17))]
+        task_ids = trace_slice.window_tasks(submit_times, start, end)
+        self.assertEquals(set(intern_id(syngen.task_id(n)) for n in range(9, 17)), task_ids)
+        sliced = trace_slice.slice_computation(computation, task_ids, submit_times)
+        self.check_slice(computation, task_ids, sliced)
+        root = sliced.get_root_task()
+        self.assertEquals(trace_slice.SLICE_ROOT_TASK_ID, id_name(root.id()))
+        # the cells of step 2 read the four cells of step 1
+        self.assertEquals(8 + 4 + 1, len(sliced.get_task_ids()))
+        offsets = dict((submit.task_id, submit.time_offset) for submit in root.get_phase(0).submits)
+        self.assertAlmostEquals(0, offsets[intern_id(syngen.task_id(9))])
+        self.assertAlmostEquals(7 * syngen.SUBMIT_INTERVAL, offsets[intern_id(syngen.task_id(16))])
+
+    def test_fraction(self):
+        computation = self.wavefront()
+        (submit_times, levels) = trace_slice.nominal_schedule(computation)
+        task_ids = trace_slice.window_tasks(submit_times, 0, trace_slice.fraction_end(submit_times, .25))
+        self.assertEquals(10, len(task_ids))
+        sliced = trace_slice.slice_computation(computation, task_ids, submit_times)
+        self.check_slice(computation, task_ids, sliced)
+        # the driver is kept, and waits for sources standing in for the last step
+        self.assertEquals(computation.get_root_task().id(), sliced.get_root_task().id())
+
+    def test_levels_and_subtree(self):
+        computation = columnartrace.load_trace(self.RNN_TRACE)
+        (submit_times, levels) = trace_slice.nominal_schedule(computation)
+        self.assertEquals(len(computation.get_task_ids()), len(levels))
+        for num_levels in range(1, 4):
+            task_ids = trace_slice.level_tasks(levels, num_levels)
+            self.check_slice(computation, task_ids,
+                             trace_slice.slice_computation(computation, task_ids, submit_times))
+        root_task_id = computation.get_root_task().id()
+        self.assertEquals(set(computation.get_task_ids()),
+                          trace_slice.subtree_tasks(computation, root_task_id))
+        submitted = computation.get_root_task().get_phase(0).submits[0].task_id
+        task_ids = trace_slice.subtree_tasks(computation, submitted)
+        self.check_slice(computation, task_ids,
+                         trace_slice.slice_computation(computation, task_ids, submit_times))
+
+    def test_written_slice_replays(self):
+        computation = self.wavefront()
+        (submit_times, levels) = trace_slice.nominal_schedule(computation)
+        task_ids = trace_slice.window_tasks(submit_times, submit_times[intern_id(syngen.task_id(20))], 1)
+        slice_filename = os.path.join(self.tmpdir, 'slice.json')
+        tracewriter.write_computation(
+            trace_slice.slice_computation(computation, task_ids, submit_times), slice_filename)
+        sliced = columnartrace.load_trace(slice_filename)
+        self.check_slice(computation, task_ids, sliced)
+        event_simulation = replaystate.EventSimulation()
+        logger = SummaryStats(event_simulation)
+        simulate(sliced, schedulers['trivial'], event_simulation, logger, 2, 2, .001, .0001,
+                 cache_policy_class=replaystate.LRUObjectCache)
+        self.assertTrue(logger.completed_successfully, logger.err)
+        self.assertEquals(len(sliced.get_task_ids()), logger.stats['num_tasks'])
+
+
+class TestTraceFusion(TempDirTestCase):
+    def generate(self, name, num_tasks, **kwargs):
+        trace_filename = os.path.join(self.tmpdir, name + '.json.gz')
+        syngen.generate(name, trace_filename, num_tasks, duration='const:0.001', **kwargs)
+        return columnartrace.load_trace(trace_filename)
+
+    def test_linear_chain(self):
+        computation = self.generate('rnn', 12, width=1)
+        (fused, num_dropped) = trace_fusion.fuse_tasks(computation, .0035)
+        fused.verify()
+        self.assertEquals(8, num_dropped)
+        self.assertEquals(13 - 8, len(fused.get_task_ids()))
+        task = fused.get_task(syngen.task_id(4))
+        self.assertEquals(3, task.num_phases())
+        # results of the first two tasks are put at the end of their phases
+        self.assertEquals([intern_id(syngen.result_id(4))],
+                          [put.object_id for put in task.get_phase(0).creates])
+        self.assertEquals([intern_id(syngen.result_id(6))],
+                          [result.object_id for result in task.get_results()])
+        self.assertEquals((intern_id(syngen.result_id(3)),), task.get_phase(0).depends_on)
+
+    def test_sibling_group(self):
+        computation = self.generate('map_shuffle_reduce', 8, fan_in=2, size='const:10')
+        (fused, num_dropped) = trace_fusion.fuse_tasks(computation, .0025)
+        fused.verify()
+        # the two mappers of each shuffle group have the same, empty,
+        # dependencies and fill a group; the reducers depend on both
+        task = fused.get_task(syngen.task_id(1))
+        self.assertEquals(2, task.num_phases())
+        self.assertEquals((), task.get_phase(0).depends_on)
+        self.assertEquals(2, num_dropped)
+        self.assertEquals(1, fused.get_task(syngen.task_id(3)).num_phases())
+
+    def test_long_tasks_are_kept(self):
+        computation = self.generate('wavefront', 16, fan_in=3, width=4)
+        (fused, num_dropped) = trace_fusion.fuse_tasks(computation, .001)
+        self.assertEquals(0, num_dropped)
+        self.assertEquals(len(computation.get_task_ids()), len(fused.get_task_ids()))
+
+    def test_overhead_report(self):
+        computation = self.generate('wavefront', 40, fan_in=3, width=4)
+        (fused, num_dropped) = trace_fusion.fuse_tasks(computation, .01)
+        fused.verify()
+        self.assertTrue(num_dropped > 0)
+        fused_filename = os.path.join(self.tmpdir, 'fused.json')
+        tracewriter.write_computation(fused, fused_filename)
+        columnartrace.load_trace(fused_filename).verify()
+        report = trace_fusion.overhead_report(computation, fused, 'trivial', 2, 2, .00000001, .01)
+        self.assertEquals(41, report['num_tasks'])
+        self.assertEquals(41 - num_dropped, report['num_fused_tasks'])
+        self.assertTrue(report['control_plane_savings'] > 0)
+        self.assertAlmostEquals(report['fused_job_completion_time'] - report['job_completion_time'],
+                                report['job_completion_time_change'])
+        self.assertAlmostEquals(report['execution_cost'] - report['control_plane_savings'],
+                                report['job_completion_time_change'])
+        self.assertAlmostEquals(report['fused_zero_delay_job_completion_time']
+                                - report['zero_delay_job_completion_time'],
+                                report['execution_cost'])
+
+    def test_replay_leaves_stdout(self):
+        import sys
+        from StringIO import StringIO
+        computation = self.generate('wavefront', 40, fan_in=3, width=4)
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            trace_fusion.replay_stats(computation, 'trivial', 2, 2, .00000001, .01)
+            self.assertTrue(sys.stdout is output)
+        finally:
+            sys.stdout = stdout
+        # only the summary of the replay, no scheduler progress
+        self.assertEquals(2, len(output.getvalue().splitlines()))
+
+
+class TestGlobalSchedulerState(unittest.TestCase):
+    def setUp(self):
+        self.state = trivialscheduler.GlobalSchedulerState(EventSimulation())
+        self.state.update(RegisterNodeUpdate('0', 4), 0)
+
+    def add(self, task_id, depends_on, is_scheduled_locally=False):
+        task = Task(task_id, [TaskPhase(0, depends_on, [], 1.)], [TaskResult('r' + task_id, 10)])
+        self.state.update(ForwardTaskUpdate(task, '0', is_scheduled_locally), 0)
+        return task.id()
+
+    def finish(self, task_id):
+        self.state.set_executing(task_id, '0', 0)
+        self.state.update(FinishTaskUpdate(task_id), 1)
+
+    def test_ordered_task_set(self):
+        task_set = trivialscheduler.OrderedTaskSet()
+        self.assertEquals(None, task_set.first())
+        for task_id in range(200):
+            task_set.add(task_id)
+        task_set.add(3)
+        for task_id in range(1, 200, 2):
+            task_set.remove(task_id)
+        task_set.discard(1)
+        task_set.remove(0)
+        task_set.add(0)
+        self.assertEquals(range(2, 200, 2) + [0], list(task_set))
+        self.assertEquals(100, len(task_set))
+        self.assertEquals(2, task_set.first())
+        self.assertTrue(4 in task_set)
+        self.assertFalse(5 in task_set)
+        with self.assertRaises(KeyError):
+            task_set.remove(5)
+
+    def test_priority_task_set(self):
+        task_set = trivialscheduler.PriorityTaskSet(lambda task_id: task_id % 3)
+        self.assertEquals(None, task_set.first())
+        for task_id in range(200):
+            task_set.add(task_id)
+        task_set.add(3)
+        for task_id in range(0, 200, 2):
+            task_set.remove(task_id)
+        task_set.discard(0)
+        self.assertEquals(3, task_set.first())
+        self.assertEquals(range(3, 200, 6) + range(1, 200, 6) + range(5, 200, 6), list(task_set))
+        self.assertEquals(100, len(task_set))
+        self.assertTrue(5 in task_set)
+        self.assertFalse(4 in task_set)
+        with self.assertRaises(KeyError):
+            task_set.remove(4)
+
+    def test_promotion(self):
+        a = self.add('a', [])
+        b = self.add('b', ['ra', 'ra'])
+        c = self.add('c', ['ra', 'rb'])
+        d = self.add('d', [])
+        self.assertEquals([a, d], list(self.state.runnable_tasks))
+        self.assertEquals(set([b, c]), self.state.pending_tasks)
+        self.finish(a)
+        self.assertEquals([d, b], list(self.state.runnable_tasks))
+        self.assertEquals(set([c]), self.state.pending_tasks)
+        self.finish(b)
+        self.assertEquals([d, c], list(self.state.runnable_tasks))
+        self.assertEquals(set(), self.state.pending_tasks)
+        self.assertEquals({}, self.state._pending_needs)
+        self.assertEquals(0, self.state.nodes['0'].num_workers_executing)
+        self.assertEquals(set([a, b]), set(self.state.finished_tasks))
+
+    def test_scheduled_locally(self):
+        a = self.add('a', [], is_scheduled_locally=True)
+        self.assertEquals([], list(self.state.runnable_tasks))
+        self.assertEquals('0', self.state.executing_tasks[a])
+        self.assertEquals(1, self.state.nodes['0'].num_workers_executing)
+
+    def test_benchmark_shapes(self):
+        for shape in ['chain', 'wide', 'dag']:
+            scheduler_state_benchmark.run(scheduler_state_benchmark.synthetic_tasks(shape, 100))
+
+
+class TestIncrementalDispatch(unittest.TestCase):
+    class SchedulerDatabase():
+        def __init__(self):
+            self.handler = None
+            self.scheduled = []
+
+        def get_global_scheduler_updates(self, handler):
+            self.handler = handler
+
+        def schedule(self, node_id, task_id):
+            self.scheduled.append(task_id)
+
+    def setUp(self):
+        self.event_simulation = EventSimulation()
+        self.db = self.SchedulerDatabase()
+
+    def scheduler(self, coalesce_window=0, scheduler_class=trivialscheduler.TrivialGlobalScheduler):
+        scheduler = scheduler_class(
+            SystemTime(self.event_simulation), self.db, EventLoop(self.event_simulation),
+            coalesce_window)
+        process_tasks = scheduler._process_tasks
+        self.num_passes = 0
+        def counting_process_tasks():
+            self.num_passes += 1
+            process_tasks()
+        scheduler._process_tasks = counting_process_tasks
+        return scheduler
+
+    def submit(self, task_id, depends_on):
+        task = Task(task_id, [TaskPhase(0, depends_on, [], 1.)], [TaskResult('r' + task_id, 10)])
+        self.db.handler(ForwardTaskUpdate(task, '0', False))
+        return task.id()
+
+    def object_ready(self, object_id):
+        self.db.handler(ObjectReadyUpdate(ObjectDescription(object_id, '0', 10), '0'))
+
+    def test_passes_only_on_capacity_or_work(self):
+        self.scheduler()
+        self.db.handler(RegisterNodeUpdate('0', 1))
+        a = self.submit('a', [])
+        b = self.submit('b', ['x'])
+        self.assertEquals([a], self.db.scheduled)
+        self.assertEquals(2, self.num_passes)
+        # an object no pending task waits for, and work that cannot run yet
+        self.object_ready('y')
+        self.db.handler(AddWorkerUpdate('0', -1))
+        self.assertEquals(2, self.num_passes)
+        self.object_ready('x')
+        self.assertEquals(3, self.num_passes)
+        self.assertEquals([a], self.db.scheduled)
+        self.db.handler(AddWorkerUpdate('0', 1))
+        self.db.handler(FinishTaskUpdate(a))
+        self.assertEquals([a, b], self.db.scheduled)
+
+    def test_coalesced_passes(self):
+        self.scheduler(coalesce_window=.5)
+        self.db.handler(RegisterNodeUpdate('0', 4))
+        task_ids = [self.submit(task_id, []) for task_id in 'abc']
+        self.assertEquals([], self.db.scheduled)
+        self.event_simulation.advance_fully()
+        self.assertEquals(1, self.num_passes)
+        self.assertEquals(task_ids, self.db.scheduled)
+        self.assertEquals(.5, self.event_simulation.get_time())
+
+    def test_coalesced_replay(self):
+        computation = columnartrace.load_trace(
+            os.path.join(script_path(), 'traces', 'test', 'rnn_6layers_w3s2n1.json'))
+        for scheduler_name in ['trivial', 'location_aware', 'delay']:
+            event_simulation = replaystate.EventSimulation()
+            logger = SummaryStats(event_simulation)
+            simulate(computation, schedulers[scheduler_name], event_simulation, logger, 2, 2,
+                     .001, .0001, {'coalesce_window': .001},
+                     cache_policy_class=replaystate.LRUObjectCache)
+            self.assertTrue(logger.completed_successfully, logger.err)
+            self.assertEquals(len(computation.get_task_ids()), logger.stats['num_tasks'])
+
+    def test_priority_dispatch(self):
+        self.scheduler(scheduler_class=trivialscheduler.TrivialPriorityGlobalScheduler)
+        self.db.handler(RegisterNodeUpdate('0', 1))
+        for (object_id, size) in [('x', 10), ('y', 30), ('z', 20)]:
+            self.db.handler(ObjectReadyUpdate(ObjectDescription(object_id, '0', size), '0'))
+        a = self.submit('a', [])
+        task_ids = [self.submit(task_id, [object_id]) for (task_id, object_id) in
+                    [('b', 'x'), ('c', 'y'), ('d', 'z'), ('e', 'y')]]
+        self.assertEquals([a], self.db.scheduled)
+        self.assertEquals(6, self.num_passes)
+        for _ in task_ids:
+            self.db.handler(FinishTaskUpdate(self.db.scheduled[-1]))
+        self.assertEquals(10, self.num_passes)
+        self.assertEquals([a] + [task_ids[i] for i in [1, 3, 2, 0]], self.db.scheduled)
+
+    def test_transfer_aware_rejects_window(self):
+        def scheduler(coalesce_window):
+            return trivialscheduler.TransferCostAwareGlobalScheduler(
+                SystemTime(self.event_simulation), self.db, EventLoop(self.event_simulation),
+                coalesce_window)
+        scheduler(0)
+        self.assertRaises(ValueError, scheduler, .001)
+
+
+@unittest.skipIf(fakeredis is None, 'needs fakeredis')
+class TestBuildTraceNg(unittest.TestCase):
+    NUM_TASKS = 50
+
+    def setUp(self):
+        self.r = fakeredis.FakeStrictRedis()
+        self.r.flushdb()
+        trace_extract_benchmark.fill_synthetic_logs(self.r, self.NUM_TASKS, num_workers=3)
+
+    def tearDown(self):
+        self.r.flushdb()
+
+    def test_pipelined_matches_unbatched(self):
+        expected = build_trace_ng.read_event_logs(self.r, json.loads, 1, 1)
+        (event_logs, task_dependencies) = build_trace_ng.read_event_logs(self.r, json.loads, 7, 2)
+        self.assertEquals(self.NUM_TASKS, len(task_dependencies))
+        self.assertEquals(expected[1], task_dependencies)
+        self.assertItemsEqual(expected[0], event_logs)
+        sizes = [result['size'] for event_log in event_logs for event in event_log
+                 if event['event'] == 'END' for result in event['results']]
+        self.assertEquals(['100'] * self.NUM_TASKS, sizes)
+
+    def test_builds_valid_trace(self):
+        (event_logs, task_dependencies) = build_trace_ng.read_event_logs(self.r, json.loads, 16, 2)
+        task_roots = []
+        tasks = []
+        for event_log in event_logs:
+            tasks += build_trace_ng.build_tasks(task_dependencies, event_log, task_roots)
+        self.assertEquals([build_trace_ng.ROOT_TASK_ID], task_roots)
+        computation = json.loads(json.dumps({'rootTask': task_roots[0], 'tasks': tasks}),
+                                 object_hook=computation_decoder)
+        computation.verify()
+        self.assertEquals(self.NUM_TASKS + 1, len(list(computation.get_task_ids())))
 
 
 if __name__ == '__main__':
@@ -1024,8 +2396,18 @@ if __name__ == '__main__':
     # Else, run all of the tests, generated by the JSON files in ./traces.
     tests = unittest.TestSuite([invalid_trace_suite(), valid_trace_suite(), trace_scheduler_matrix_suite()] +
                 list(map(lambda x: unittest.TestLoader().loadTestsFromTestCase(x),
-                [TestEventLoopTimers, TestComputationObjects, TestSchedulerObjects,
+                [TestEventLoopTimers, TestEventQueues, TestTimestampedLogger, TestComputationObjects,
+                 TestComputationVerify, TestDirectedGraph, TestSchedulerObjects,
                  TestReplayState, TestObjectStoreRuntime, TestNodeRuntime,
-                 TestReplayStateTimingDetail])))
+                 TestReplayStateTimingDetail, TestSimulationFork,
+                 TestPdesReplay, TestPdesAnalysis,
+                 TestProfilingEventSimulation, TestInterning, TestCompactTaskModel,
+                 TestColumnarTrace,
+                 TestStreamingTraceDecoder, TestDagAnalytics,
+                 TestTraceCatalog, TestTraceCache, TestBuildTraceNg,
+                 TestStreamingTraceBuilder, TestCombineTraces,
+                 TestSyntheticTraces, TestWorkloadComposer, TestTraceSlice,
+                 TestTraceFusion, TestGlobalSchedulerState,
+                 TestIncrementalDispatch])))
     unittest.TextTestRunner(verbosity=2).run(tests)
     
@@ -0,0 +1,217 @@
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import columnartrace
+import daganalytics
+import tracecache
+
+
+################################################################
+#               SQLite catalog of trace shapes                 #
+################################################################
+#
+# Indexes the traces under traces/ and traces-ng/ by shape, so that sweep
+# generators can pick traces with a query instead of opening every file:
+#
+#     from trace_catalog import select_traces
+#     select_traces(min_num_tasks=1000, max_critical_path=100,
+#                   order_by='max_parallelism')
+#
+# update_catalog() analyzes new and changed traces in a process pool with
+# daganalytics. A trace whose size and mtime are unchanged is skipped, and
+# one whose contents hash to the same SHA-1 as before is not analyzed again.
+# Files that fail to decode, like the expected results in
+# traces/validation, are recorded with their error and never selected.
+
+CATALOG_FILENAME = 'trace_catalog.sqlite'
+DEFAULT_ROOTS = ['traces', 'traces-ng']
+TRACE_SUFFIXES = ('.json', '.json.gz')
+# bump when the schema or the way statistics are computed changes
+CATALOG_VERSION = 1
+
+STAT_COLUMNS = ['num_tasks', 'num_objects', 'total_bytes', 'total_work',
+                'critical_path', 'max_parallelism']
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS traces (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha1 TEXT NOT NULL,
+    num_tasks INTEGER,
+    num_objects INTEGER,
+    total_bytes INTEGER,
+    total_work REAL,
+    critical_path REAL,
+    max_parallelism INTEGER,
+    error TEXT
+)'''
+
+
+def find_traces(roots):
+    """Paths of the JSON and columnar traces under the given directories."""
+    paths = []
+    for root in roots:
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            for dirname in list(dirnames):
+                if columnartrace.is_columnar_trace(os.path.join(dirpath, dirname)):
+                    paths.append(os.path.join(dirpath, dirname))
+                    dirnames.remove(dirname)
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames
+                         if filename.endswith(TRACE_SUFFIXES))
+    paths.sort()
+    return paths
+
+
+def _stat_path(path):
+    # columnar traces are replaced as a whole, with a new header
+    if columnartrace.is_columnar_trace(path):
+        return os.path.join(path, columnartrace.HEADER_FILENAME)
+    return path
+
+
+def _index_trace(path_and_sha1):
+    """Pool worker: (path, sha1, stats or None, error or None) for a trace.
+       Statistics are only computed if the hash differs from sha1."""
+    (path, old_sha1) = path_and_sha1
+    sha1 = tracecache.trace_hash(path)
+    if sha1 == old_sha1:
+        return (path, sha1, None, None)
+    try:
+        analytics = daganalytics.DagAnalytics.from_columns(daganalytics.trace_columns(path))
+    except Exception as e:
+        return (path, sha1, None, '{}: {}'.format(type(e).__name__, e))
+    stats = {
+        'num_tasks': analytics.num_tasks(),
+        'num_objects': len(analytics.object_size),
+        'total_bytes': int(analytics.object_size.sum()),
+        'total_work': analytics.total_work,
+        'critical_path': analytics.critical_path,
+        'max_parallelism': analytics.max_parallelism(),
+    }
+    return (path, sha1, stats, None)
+
+
+def open_catalog(catalog_filename=CATALOG_FILENAME):
+    db = sqlite3.connect(catalog_filename)
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if version != CATALOG_VERSION:
+        db.execute('DROP TABLE IF EXISTS traces')
+        db.execute('PRAGMA user_version = {}'.format(CATALOG_VERSION))
+    db.execute(SCHEMA)
+    return db
+
+
+def update_catalog(roots=DEFAULT_ROOTS, catalog_filename=CATALOG_FILENAME, num_processes=None):
+    """Bring the catalog up to date with the traces under roots. Returns
+       the number of traces analyzed."""
+    db = open_catalog(catalog_filename)
+    try:
+        known = dict((row[0], row[1:]) for row in
+                     db.execute('SELECT path, size, mtime, sha1 FROM traces'))
+        paths = find_traces(roots)
+        stats = {}
+        changed = []
+        for path in paths:
+            st = os.stat(_stat_path(path))
+            stats[path] = (st.st_size, st.st_mtime)
+            old = known.get(path)
+            if old is None or (old[0], old[1]) != stats[path]:
+                changed.append((path, old[2] if old is not None else None))
+
+        num_analyzed = 0
+        if changed:
+            pool = multiprocessing.Pool(num_processes)
+            try:
+                for (path, sha1, trace_stats, error) in pool.imap_unordered(_index_trace, changed):
+                    (size, mtime) = stats[path]
+                    if trace_stats is None and error is None:
+                        # touched but unchanged
+                        db.execute('UPDATE traces SET size = ?, mtime = ? WHERE path = ?',
+                                   (size, mtime, path))
+                        continue
+                    num_analyzed += 1
+                    row = [path, size, mtime, sha1]
+                    row.extend((trace_stats or {}).get(column) for column in STAT_COLUMNS)
+                    row.append(error)
+                    db.execute('INSERT OR REPLACE INTO traces VALUES ({})'.format(
+                        ', '.join('?' * len(row))), row)
+            finally:
+                pool.close()
+                pool.join()
+
+        # forget traces that were removed
+        under_roots = [os.path.join(root, '') for root in roots]
+        for path in set(known) - set(paths):
+            if any(path.startswith(root) for root in under_roots):
+                db.execute('DELETE FROM traces WHERE path = ?', (path,))
+        db.commit()
+        return num_analyzed
+    finally:
+        db.close()
+
+
+def select_traces(catalog_filename=CATALOG_FILENAME, order_by='path', **bounds):
+    """Paths of the cataloged traces within the given bounds, passed as
+       min_<column> and max_<column> for the columns in STAT_COLUMNS."""
+    if order_by not in STAT_COLUMNS + ['path']:
+        raise ValueError('Unknown catalog column {}'.format(order_by))
+    conditions = ['error IS NULL']
+    params = []
+    for (name, value) in sorted(bounds.items()):
+        (bound, _, column) = name.partition('_')
+        if bound not in ['min', 'max'] or column not in STAT_COLUMNS:
+            raise ValueError('Unknown catalog bound {}'.format(name))
+        conditions.append('{} {} ?'.format(column, '>=' if bound == 'min' else '<='))
+        params.append(value)
+    db = open_catalog(catalog_filename)
+    try:
+        return [str(row[0]) for row in db.execute(
+            'SELECT path FROM traces WHERE {} ORDER BY {}'.format(' AND '.join(conditions), order_by),
+            params)]
+    finally:
+        db.close()
+
+
+def print_catalog(catalog_filename=CATALOG_FILENAME, where=None, order_by='path'):
+    db = open_catalog(catalog_filename)
+    try:
+        query = 'SELECT path, {}, error FROM traces'.format(', '.join(STAT_COLUMNS))
+        if where:
+            query += ' WHERE ' + where
+        query += ' ORDER BY ' + order_by
+        print '{:72s} {:>8s} {:>8s} {:>14s} {:>12s} {:>12s} {:>8s}'.format(
+            'path', 'tasks', 'objects', 'bytes', 'work', 'crit path', 'max par')
+        for row in db.execute(query):
+            (path, error) = (row[0], row[-1])
+            if error is not None:
+                print '{:72s} {}'.format(path, error[:60])
+                continue
+            print '{:72s} {:8d} {:8d} {:14d} {:12.3f} {:12.3f} {:8d}'.format(path, *row[1:-1])
+    finally:
+        db.close()
+
+
+parser = argparse.ArgumentParser(description="Index traces by shape in a "
+        "SQLite catalog, and list them.")
+parser.add_argument("--catalog", default=CATALOG_FILENAME)
+subparsers = parser.add_subparsers(dest='command')
+update_parser = subparsers.add_parser('update', help="Index new and changed traces")
+update_parser.add_argument("roots", nargs='*', default=DEFAULT_ROOTS)
+update_parser.add_argument("-j", "--jobs", default=None, type=int,
+                           help="Number of processes, the number of CPUs by default")
+list_parser = subparsers.add_parser('list', help="List the cataloged traces")
+list_parser.add_argument("--where", default=None,
+                         help="SQL condition on the columns, e.g. 'num_tasks > 1000'")
+list_parser.add_argument("--order-by", default='path')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.command == 'update':
+        start = time.time()
+        num_analyzed = update_catalog(args.roots, args.catalog, args.jobs)
+        print 'analyzed {} traces in {:.1f} s'.format(num_analyzed, time.time() - start)
+    else:
+        print_catalog(args.catalog, args.where, args.order_by)
@@ -0,0 +1,140 @@
+import argparse
+import binascii
+import json
+import time
+
+import build_trace_ng
+
+
+################################################################
+#        Throughput of trace extraction from Redis event logs  #
+################################################################
+#
+# Fills a Redis server, or an in-process fakeredis stand-in, with the
+# event logs, object table and task table entries that a Ray job of
+# num_tasks chained tasks leaves behind, then times build_trace_ng's
+# extraction with one request per round trip and pipelined in batches.
+# Task specs are JSON lists of dependencies, decoded with json.loads,
+# since real specs need photon.
+
+EVENTS_PER_ENTRY = 100
+
+
+def task_id_hex(i):
+    return '{:040x}'.format(i + 1)
+
+
+def object_id_hex(i):
+    return '{:040x}'.format((1 << 159) + i)
+
+
+def fill_synthetic_logs(r, num_tasks, num_workers=16, duration=.01):
+    """Write the logs of a driver submitting num_tasks tasks, each of which
+       depends on the result of the previous one."""
+    def push(key, events):
+        for i in xrange(0, len(events), EVENTS_PER_ENTRY):
+            r.rpush(key, json.dumps(events[i:i + EVENTS_PER_ENTRY]))
+
+    driver = [[0., 'ray:begin', build_trace_ng.LOG_POINT, {}]]
+    driver.extend([i * 1e-5, 'ray:submit_task', build_trace_ng.LOG_SPAN_END,
+                   {'task_id': task_id_hex(i)}] for i in xrange(num_tasks))
+    driver.append([(num_tasks + 1) * duration, 'ray:end', build_trace_ng.LOG_POINT, {}])
+    push('event_log:driver', driver)
+
+    pipe = r.pipeline(transaction=False)
+    workers = [[] for _ in xrange(num_workers)]
+    for i in xrange(num_tasks):
+        start = (i + 1) * duration
+        depends_on = [object_id_hex(i - 1)] if i > 0 else []
+        workers[i % num_workers].extend([
+            [start, 'ray:task', build_trace_ng.LOG_SPAN_START, {'task_id': task_id_hex(i)}],
+            [start + duration / 4, 'ray:get', build_trace_ng.LOG_SPAN_START, {}],
+            [start + duration / 2, 'ray:get', build_trace_ng.LOG_SPAN_END,
+             {'object_ids': ' '.join(depends_on)}],
+            [start + duration, 'ray:task', build_trace_ng.LOG_SPAN_END,
+             {'results': object_id_hex(i)}],
+        ])
+        pipe.hset('OI:{}'.format(binascii.unhexlify(object_id_hex(i))), 'data_size', 100)
+        pipe.hset('TT:{}'.format(binascii.unhexlify(task_id_hex(i))), 'task_spec',
+                  json.dumps(depends_on))
+        if len(pipe) >= build_trace_ng.BATCH_SIZE:
+            pipe.execute()
+            pipe = r.pipeline(transaction=False)
+    pipe.execute()
+    for (w, events) in enumerate(workers):
+        push('event_log:worker{}'.format(w), events)
+
+
+class RoundTripDelay(object):
+    """Wraps a Redis client, sleeping rtt seconds per round trip, to model
+       a server across the network."""
+
+    def __init__(self, r, rtt):
+        self._r = r
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        method = getattr(self._r, name)
+        def delayed(*args, **kwargs):
+            time.sleep(self._rtt)
+            return method(*args, **kwargs)
+        return delayed
+
+    def scan_iter(self, match=None, count=None):
+        cursor = '0'
+        while cursor != 0:
+            (cursor, keys) = self.scan(cursor, match, count)
+            for key in keys:
+                yield key
+
+    def pipeline(self, transaction=True):
+        pipe = self._r.pipeline(transaction)
+        execute = pipe.execute
+        def delayed_execute(*args, **kwargs):
+            time.sleep(self._rtt)
+            return execute(*args, **kwargs)
+        pipe.execute = delayed_execute
+        return pipe
+
+
+def extract(r, batch_size, num_threads):
+    start = time.time()
+    (event_logs, task_dependencies) = build_trace_ng.read_event_logs(
+        r, json.loads, batch_size, num_threads)
+    elapsed = time.time() - start
+    task_roots = []
+    tasks = []
+    for event_log in event_logs:
+        tasks += build_trace_ng.build_tasks(task_dependencies, event_log, task_roots)
+    return (elapsed, task_roots, tasks)
+
+
+parser = argparse.ArgumentParser(description="Benchmark trace extraction "
+        "from Redis on a synthetic job.")
+parser.add_argument("--num-tasks", default=100000, type=int)
+parser.add_argument("--host", default=None,
+                    help="Redis server to fill, fakeredis if not given. "
+                         "The server is flushed first")
+parser.add_argument("--port", default=6379, type=int)
+parser.add_argument("--batch-size", default=build_trace_ng.BATCH_SIZE, type=int)
+parser.add_argument("--threads", default=build_trace_ng.NUM_DECODE_THREADS, type=int)
+parser.add_argument("--rtt", default=0, type=float,
+                    help="Simulated network round trip time in seconds")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.host is None:
+        import fakeredis
+        r = fakeredis.FakeStrictRedis()
+    else:
+        import redis
+        r = redis.StrictRedis(args.host, args.port)
+    r.flushdb()
+    fill_synthetic_logs(r, args.num_tasks)
+    if args.rtt:
+        r = RoundTripDelay(r, args.rtt)
+    for (name, batch_size, num_threads) in [('one request per round trip', 1, 1),
+                                            ('pipelined', args.batch_size, args.threads)]:
+        (elapsed, task_roots, tasks) = extract(r, batch_size, num_threads)
+        print '{}: {} tasks in {:.2f} s, {:.0f} tasks/s'.format(
+            name, len(tasks), elapsed, len(tasks) / elapsed)
@@ -0,0 +1,294 @@
+import argparse
+import time
+
+import columnartrace
+import replaystate
+from replaystate import ComputationDescription, DirectedGraph, ObjectPut, Task, TaskPhase
+from replaytrace import schedulers, simulate
+from statslogging import SummaryStats
+from tracewriter import write_computation
+
+
+################################################################
+#        Task fusion to cut per-task scheduling overhead       #
+################################################################
+#
+# Every task pays db_message_delay round trips through the scheduler
+# database on its way to a worker, which dominates traces of tiny tasks
+# like the RNN ones. fuse_tasks() merges short single-phase tasks into
+# multi-phase tasks, one phase per original task, so that a group pays the
+# round trips once. Tasks are fused with others submitted by the same phase
+# of the same task:
+#
+#   linear chains   a task that depends on objects of a group joins it
+#   sibling groups  a task with the same dependencies as the first task of
+#                   a group joins it
+#
+# A task is short if it runs for less than the threshold, and a group grows
+# while its total duration stays within the threshold. The group keeps the
+# id of its first task and the submits of the others are dropped. Results of
+# tasks that are not the last of their group are put at the end of their
+# phase instead, so other tasks get them as early as before.
+#
+# Dependencies of a joining task on objects from outside the group are also
+# added to the first phase, so a fused task never waits for objects while
+# it holds a worker midway. This only adds edges from objects that come
+# before every task of the group in a topological order of the phases, so
+# fusion cannot introduce cycles.
+#
+# overhead_report() replays a trace and its fused version with the same
+# settings. The difference in job completion time mixes two effects: the
+# control-plane round trips fusion saves, and the parallelism it loses by
+# serializing sibling groups. Each trace is also replayed with no
+# db_message_delay, to tell them apart:
+#
+#   control-plane savings  how much less of the job completion time is due
+#                          to db_message_delay in the fused trace
+#   execution cost         how much longer the fused trace takes with no
+#                          db_message_delay, mostly lost parallelism; it is
+#                          negative when fusion also improves placement
+#
+# The fused trace finishes earlier by the savings less the cost.
+
+DEFAULT_THRESHOLD = .01
+
+
+class _Group():
+    def __init__(self, task, position):
+        self.tasks = [task]
+        self.duration = task.get_phase(0).duration
+        # objects created by the tasks of the group
+        self.objects = set(result.object_id for result in task.get_results())
+        self.objects.update(put.object_id for put in task.get_phase(0).creates)
+        # dependencies of the first phase, and the latest topological position
+        # of their creators
+        self.depends_on = list(task.get_depends_on())
+        self.depends_on_set = set(self.depends_on)
+        self.max_dependency_position = -1
+        self.min_position = position
+
+    def try_join(self, task, position, positions, threshold):
+        duration = task.get_phase(0).duration
+        if self.duration + duration > threshold:
+            return False
+        external = [object_id for object_id in task.get_depends_on()
+                    if object_id not in self.objects and object_id not in self.depends_on_set]
+        min_position = min(self.min_position, position)
+        max_dependency_position = max([self.max_dependency_position] +
+                                      [positions[object_id] for object_id in external])
+        if max_dependency_position >= min_position:
+            return False
+        self.tasks.append(task)
+        self.duration += duration
+        self.objects.update(result.object_id for result in task.get_results())
+        self.objects.update(put.object_id for put in task.get_phase(0).creates)
+        self.depends_on.extend(external)
+        self.depends_on_set.update(external)
+        self.max_dependency_position = max_dependency_position
+        self.min_position = min_position
+        return True
+
+
+def phase_positions(computation):
+    """The position of every phase, as (task id, phase index), and object id
+       in a topological order of the phase graph."""
+    graph = DirectedGraph()
+    get_id = graph.get_id
+    add_edge = graph.add_edge
+    for task_id in computation.get_task_ids():
+        task = computation.get_task(task_id)
+        for (i, phase) in enumerate(task.phases()):
+            phase_node = get_id((task_id, i))
+            if i > 0:
+                add_edge(get_id((task_id, i - 1)), phase_node)
+            for object_id in phase.depends_on:
+                add_edge(get_id(object_id), phase_node)
+            for submit in phase.submits:
+                add_edge(phase_node, get_id((submit.task_id, 0)))
+            for put in phase.creates:
+                add_edge(phase_node, get_id(put.object_id))
+        last_phase_node = get_id((task_id, task.num_phases() - 1))
+        for result in task.get_results():
+            add_edge(last_phase_node, get_id(result.object_id))
+    root_node = get_id((computation.get_root_task().id(), 0))
+    return dict((graph.get_node(n), position)
+                for (position, n) in enumerate(graph.topo_sort(root_node)))
+
+
+def is_fusable(task, threshold):
+    return (not task.is_root and task.num_phases() == 1 and
+            task.get_phase(0).duration < threshold)
+
+
+def fusion_groups(computation, threshold=DEFAULT_THRESHOLD):
+    """The groups of tasks that fuse_tasks() merges, with more than one task
+       each."""
+    positions = phase_positions(computation)
+    groups = []
+    for submitter_id in computation.get_task_ids():
+        for phase in computation.get_task(submitter_id).phases():
+            # open groups of the tasks this phase submits, by the objects
+            # they create and by the dependencies of their first task
+            by_object = {}
+            by_dependencies = {}
+            for submit in sorted(phase.submits, key=lambda submit: submit.time_offset):
+                task = computation.get_task(submit.task_id)
+                if not is_fusable(task, threshold):
+                    continue
+                position = positions[(task.id(), 0)]
+                candidates = [by_object[object_id] for object_id in task.get_depends_on()
+                              if object_id in by_object]
+                if task.get_depends_on() in by_dependencies:
+                    candidates.append(by_dependencies[task.get_depends_on()])
+                for group in candidates:
+                    if group.try_join(task, position, positions, threshold):
+                        break
+                else:
+                    group = _Group(task, position)
+                    groups.append(group)
+                    by_dependencies[task.get_depends_on()] = group
+                for result in task.get_results():
+                    by_object[result.object_id] = group
+                for put in task.get_phase(0).creates:
+                    by_object[put.object_id] = group
+    return [group for group in groups if len(group.tasks) > 1]
+
+
+def _fused_phases(group):
+    phases = []
+    for (i, task) in enumerate(group.tasks):
+        phase = task.get_phase(0)
+        creates = list(phase.creates)
+        if i < len(group.tasks) - 1:
+            creates.extend(ObjectPut(result.object_id, result.size, phase.duration)
+                           for result in task.get_results())
+        phases.append(TaskPhase(i, group.depends_on if i == 0 else phase.depends_on,
+                                phase.submits, phase.duration, creates))
+    return phases
+
+
+def fuse_tasks(computation, threshold=DEFAULT_THRESHOLD):
+    """A computation with the short tasks of computation fused, see above.
+       Returns (fused computation, number of tasks fused away)."""
+    fused = {}
+    dropped = set()
+    for group in fusion_groups(computation, threshold):
+        fused[group.tasks[0].id()] = (_fused_phases(group), group.tasks[-1].get_results())
+        dropped.update(task.id() for task in group.tasks[1:])
+
+    tasks = []
+    for task_id in computation.get_task_ids():
+        if task_id in dropped:
+            continue
+        task = computation.get_task(task_id)
+        if task_id in fused:
+            (phases, results) = fused[task_id]
+        elif any(submit.task_id in dropped for phase in task.phases() for submit in phase.submits):
+            (phases, results) = (task.phases(), task.get_results())
+        else:
+            tasks.append(task)
+            continue
+        phases = [TaskPhase(phase.phase_id, phase.depends_on,
+                            [submit for submit in phase.submits if submit.task_id not in dropped],
+                            phase.duration, phase.creates)
+                  for phase in phases]
+        tasks.append(Task(task_id, phases, results))
+    return (ComputationDescription(computation.get_root_task().id(), tasks,
+                                   computation.is_combined), len(dropped))
+
+
+def replay_stats(computation, scheduler_name, num_nodes, num_workers_per_node,
+                 object_transfer_time_cost, db_message_delay,
+                 cache_policy_class=replaystate.LRUObjectCache):
+    """The SummaryStats of a replay of computation."""
+    event_simulation = replaystate.EventSimulation()
+    logger = SummaryStats(event_simulation)
+    simulate(computation, schedulers[scheduler_name], event_simulation, logger,
+             num_nodes, num_workers_per_node, object_transfer_time_cost,
+             db_message_delay, cache_policy_class=cache_policy_class)
+    if not logger.completed_successfully:
+        raise RuntimeError('Replay failed - {}'.format(logger.err or 'not every task finished'))
+    return logger.stats
+
+
+def overhead_report(computation, fused, scheduler_name, num_nodes, num_workers_per_node,
+                    object_transfer_time_cost, db_message_delay,
+                    cache_policy_class=replaystate.LRUObjectCache):
+    """Job completion times of replays of computation and of its fused
+       version, the control-plane savings and execution cost of fusion, as
+       a dict. Arguments after fused are those of replay_stats()."""
+    def job_completion_time(computation, db_message_delay):
+        return replay_stats(computation, scheduler_name, num_nodes, num_workers_per_node,
+                            object_transfer_time_cost, db_message_delay,
+                            cache_policy_class)['job_completion_time']
+
+    stats = replay_stats(computation, scheduler_name, num_nodes, num_workers_per_node,
+                         object_transfer_time_cost, db_message_delay, cache_policy_class)
+    fused_stats = replay_stats(fused, scheduler_name, num_nodes, num_workers_per_node,
+                               object_transfer_time_cost, db_message_delay, cache_policy_class)
+    zero_delay_time = job_completion_time(computation, 0)
+    fused_zero_delay_time = job_completion_time(fused, 0)
+    completion_time = stats['job_completion_time']
+    fused_time = fused_stats['job_completion_time']
+    control_plane_savings = ((completion_time - zero_delay_time)
+                             - (fused_time - fused_zero_delay_time))
+    return {
+        'num_tasks': stats['num_tasks'],
+        'num_fused_tasks': fused_stats['num_tasks'],
+        'job_completion_time': completion_time,
+        'fused_job_completion_time': fused_time,
+        'job_completion_time_change': fused_time - completion_time,
+        'zero_delay_job_completion_time': zero_delay_time,
+        'fused_zero_delay_job_completion_time': fused_zero_delay_time,
+        'control_plane_savings': control_plane_savings,
+        'control_plane_savings_fraction': (control_plane_savings / completion_time
+                                           if completion_time else 0),
+        'execution_cost': fused_zero_delay_time - zero_delay_time,
+        'activation_to_phase0_time': stats['activation_to_phase0_time'],
+        'fused_activation_to_phase0_time': fused_stats['activation_to_phase0_time'],
+        }
+
+
+parser = argparse.ArgumentParser(description="Fuse chains and sibling groups "
+        "of short tasks in a trace.")
+parser.add_argument("trace")
+parser.add_argument("output", nargs='?', default=None,
+                    help="Trace filename for the fused trace")
+parser.add_argument("--threshold", default=DEFAULT_THRESHOLD, type=float,
+                    help="Duration in seconds below which tasks are fused, "
+                         "and above which groups stop growing")
+parser.add_argument("--replay", nargs=5, default=None,
+                    metavar=('NUM_NODES', 'NUM_WORKERS_PER_NODE', 'OBJECT_TRANSFER_TIME_COST',
+                             'DB_MESSAGE_DELAY', 'SCHEDULER'),
+                    help="Replay the trace and the fused trace, and report the "
+                         "control-plane savings and execution cost of fusion")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    start = time.time()
+    computation = columnartrace.load_trace(args.trace)
+    (fused, num_dropped) = fuse_tasks(computation, args.threshold)
+    fused.verify()
+    print 'fused {} of {} tasks away in {:.1f} s'.format(
+        num_dropped, len(computation.get_task_ids()), time.time() - start)
+    if args.output is not None:
+        write_computation(fused, args.output)
+    if args.replay is not None:
+        (num_nodes, num_workers_per_node, object_transfer_time_cost,
+         db_message_delay, scheduler_name) = args.replay
+        if scheduler_name not in schedulers:
+            parser.error('unknown scheduler {}'.format(scheduler_name))
+        report = overhead_report(computation, fused, scheduler_name, int(num_nodes),
+                                 int(num_workers_per_node), float(object_transfer_time_cost),
+                                 float(db_message_delay))
+        print 'job completion time {:.6f} s, fused {:.6f} s, change {:+.6f} s'.format(
+            report['job_completion_time'], report['fused_job_completion_time'],
+            report['job_completion_time_change'])
+        print 'with no db message delay {:.6f} s, fused {:.6f} s'.format(
+            report['zero_delay_job_completion_time'],
+            report['fused_zero_delay_job_completion_time'])
+        print 'control-plane savings of fusion {:.6f} s, {:.1%} of job completion time'.format(
+            report['control_plane_savings'], report['control_plane_savings_fraction'])
+        print 'execution cost of fusion {:.6f} s'.format(report['execution_cost'])
+        print 'activation to phase 0 time {:.6f} s, fused {:.6f} s'.format(
+            report['activation_to_phase0_time'], report['fused_activation_to_phase0_time'])
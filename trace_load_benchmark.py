@@ -0,0 +1,78 @@
+import argparse
+import gc
+import os
+import time
+
+from columnartrace import load_trace
+from replaystate import ComputationDescription, Task, TaskPhase, TaskResult, TaskSubmit, ObjectPut
+
+
+################################################################
+#           Memory footprint of loaded trace models            #
+################################################################
+#
+# Loads traces, or builds a synthetic one of a given number of tasks, and
+# reports the resident memory the model takes per task, to measure the
+# compactness of the Task, TaskPhase and related classes.
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    with open('/proc/self/statm', 'r') as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def synthetic_computation(num_tasks, num_phases=2, fan_in=2):
+    """A computation of num_tasks tasks, each submitted by the root task
+       and depending on the results of up to fan_in earlier tasks."""
+    tasks = []
+    submits = []
+    for i in xrange(1, num_tasks):
+        task_id = 't{:08d}'.format(i)
+        submits.append(TaskSubmit(task_id, 0))
+        depends_on = ['r{:08d}'.format(j) for j in xrange(max(1, i - fan_in), i)]
+        phases = [TaskPhase(0, depends_on, [], .001)]
+        for phase_id in xrange(1, num_phases):
+            phases.append(TaskPhase(phase_id, [], [], .001,
+                                    [ObjectPut('p{:08d}_{}'.format(i, phase_id), 100, 0)]))
+        tasks.append(Task(task_id, phases, [TaskResult('r{:08d}'.format(i), 100)]))
+    root = Task('t{:08d}'.format(0), [TaskPhase(0, [], submits, .001)], [])
+    return ComputationDescription(root.id(), [root] + tasks)
+
+
+def measure(name, load):
+    gc.collect()
+    rss_before = current_rss()
+    start = time.time()
+    computation = load()
+    seconds = time.time() - start
+    # build lazily loaded tasks too
+    num_tasks = 0
+    for task_id in computation.get_task_ids():
+        computation.get_task(task_id)
+        num_tasks += 1
+    gc.collect()
+    rss = current_rss() - rss_before
+    print '{}: {} tasks in {:.3f} s, {:.1f} MB, {:.0f} bytes per task'.format(
+        name, num_tasks, seconds, rss / 1e6, float(rss) / max(num_tasks, 1))
+    return computation
+
+
+parser = argparse.ArgumentParser(description="Measure the memory taken by "
+        "loaded trace models.")
+parser.add_argument("traces", nargs='*')
+parser.add_argument("--synthetic", default=0, type=int, metavar='NUM_TASKS',
+                    help="Also build a synthetic trace of this many tasks")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    # keep every computation alive so the deltas do not reuse freed memory
+    computations = []
+    for trace_filename in args.traces:
+        computations.append(measure(os.path.basename(trace_filename),
+                                    lambda: load_trace(trace_filename)))
+    if args.synthetic:
+        computations.append(measure('synthetic',
+                                    lambda: synthetic_computation(args.synthetic)))
@@ -0,0 +1,248 @@
+import argparse
+import bisect
+import sys
+import time
+from collections import deque
+
+import columnartrace
+from interning import JOB_SEPARATOR, id_name, intern_id, job_id
+from replaystate import ComputationDescription, Task, TaskPhase, TaskResult, TaskSubmit
+from tracewriter import write_computation
+
+
+################################################################
+#           Slices of traces for quick scheduler runs          #
+################################################################
+#
+# Cuts a portion out of a large trace so that it replays in a fraction of
+# the time: the subtree of tasks submitted, directly or not, by a chosen
+# task, the tasks submitted in a time window, or the first levels of the
+# DAG. Times and levels are those of the nominal schedule, with unbounded
+# workers and free transfers.
+#
+# slice_computation() keeps the chosen tasks and drops their submits of
+# tasks left out. Objects they depend on that are created outside the slice
+# are returned instead by zero-duration source tasks, one per task that
+# created them, with the same sizes. If the root task is in the slice it
+# stays the root and also submits the source tasks; otherwise a new root
+# submits the sources and the tasks of the slice whose submitter is left
+# out, at their nominal submit times relative to the slice. The slice is a
+# valid computation, and passes verify().
+
+SLICE_ROOT_TASK_ID = 'slice_root'
+SOURCE_TASK_PREFIX = 'source:'
+
+
+def nominal_schedule(computation):
+    """Submit time and level of every task, as two dicts by task id, when
+       every phase starts as soon as its task is submitted, the phase
+       before it is over and the objects it depends on are created. The
+       root task is submitted at time 0 and is on level 0; a task is one
+       level below its submitter and the creators of its dependencies."""
+    # where each object is created: (task id, phase index, time offset into
+    # the phase, or None for a result at the end of the task)
+    creators = {}
+    consumers = {}
+    num_waiting = {}
+    for task_id in computation.get_task_ids():
+        task = computation.get_task(task_id)
+        last_phase = task.num_phases() - 1
+        for (i, phase) in enumerate(task.phases()):
+            # the phase before and, for phase 0, the submitter
+            num_waiting[(task_id, i)] = 1 + len(phase.depends_on)
+            for object_id in phase.depends_on:
+                consumers.setdefault(object_id, []).append((task_id, i))
+            for put in phase.creates:
+                creators[put.object_id] = (task_id, i, put.time_offset)
+        for result in task.get_results():
+            creators[result.object_id] = (task_id, last_phase, None)
+
+    submit_times = {}
+    levels = {}
+    # earliest start and level of each phase, given the constraints known
+    starts = {}
+    phase_levels = {}
+    ready = deque()
+
+    def constrain(node, start, level):
+        if start > starts.get(node, 0):
+            starts[node] = start
+        if level > phase_levels.get(node, 0):
+            phase_levels[node] = level
+        num_waiting[node] -= 1
+        if num_waiting[node] == 0:
+            ready.append(node)
+
+    def created(object_id, time, level):
+        for consumer in consumers.get(object_id, ()):
+            constrain(consumer, time, level + 1)
+
+    root_task_id = computation.get_root_task().id()
+    submit_times[root_task_id] = 0
+    constrain((root_task_id, 0), 0, 0)
+    while ready:
+        node = ready.popleft()
+        (task_id, i) = node
+        task = computation.get_task(task_id)
+        phase = task.get_phase(i)
+        start = starts.get(node, 0)
+        level = phase_levels.get(node, 0)
+        if i == 0:
+            levels[task_id] = level
+        for submit in phase.submits:
+            submit_times[submit.task_id] = start + submit.time_offset
+            constrain((submit.task_id, 0), start + submit.time_offset, level + 1)
+        for put in phase.creates:
+            created(put.object_id, start + put.time_offset, level)
+        end = start + phase.duration
+        if i + 1 < task.num_phases():
+            constrain((task_id, i + 1), end, level)
+        else:
+            for result in task.get_results():
+                created(result.object_id, end, level)
+    return (submit_times, levels)
+
+
+def subtree_tasks(computation, task_id):
+    """The task and every task it submits, directly or not."""
+    task_ids = set()
+    to_visit = [computation.get_task(task_id).id()]
+    while to_visit:
+        task_id = to_visit.pop()
+        task_ids.add(task_id)
+        for phase in computation.get_task(task_id).phases():
+            to_visit.extend(submit.task_id for submit in phase.submits)
+    return task_ids
+
+
+def window_tasks(submit_times, start, end):
+    """The tasks submitted in [start, end)."""
+    return set(task_id for (task_id, t) in submit_times.iteritems() if start <= t < end)
+
+
+def level_tasks(levels, num_levels):
+    """The tasks on the first num_levels levels."""
+    return set(task_id for (task_id, level) in levels.iteritems() if level < num_levels)
+
+
+def fraction_end(submit_times, fraction):
+    """The end of the window from time 0 in which the given fraction of the
+       tasks is submitted."""
+    times = sorted(submit_times.itervalues())
+    n = min(len(times), max(1, int(round(fraction * len(times)))))
+    # the window must not end between tasks submitted at the same time
+    i = bisect.bisect_right(times, times[n - 1])
+    if i == len(times):
+        return times[-1] + 1
+    return times[i]
+
+
+def source_task_id(creator):
+    """The id of the source task standing in for the given task, in the
+       same job if the task is tagged with one."""
+    (job, separator, trace_id) = id_name(creator).partition(JOB_SEPARATOR)
+    if not separator:
+        return SOURCE_TASK_PREFIX + job
+    return job_id(job, SOURCE_TASK_PREFIX + trace_id)
+
+
+def slice_computation(computation, task_ids, submit_times=None):
+    """A computation of the given tasks of computation, see above. The
+       submit_times of nominal_schedule() place the tasks whose submitter is
+       left out; without them they are submitted at time 0."""
+    task_ids = set(task_ids)
+    creators = {}
+    for task_id in computation.get_task_ids():
+        task = computation.get_task(task_id)
+        for phase in task.phases():
+            for put in phase.creates:
+                creators[put.object_id] = (task_id, put.size)
+        for result in task.get_results():
+            creators[result.object_id] = (task_id, result.size)
+
+    tasks = []
+    submitted = set()
+    # object ids and sizes created outside the slice, by creator
+    sources = {}
+    for task_id in task_ids:
+        task = computation.get_task(task_id)
+        phases = []
+        for phase in task.phases():
+            submits = [submit for submit in phase.submits if submit.task_id in task_ids]
+            submitted.update(submit.task_id for submit in submits)
+            for object_id in phase.depends_on:
+                (creator, size) = creators[object_id]
+                if creator not in task_ids:
+                    sources.setdefault(creator, {})[object_id] = size
+            phases.append(TaskPhase(phase.phase_id, phase.depends_on, submits,
+                                    phase.duration, phase.creates))
+        tasks.append(Task(task.id(), phases, task.get_results()))
+
+    source_tasks = []
+    for (creator, objects) in sorted(sources.iteritems()):
+        source_tasks.append(Task(source_task_id(creator),
+                                 [TaskPhase(0, [], [], 0)],
+                                 [TaskResult(object_id, size)
+                                  for (object_id, size) in sorted(objects.iteritems())]))
+    root_submits = [TaskSubmit(task.id(), 0) for task in source_tasks]
+
+    root_task_id = computation.get_root_task().id()
+    unsubmitted = sorted(task_id for task_id in task_ids
+                         if task_id not in submitted and task_id != root_task_id)
+    if root_task_id in task_ids:
+        # the root task also submits the sources and the tasks left without
+        # a submitter, within its first phase
+        root_task = [task for task in tasks if task.id() == root_task_id][0]
+        phase0 = root_task.get_phase(0)
+        phase0.submits = tuple(root_submits) + phase0.submits + tuple(
+            TaskSubmit(task_id, min(phase0.duration, submit_times[task_id] if submit_times else 0))
+            for task_id in unsubmitted)
+        return ComputationDescription(root_task_id, tasks + source_tasks,
+                                      computation.is_combined)
+
+    start = min(submit_times[task_id] for task_id in unsubmitted) if submit_times else 0
+    root_submits.extend(TaskSubmit(task_id, submit_times[task_id] - start if submit_times else 0)
+                        for task_id in unsubmitted)
+    duration = max([0] + [submit.time_offset for submit in root_submits])
+    root_task = Task(SLICE_ROOT_TASK_ID, [TaskPhase(0, [], root_submits, duration)], [])
+    return ComputationDescription(SLICE_ROOT_TASK_ID, [root_task] + tasks + source_tasks)
+
+
+parser = argparse.ArgumentParser(description="Cut a portion of a trace "
+        "into a trace of its own.")
+parser.add_argument("trace")
+parser.add_argument("output", help="Trace filename for the slice")
+group = parser.add_mutually_exclusive_group(required=True)
+group.add_argument("--subtree", metavar='TASK_ID',
+                   help="The task and every task it submits")
+group.add_argument("--window", nargs=2, type=float, metavar=('START', 'END'),
+                   help="The tasks submitted between START and END seconds")
+group.add_argument("--levels", type=int, metavar='K',
+                   help="The first K levels of the DAG")
+group.add_argument("--fraction", type=float,
+                   help="The given fraction of the tasks, the first submitted")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    start_time = time.time()
+    computation = columnartrace.load_trace(args.trace)
+    (submit_times, levels) = nominal_schedule(computation)
+    if args.subtree is not None:
+        if intern_id(args.subtree) not in computation.get_task_ids():
+            parser.error('no task {} in {}'.format(args.subtree, args.trace))
+        task_ids = subtree_tasks(computation, args.subtree)
+    elif args.window is not None:
+        task_ids = window_tasks(submit_times, args.window[0], args.window[1])
+    elif args.levels is not None:
+        task_ids = level_tasks(levels, args.levels)
+    else:
+        task_ids = window_tasks(submit_times, 0, fraction_end(submit_times, args.fraction))
+    if not task_ids:
+        print 'Error: the slice is empty'
+        sys.exit(1)
+    sliced = slice_computation(computation, task_ids, submit_times)
+    sliced.verify()
+    write_computation(sliced, args.output)
+    print 'sliced {} of {} tasks into {} tasks in {:.1f} s'.format(
+        len(task_ids), len(computation.get_task_ids()), len(sliced.get_task_ids()),
+        time.time() - start_time)
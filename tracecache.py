@@ -0,0 +1,208 @@
+import cPickle as pickle
+import hashlib
+import os
+import sys
+import time
+
+import columnartrace
+import replaystate
+
+
+################################################################
+#          On-disk cache of parsed and verified traces         #
+################################################################
+#
+# Every replay in a sweep runs in a new process, which decodes the trace
+# and verifies it again. TraceCache stores the decoded computation as a
+# pickle, keyed by the SHA-1 of the trace file, CACHE_VERSION and
+# replaystate.MODEL_VERSION, together with whether it has been verified,
+# so that later replays of the same trace only unpickle it. Entries are
+# written to a temporary file and renamed into place, so concurrent
+# replays never read a partial entry.
+# When the cache grows beyond its size cap the least recently used entries
+# are deleted; a hit refreshes the entry's modification time.
+#
+# The cache directory and size cap come from the RAY_SCHED_TRACE_CACHE_DIR
+# and RAY_SCHED_TRACE_CACHE_MAX_MB environment variables. A cap of 0
+# disables the cache.
+
+# Bump this whenever the layout of cache entries changes. Changes to the
+# decoder, the trace model classes or verify() bump replaystate.MODEL_VERSION
+# instead, which is part of the key as well.
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'ray-sched-traces')
+DEFAULT_MAX_MB = 4096
+ENTRY_SUFFIX = '.pickle'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def trace_hash(trace_filename):
+    """SHA-1 of the trace file as stored, compressed or not, or of all the
+       files of a columnar trace."""
+    if columnartrace.is_columnar_trace(trace_filename):
+        filenames = columnartrace.columnar_trace_files(trace_filename)
+    else:
+        filenames = [trace_filename]
+    h = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            while True:
+                chunk = f.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class TraceCache():
+    def __init__(self, cache_dir=None, max_bytes=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('RAY_SCHED_TRACE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('RAY_SCHED_TRACE_CACHE_MAX_MB',
+                                                 DEFAULT_MAX_MB)) * (1 << 20))
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, trace_filename):
+        return 'v{}-m{}-{}'.format(CACHE_VERSION, replaystate.MODEL_VERSION,
+                                   trace_hash(trace_filename))
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Returns (verified, computation) for a cached trace, or None."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                (version, verified, computation) = pickle.load(f)
+        except IOError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # a truncated or otherwise unreadable entry, drop it
+            print >>sys.stderr, 'Warning - dropping unreadable trace cache entry {}: {}'.format(path, e)
+            self._remove(path)
+            self.misses += 1
+            return None
+        if version != (CACHE_VERSION, replaystate.MODEL_VERSION):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # refresh the entry for LRU eviction
+            os.utime(path, None)
+        except OSError:
+            pass
+        return (verified, computation)
+
+    def put(self, key, computation, verified):
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # created concurrently by another replay
+                if not os.path.isdir(self.cache_dir):
+                    raise
+        path = self._entry_path(key)
+        tmp_path = '{}.tmp{}'.format(path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(((CACHE_VERSION, replaystate.MODEL_VERSION), verified, computation),
+                            f, 2)
+            os.rename(tmp_path, path)
+        finally:
+            self._remove(tmp_path)
+        self.evict()
+
+    def entries(self):
+        """(last use, size, path) of every entry, least recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its cap."""
+        entries = self.entries()
+        total_bytes = sum(size for (_, size, _) in entries)
+        for (_, size, path) in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_trace(trace_filename, verify=True, cache=None):
+    """Load a trace like columnartrace.load_trace, and verify it if verify
+       is True, going through the trace cache. Columnar traces are already
+       memory-mapped and are never cached."""
+    if cache is None:
+        cache = TraceCache()
+    if not cache.enabled() or columnartrace.is_columnar_trace(trace_filename):
+        computation = columnartrace.load_trace(trace_filename)
+        if verify:
+            computation.verify()
+        return computation
+
+    key = cache.key(trace_filename)
+    cached = cache.get(key)
+    if cached is not None:
+        (verified, computation) = cached
+        if verify and not verified:
+            computation.verify()
+            cache.put(key, computation, True)
+        return computation
+
+    computation = columnartrace.load_trace(trace_filename)
+    if verify:
+        computation.verify()
+    cache.put(key, computation, verify)
+    return computation
+
+
+def usage():
+    print 'Usage: python tracecache.py trace.json[.gz] ...'
+    print 'Loads and verifies each trace twice, reporting the time of the'
+    print 'uncached and of the cached load.'
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        usage()
+        sys.exit(-1)
+    cache = TraceCache()
+    for trace_filename in sys.argv[1:]:
+        start = time.time()
+        columnartrace.load_trace(trace_filename).verify()
+        uncached_seconds = time.time() - start
+        load_trace(trace_filename, True, cache)
+        start = time.time()
+        load_trace(trace_filename, True, cache)
+        cached_seconds = time.time() - start
+        print '{}: parse and verify {:.3f} s, cached {:.3f} s'.format(
+            os.path.basename(trace_filename), uncached_seconds, cached_seconds)
@@ -0,0 +1,186 @@
+import argparse
+import gzip
+import json
+import re
+import resource
+import time
+
+import replaystate
+
+
+################################################################
+#               Streaming decoder for JSON traces              #
+################################################################
+#
+# json.load() reads the whole document into memory before decoding it,
+# so at its peak it holds the raw text and the decoded model at the same
+# time. StreamingTraceDecoder reads the file in chunks and decodes the
+# elements of the "tasks" array one at a time with raw_decode(), so only
+# the model and a chunk or two of text are held at once. Objects are
+# built by the same computation_decoder hook as json.load() uses.
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class StreamingTraceDecoder():
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder(object_hook=replaystate.make_computation_decoder())
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.bytes_decoded = 0
+        self.num_tasks = 0
+        self.seconds = 0
+
+    def throughput(self):
+        """Decoded MB (of uncompressed JSON) per second."""
+        if not self.seconds:
+            return 0
+        return self.bytes_decoded / self.seconds / 1e6
+
+    def _fill(self, size=None):
+        """Read another chunk, returns False at the end of the file."""
+        if self._eof:
+            return False
+        chunk = self._f.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self.bytes_decoded += len(chunk)
+        # drop the consumed prefix once it outgrows the unconsumed part
+        if self._pos > len(self._buffer) - self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += chunk
+        return True
+
+    def _skip_whitespace(self):
+        """Advance to the next significant character and return it, or
+           None at the end of the file."""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, c):
+        if self._skip_whitespace() != c:
+            raise ValueError('Expected {!r} at byte {} of the trace'.format(
+                c, self.bytes_decoded - len(self._buffer) + self._pos))
+        self._pos += 1
+
+    def _decode_value(self):
+        """Decode one JSON value, reading more of the file until it is
+           complete."""
+        self._skip_whitespace()
+        while True:
+            try:
+                (value, end) = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # grow the read geometrically, so that a value spanning
+                # many chunks is not re-decoded once per chunk
+                if not self._fill(max(self._chunk_size, len(self._buffer) - self._pos)):
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next
+            # chunk, so only accept a value once something follows it
+            if end < len(self._buffer) or self._eof or not self._fill():
+                self._pos = end
+                return value
+
+    def _decode_tasks(self):
+        tasks = []
+        self._expect('[')
+        if self._skip_whitespace() == ']':
+            self._pos += 1
+            return tasks
+        while True:
+            tasks.append(self._decode_value())
+            self.num_tasks += 1
+            c = self._skip_whitespace()
+            self._pos += 1
+            if c == ']':
+                return tasks
+            if c != ',':
+                raise ValueError('Expected \',\' or \']\' in the tasks array, got {!r}'.format(c))
+
+    def decode(self):
+        start = time.time()
+        top = {}
+        self._expect('{')
+        if self._skip_whitespace() != '}':
+            while True:
+                key = self._decode_value()
+                self._expect(':')
+                if key == u'tasks':
+                    top[key] = self._decode_tasks()
+                else:
+                    top[key] = self._decode_value()
+                c = self._skip_whitespace()
+                self._pos += 1
+                if c == '}':
+                    break
+                if c != ',':
+                    raise ValueError('Expected \',\' or \'}}\' in the trace, got {!r}'.format(c))
+        else:
+            self._pos += 1
+        # the top-level object goes through the same hook as with json.load
+        computation = replaystate.computation_decoder(top)
+        self.seconds = time.time() - start
+        return computation
+
+
+def open_trace(trace_filename):
+    if trace_filename.endswith('.gz'):
+        return gzip.open(trace_filename, 'rb')
+    return open(trace_filename, 'r')
+
+
+def decode_trace(trace_filename, chunk_size=CHUNK_SIZE):
+    """Decode a JSON trace, gzipped or not. Returns the computation and
+       the decoder, which holds the throughput statistics."""
+    f = open_trace(trace_filename)
+    try:
+        decoder = StreamingTraceDecoder(f, chunk_size)
+        return (decoder.decode(), decoder)
+    finally:
+        f.close()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+parser = argparse.ArgumentParser(description="Decode JSON traces and report "
+        "decode throughput and peak memory.")
+parser.add_argument("trace")
+parser.add_argument("--method", default='stream', choices=['stream', 'json'],
+                    help="Decode with the streaming decoder or json.load(). "
+                         "Peak memory is per process, so compare the two in "
+                         "separate runs")
+parser.add_argument("--chunk-size", default=CHUNK_SIZE, type=int)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.method == 'stream':
+        (computation, decoder) = decode_trace(args.trace, args.chunk_size)
+        (num_bytes, seconds) = (decoder.bytes_decoded, decoder.seconds)
+    else:
+        f = open_trace(args.trace)
+        try:
+            start = time.time()
+            text = f.read()
+            computation = json.loads(text, object_hook=replaystate.make_computation_decoder())
+            seconds = time.time() - start
+            num_bytes = len(text)
+            del text
+        finally:
+            f.close()
+    print '{}: {} tasks, {:.1f} MB in {:.3f} s, {:.1f} MB/s, peak RSS {:.1f} MB'.format(
+        args.method, len(computation.get_task_ids()), num_bytes / 1e6, seconds,
+        num_bytes / seconds / 1e6, peak_rss_mb())
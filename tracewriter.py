@@ -0,0 +1,139 @@
+import gzip
+import json
+import os
+import types
+
+from interning import id_name
+
+
+################################################################
+#                Streaming writer for JSON traces              #
+################################################################
+#
+# Trace builders and generators used to collect every task in a list and
+# dump the whole document at the end. TraceWriter writes each task to the
+# "tasks" array as soon as it is complete, and the "rootTask" key after the
+# array, once the root is known, so a trace can be written while the tasks
+# are still being produced. write_large_task() also streams lists given as
+# generators, for a driver that submits millions of tasks. The output
+# decodes with json.load() and with tracedecoder's streaming decoder alike.
+# Filenames ending in .gz are gzipped.
+
+
+# bytes of output collected before they are written
+BUFFER_SIZE = 1 << 16
+
+
+class TraceWriter():
+    def __init__(self, trace_filename):
+        self.trace_filename = trace_filename
+        if trace_filename.endswith('.gz'):
+            self._f = gzip.open(trace_filename, 'wb')
+        else:
+            self._f = open(trace_filename, 'w')
+        # json only encodes in C without sort_keys
+        self._encode = json.JSONEncoder(separators=(',', ':')).encode
+        self._buffer = []
+        self._buffered = 0
+        self._write('{"tasks": [')
+        self.num_tasks = 0
+
+    def _write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._f.write(''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def _start_task(self):
+        self._write(',\n' if self.num_tasks else '\n')
+        self.num_tasks += 1
+
+    def write_task(self, task):
+        """Append a task, as the dict that json.dump() writes for it."""
+        self._start_task()
+        self._write(self._encode(task))
+
+    def write_large_task(self, task):
+        """Append a task like write_task, where any list may instead be a
+        generator, which is written out as it is consumed."""
+        self._start_task()
+        self._write_value(task)
+
+    def _write_value(self, value):
+        if not isinstance(value, types.GeneratorType):
+            try:
+                self._write(self._encode(value))
+                return
+            except TypeError:
+                # holds a generator, which json cannot encode
+                pass
+        if isinstance(value, dict):
+            self._write('{')
+            for (i, key) in enumerate(sorted(value)):
+                if i:
+                    self._write(',')
+                self._write(self._encode(key))
+                self._write(':')
+                self._write_value(value[key])
+            self._write('}')
+        else:
+            self._write('[')
+            for (i, item) in enumerate(value):
+                if i:
+                    self._write(',')
+                self._write_value(item)
+            self._write(']')
+
+    def close(self, root_task_id, is_combined=False):
+        """Finish the trace. A combined trace, of several jobs submitted by
+        the root task, is marked as such."""
+        self._write('\n], "rootTask": {}'.format(self._encode(root_task_id)))
+        if is_combined:
+            self._write(', "is_combined": true')
+        self._write('}\n')
+        self._flush()
+        self._f.close()
+
+    def abort(self):
+        """Close and delete the partially written trace."""
+        self._f.close()
+        os.remove(self.trace_filename)
+
+
+def task_dict(task):
+    """The JSON form of a trace model Task."""
+    return {
+        'taskId': id_name(task.id()),
+        'phases': [{
+            'phaseId': phase.phase_id,
+            'dependsOn': [id_name(object_id) for object_id in phase.depends_on],
+            'submits': [{'taskId': id_name(submit.task_id), 'timeOffset': submit.time_offset}
+                        for submit in phase.submits],
+            'duration': phase.duration,
+            'creates': [{'objectId': id_name(put.object_id), 'size': put.size,
+                         'timeOffset': put.time_offset} for put in phase.creates],
+            } for phase in task.phases()],
+        'results': [{'objectId': id_name(result.object_id), 'size': result.size}
+                    for result in task.get_results()],
+        }
+
+
+def write_computation(computation, trace_filename):
+    """Write a ComputationDescription as a JSON trace, task by task."""
+    writer = TraceWriter(trace_filename)
+    try:
+        root_task = computation.get_root_task()
+        for task_id in computation.get_task_ids():
+            task = computation.get_task(task_id)
+            if task is not root_task:
+                writer.write_task(task_dict(task))
+        writer.write_task(task_dict(root_task))
+        writer.close(id_name(root_task.id()), computation.is_combined)
+    except:
+        writer.abort()
+        raise
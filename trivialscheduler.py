@@ -1,6 +1,8 @@
 from collections import defaultdict
+from collections import deque
 from collections import namedtuple
 from collections import OrderedDict
+import heapq
 import sys
 import numpy as np
 import os
@@ -8,19 +10,136 @@ import os
 from schedulerbase import *
 from itertools import ifilter
 from helpers import TimestampedLogger, setup_logging
+from interning import id_name
+
+class OrderedTaskSet():
+    """Task ids in the order they were added, with O(1) add, remove and
+       membership tests. Removed ids stay in the queue until they reach its
+       head, where they are dropped."""
+
+    def __init__(self):
+        # Map from task id to the sequence number it was added with
+        self._members = {}
+        # (sequence number, task id) in the order added
+        self._order = deque()
+        self._seq = 0
+
+    def add(self, task_id):
+        if task_id in self._members:
+            return
+        self._members[task_id] = self._seq
+        self._order.append((self._seq, task_id))
+        self._seq += 1
+
+    def remove(self, task_id):
+        del self._members[task_id]
+        self._compact()
+
+    def discard(self, task_id):
+        if task_id in self._members:
+            self.remove(task_id)
+
+    def first(self):
+        """The task id added earliest, or None if the set is empty."""
+        if not self._members:
+            return None
+        return self._order[0][1]
+
+    def _compact(self):
+        members = self._members
+        order = self._order
+        while order and members.get(order[0][1]) != order[0][0]:
+            order.popleft()
+        # removals away from the head leave entries behind, so rebuild the
+        # queue once most of it is stale
+        if len(order) > 2 * len(members) + 64:
+            self._order = deque(entry for entry in order
+                                if members.get(entry[1]) == entry[0])
+
+    def __contains__(self, task_id):
+        return task_id in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def __iter__(self):
+        members = self._members
+        for (seq, task_id) in self._order:
+            if members.get(task_id) == seq:
+                yield task_id
+
+
+class PriorityTaskSet():
+    """Task ids in the order of key(task_id), lowest first, and among equal
+       keys in the order they were added, with O(log n) add and O(1)
+       membership tests. The key is taken when a task is added. Removed ids
+       stay in the heap until they reach its top, where they are dropped."""
+
+    def __init__(self, key):
+        self._key = key
+        # Map from task id to its heap entry
+        self._members = {}
+        # (key, sequence number, task id) entries
+        self._heap = []
+        self._seq = 0
+
+    def add(self, task_id):
+        if task_id in self._members:
+            return
+        entry = (self._key(task_id), self._seq, task_id)
+        self._members[task_id] = entry
+        heapq.heappush(self._heap, entry)
+        self._seq += 1
+
+    def remove(self, task_id):
+        del self._members[task_id]
+        self._compact()
+
+    def discard(self, task_id):
+        if task_id in self._members:
+            self.remove(task_id)
+
+    def first(self):
+        """The task id with the lowest key, or None if the set is empty."""
+        if not self._members:
+            return None
+        return self._heap[0][2]
+
+    def _compact(self):
+        members = self._members
+        heap = self._heap
+        while heap and members.get(heap[0][2]) is not heap[0]:
+            heapq.heappop(heap)
+        if len(heap) > 2 * len(members) + 64:
+            self._heap = [entry for entry in heap if members.get(entry[2]) is entry]
+            heapq.heapify(self._heap)
+
+    def __contains__(self, task_id):
+        return task_id in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def __iter__(self):
+        for entry in sorted(self._members.itervalues()):
+            yield entry[2]
+
 
 class GlobalSchedulerState():
-    def __init__(self, system_time):
+    def __init__(self, system_time, runnable_tasks=None):
         self._pylogger = TimestampedLogger(__name__+'.GlobalSchedulerState', system_time)
 
         # Map from node id to node status
         self.nodes = {}
 
-        # List of pending tasks - those whose dependencies are not ready
-        self.pending_tasks = []
+        # Set of pending tasks - those whose dependencies are not ready
+        self.pending_tasks = set()
 
-        # List of runnable tasks
-        self.runnable_tasks = []
+        # Runnable tasks, in the order the scheduler dispatches them: by
+        # default the order they became runnable
+        if runnable_tasks is None:
+            runnable_tasks = OrderedTaskSet()
+        self.runnable_tasks = runnable_tasks
 
         # Map from task_id to node id
         self.executing_tasks = {}
@@ -35,6 +154,8 @@ class GlobalSchedulerState():
         self.task_times = {}
         self.finished_tasks = {}
 
+        # Map from pending task id to the number of its dependencies not
+        # ready yet, and from object id to the pending tasks waiting for it
         self._pending_needs = {}
         self._awaiting_completion = defaultdict(list)
 
@@ -59,20 +180,18 @@ class GlobalSchedulerState():
         assert(statestr in ["started", "added", "finished"])
 
         if timestamp is not None:
-            if task_id not in self.task_times.keys():
-                self.task_times[task_id] = {}
-            self.task_times[task_id][statestr] = timestamp
+            self.task_times.setdefault(task_id, {})[statestr] = timestamp
 
     def set_executing(self, task_id, node_id, timestamp):
         node_status = self.nodes[node_id]
         node_status.inc_executing()
-        if task_id in self.runnable_tasks:
-            self.runnable_tasks.remove(task_id)
+        self.runnable_tasks.discard(task_id)
         self.executing_tasks[task_id] = node_id
         self._update_task_timestats(task_id, "started", timestamp)
 
     def update(self, update, timestamp):
-        self._pylogger.debug('GlobalSchedulerState update {}'.format(str(update)))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('GlobalSchedulerState update {}', update)
         if isinstance(update, ForwardTaskUpdate):
 #            print '{} task {} submitted'.format(timestamp, update.task.id())
             self._add_task(update.task, update.submitting_node_id, update.is_scheduled_locally, timestamp)
@@ -95,29 +214,29 @@ class GlobalSchedulerState():
             raise NotImplementedError('Unknown update {}'.format(update.__class__.__name__))
 
     def _register_node(self, node_id, num_workers):
-        if node_id in self.nodes.keys():
+        if node_id in self.nodes:
             print 'already registered node {}'.format(node_id)
             sys.exit(1)
         self.nodes[node_id] = self._NodeStatus(node_id, num_workers)
 
     def _add_task(self, task, submitting_node_id, is_scheduled_locally, timestamp):
         task_id = task.id()
-        if task_id in self.tasks.keys():
+        if task_id in self.tasks:
             raise RuntimeError('Duplicate addition of task {}'.format(task_id))
         self.tasks[task_id] = task
         if is_scheduled_locally:
             self.set_executing(task_id, submitting_node_id, timestamp)
         else:
-            pending_needs = []
+            num_needs = 0
             for d_object_id in task.get_depends_on():
-                if d_object_id not in self.finished_objects.keys():
-                    pending_needs.append(d_object_id)
+                if d_object_id not in self.finished_objects:
+                    num_needs += 1
                     self._awaiting_completion[d_object_id].append(task_id)
-            if len(pending_needs) > 0:
-                self._pending_needs[task_id] = pending_needs
-                self.pending_tasks.append(task_id)
+            if num_needs > 0:
+                self._pending_needs[task_id] = num_needs
+                self.pending_tasks.add(task_id)
             else:
-                self.runnable_tasks.append(task_id)
+                self.runnable_tasks.add(task_id)
 
     def _finish_task(self, task_id):
         node_id = self.executing_tasks[task_id]
@@ -131,16 +250,17 @@ class GlobalSchedulerState():
     def _object_ready(self, object_id, node_id, object_size):
         self.finished_objects[object_id].append(node_id)
         self.finished_object_sizes[object_id] = object_size
-        if object_id in self._awaiting_completion.keys():
-            pending_task_ids = self._awaiting_completion[object_id]
-            del self._awaiting_completion[object_id]
+        pending_task_ids = self._awaiting_completion.pop(object_id, None)
+        if pending_task_ids is not None:
+            pending_needs = self._pending_needs
             for pending_task_id in pending_task_ids:
-                needs = self._pending_needs[pending_task_id]
-                needs.remove(object_id)
-                if not needs:
-                    del self._pending_needs[pending_task_id]
+                num_needs = pending_needs[pending_task_id] - 1
+                if num_needs:
+                    pending_needs[pending_task_id] = num_needs
+                else:
+                    del pending_needs[pending_task_id]
                     self.pending_tasks.remove(pending_task_id)
-                    self.runnable_tasks.append(pending_task_id)
+                    self.runnable_tasks.add(pending_task_id)
         #print "object", object_id, "is on", self.finished_objects[object_id]
 
     def object_ready(self, object_id, node_id):
@@ -150,12 +270,23 @@ class GlobalSchedulerState():
         return node_id in self.finished_objects[object_id]
 
 class BaseGlobalScheduler():
+    """Dispatches runnable tasks to the nodes _select_node() picks.
+
+       A scheduling pass runs only after an update that freed capacity or
+       made tasks runnable. A pass stops at the first task no node can take,
+       so between passes either no task is runnable or no worker is free,
+       and a pass only gets to tasks that could not run before. With a
+       coalesce_window in seconds, the updates within that time of the
+       first one that needs a pass share a single pass.
+    """
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
         self._system_time = system_time
         self._db = scheduler_db
         self._event_loop = event_loop
-        self._state = GlobalSchedulerState(system_time)
+        self._state = GlobalSchedulerState(system_time, self._runnable_task_set())
+        self._coalesce_window = coalesce_window
+        self._dispatch_timer_id = None
         scheduler_db.get_global_scheduler_updates(lambda update: self._handle_update(update))
 
     def _execute_task(self, node_id, task_id):
@@ -164,9 +295,10 @@ class BaseGlobalScheduler():
         self._db.schedule(node_id, task_id)
 
     def _process_tasks(self):
-#        print "global scheduler processing tasks, runnable number {} | {}".format(len(self._state.runnable_tasks), self._state.runnable_tasks)
-        runnable_tasks = self._state.runnable_tasks[:]
-        for task_id in runnable_tasks:
+        runnable_tasks = self._state.runnable_tasks
+        while runnable_tasks:
+            # executing the task removes it from runnable_tasks
+            task_id = runnable_tasks.first()
             node_id = self._select_node(task_id)
 #            print "process tasks got node id {} for task id {}".format(node_id, task_id)
 
@@ -174,100 +306,102 @@ class BaseGlobalScheduler():
                 self._execute_task(node_id, task_id)
             else:
                 # Not able to schedule so return
-                print 'unable to schedule'
+                self._pylogger.debug('unable to schedule')
                 return
 
+    def _runnable_task_set(self):
+        """The set runnable tasks are kept in, in dispatch order."""
+        return OrderedTaskSet()
+
     def _select_node(self, task_id):
         raise NotImplementedError()
 
+    def _dispatch_needed(self, update, num_runnable):
+        """Whether a scheduling pass is due after update, before which
+           num_runnable tasks were runnable."""
+        if isinstance(update, (FinishTaskUpdate, RegisterNodeUpdate)):
+            return True
+        if isinstance(update, AddWorkerUpdate):
+            return update.increment > 0
+        return len(self._state.runnable_tasks) > num_runnable
+
     def _handle_update(self, update):
+        num_runnable = len(self._state.runnable_tasks)
         self._state.update(update, self._system_time.get_time())
-        # TODO ability to process tasks periodically
+        if not self._dispatch_needed(update, num_runnable):
+            return
+        if not self._coalesce_window:
+            self._process_tasks()
+        elif self._dispatch_timer_id is None:
+            self._dispatch_timer_id = self._event_loop.add_timer(
+                self._coalesce_window, BaseGlobalScheduler._dispatch_expired, self)
+
+    @staticmethod
+    def _dispatch_expired(self):
+        self._dispatch_timer_id = None
         self._process_tasks()
 
 
 class TrivialGlobalScheduler(BaseGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
         self._pylogger = TimestampedLogger(__name__+'.TrivialGlobalScheduler', system_time)
         BaseGlobalScheduler.__init__(self, system_time, scheduler_db,
-                                     event_loop)
+                                     event_loop, coalesce_window)
 
     def _select_node(self, task_id):
-        self._pylogger.debug("Runnable tasks are {}, checking task {}".format(
-            ', '.join(self._state.runnable_tasks),
-            task_id))
+        debug_enabled = self._pylogger.debug_enabled
+        if debug_enabled:
+            self._pylogger.debug("Runnable tasks are {}, checking task {}",
+                ', '.join(map(id_name, self._state.runnable_tasks)), task_id)
         for node_id, node_status in sorted(self._state.nodes.items()):
-            self._pylogger.debug("can we schedule task {} on node {}? {} < {} so {}".format(
-                task_id, node_id, node_status.num_workers_executing,
-                node_status.num_workers,
-                bool(node_status.num_workers_executing < node_status.num_workers)))
+            if debug_enabled:
+                self._pylogger.debug("can we schedule task {} on node {}? {} < {} so {}",
+                    task_id, node_id, node_status.num_workers_executing,
+                    node_status.num_workers,
+                    bool(node_status.num_workers_executing < node_status.num_workers))
             #print "global scheduler: node {} num of workers executing {} total num of workers {}".format(node_id, node_status.num_workers_executing, node_status.num_workers)
             if node_status.num_workers_executing < node_status.num_workers:
-                print "[%s] assigned node = %s" %(self._system_time.get_time(), node_id)
+                if debug_enabled:
+                    self._pylogger.debug("assigned node {}", node_id)
                 return node_id
         return None
 
 
 class TrivialDFPriorityGlobalScheduler(TrivialGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
         self._pylogger = TimestampedLogger(__name__+'.TrivialDFPriorityGlobalScheduler', system_time)
         TrivialGlobalScheduler.__init__(self, system_time, scheduler_db,
-                                        event_loop)
+                                        event_loop, coalesce_window)
 
-    def _process_tasks(self):
-        runnable_tasks = map(lambda task_id: self._state.tasks[task_id], self._state.runnable_tasks)
-
-        print map(lambda x: '>>>{} {}'.format(x.id(), x.depth), sorted(runnable_tasks, key=lambda task: -task.depth))
-
-        for task_id in map(lambda x: x.id(), sorted(runnable_tasks, key=lambda task: -task.depth)):
-            node_id = self._select_node(task_id)
-            if node_id is not None:
-                self._execute_task(node_id, task_id)
-            else:
-                # Not able to schedule so return
-                print 'unable to schedule'
-                return
+    def _runnable_task_set(self):
+        # deepest first
+        return PriorityTaskSet(lambda task_id: -self._state.tasks[task_id].depth)
 
 
 class TrivialPriorityGlobalScheduler(TrivialGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
         self._pylogger = TimestampedLogger(__name__+'.TrivialPriorityGlobalScheduler', system_time)
         TrivialGlobalScheduler.__init__(self, system_time, scheduler_db,
-                                        event_loop)
+                                        event_loop, coalesce_window)
 
-    def _process_tasks(self):
-#        print "global scheduler processing tasks, runnable number {} | {}".format(len(self._state.runnable_tasks), self._state.runnable_tasks)
-        runnable_tasks = self._state.runnable_tasks[:]
-        task_data = []
-        for t in runnable_tasks:
-            ready_objects = self._state.tasks[t].get_depends_on()
-            ready_object_sizes = [self._state.finished_object_sizes[o] for o in ready_objects]
-            total_object_size = sum([self._state.finished_object_sizes[o] for o in self._state.tasks[t].get_depends_on()])
-            task_data.append((total_object_size, t))
-        task_data = sorted(task_data, key=lambda elm: elm[0])
-        task_data.reverse()
-        runnable_tasks = [task_id for _, task_id in task_data]
-
-        for task_id in runnable_tasks:
-            node_id = self._select_node(task_id)
-#            print "process tasks got node id {} for task id {}".format(node_id, task_id)
-
-            if node_id is not None:
-                self._execute_task(node_id, task_id)
-            else:
-                # Not able to schedule so return
-                print 'unable to schedule'
-                return
+    def _runnable_task_set(self):
+        # largest total input size first; all inputs are ready by the time
+        # a task is runnable
+        def key(task_id):
+            object_sizes = self._state.finished_object_sizes
+            return -sum(object_sizes[o] for o in self._state.tasks[task_id].get_depends_on())
+        return PriorityTaskSet(key)
 
 
 class LocationAwareGlobalScheduler(BaseGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
+        self._pylogger = TimestampedLogger(__name__+'.LocationAwareGlobalScheduler', system_time)
         BaseGlobalScheduler.__init__(self, system_time, scheduler_db,
-                                     event_loop)
+                                     event_loop, coalesce_window)
 
     def _select_node(self, task_id):
         task_deps = self._state.tasks[task_id].get_depends_on()
@@ -288,11 +422,11 @@ class LocationAwareGlobalScheduler(BaseGlobalScheduler):
 
 class DelayGlobalScheduler(BaseGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop, delay=1):
+    def __init__(self, system_time, scheduler_db, event_loop, delay=1, coalesce_window=0):
         BaseGlobalScheduler.__init__(self, system_time, scheduler_db,
-                                     event_loop)
+                                     event_loop, coalesce_window)
         self._pylogger = TimestampedLogger(__name__+'.DelayGlobalScheduler', system_time)
-        self._WaitingInfo = namedtuple('WaitingInfo', ['start_waiting_time', 'expiration_time'])
+        self._WaitingInfo = namedtuple('WaitingInfo', ['start_waiting_time', 'expiration_time', 'timer_id'])
         self._waiting_tasks = OrderedDict()
         self._max_delay = delay
 
@@ -319,48 +453,64 @@ class DelayGlobalScheduler(BaseGlobalScheduler):
         for task_id, waiting_info in self._waiting_tasks.items():
             (best_node_id, best_node_ready) = self._best_node(task_id)
             if best_node_ready:
-                self._pylogger.debug("now scheduling delayed task {} on node {} - delay is {}".format(
-                    task_id, best_node_id,
-                    self._system_time.get_time() - waiting_info.start_waiting_time))
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug("now scheduling delayed task {} on node {} - delay is {}",
+                        task_id, best_node_id,
+                        self._system_time.get_time() - waiting_info.start_waiting_time)
                 del self._waiting_tasks[task_id]
+                if waiting_info.timer_id is not None:
+                    self._event_loop.remove_timer(waiting_info.timer_id)
                 self._execute_task(best_node_id, task_id)
 
-        for task_id in self._state.runnable_tasks[:]:
+        for task_id in list(self._state.runnable_tasks):
             if task_id not in self._waiting_tasks.keys():
                 task_deps = self._state.tasks[task_id].get_depends_on()
                 (best_node_id, best_node_ready) = self._best_node(task_id)
                 if best_node_ready:
-                    self._pylogger.debug("immediately scheduling schedule task {} on node {}".format(
-                        task_id, best_node_id))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug("immediately scheduling schedule task {} on node {}", task_id, best_node_id)
                     self._execute_task(best_node_id, task_id)
                 else:
-                    self._pylogger.debug("waiting to schedule task {}".format(task_id))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug("waiting to schedule task {}", task_id)
+                    timer_id = self._event_loop.add_timer(self._max_delay,
+                        DelayGlobalScheduler._wait_expired, (self, task_id))
                     self._waiting_tasks[task_id] = self._WaitingInfo(
                         self._system_time.get_time(),
-                        self._system_time.get_time() + self._max_delay)
-                    self._event_loop.add_timer(self._max_delay,
-                        DelayGlobalScheduler._wait_expired, (self, task_id))
+                        self._system_time.get_time() + self._max_delay,
+                        timer_id)
+
+    def _dispatch_needed(self, update, num_runnable):
+        # the best node of a waiting task changes as its objects get ready
+        return (isinstance(update, ObjectReadyUpdate) or
+                BaseGlobalScheduler._dispatch_needed(self, update, num_runnable))
 
     @staticmethod
     def _wait_expired(context):
         (self, task_id) = context
         if task_id in self._waiting_tasks.keys():
+            # the timer has fired, so there is nothing left to cancel
+            self._waiting_tasks[task_id] = self._waiting_tasks[task_id]._replace(timer_id=None)
             # trivial scheduler algorithm, place anywhere available
             for node_id, node_status in sorted(self._state.nodes.items()):
                 if node_status.num_workers_executing < node_status.num_workers:
-                    self._pylogger.debug("delay exceeded, scheduling task {} on node {}".format(
-                        task_id, node_id))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug("delay exceeded, scheduling task {} on node {}", task_id, node_id)
                     del self._waiting_tasks[task_id]
                     self._execute_task(node_id, task_id)
                     return
             # NOTE: Don't we want to place this task somewhere, even if the
             # node is at capacity?
-            self._pylogger.debug("delay exceeded but no nodes available, unable to schedule task {}".format(
-                task_id))
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug("delay exceeded but no nodes available, unable to schedule task {}", task_id)
 
 class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
 
-    def __init__(self, system_time, scheduler_db, event_loop):
+    def __init__(self, system_time, scheduler_db, event_loop, coalesce_window=0):
+        # tasks are placed on every update and by a timer of its own, not by
+        # the dispatch passes that a coalesce window batches
+        if coalesce_window:
+            raise ValueError('TransferCostAwareGlobalScheduler does not support a coalesce_window')
         BaseGlobalScheduler.__init__(self, system_time, scheduler_db,
                                      event_loop)
         self._pylogger = TimestampedLogger(__name__ + '.TransferCostAwareGlobalScheduler', system_time)
@@ -433,7 +583,8 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
             if node_id not in node2object.keys():
                 node2object[node_id] = []
         assert(len(node2object.keys())== len(node_ids)) #did we cover all nodes given?
-        print "node2object"; print node2object
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("node2object {}", node2object)
         #expand this dictionary into a 2D array
         node2object_array = []
         for i in range(len(node_ids)):
@@ -452,15 +603,15 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
     def _handle_timer(context, setnewtimer=True):
         (self, ) = context
         #timer fired, process pending tasks
-        tnow = self._system_time.get_time()
         num_runnable = len(self._state.runnable_tasks)
         num_pending = len(self._state.pending_tasks)
         num_executing = len(self._state.executing_tasks)
         num_tasks_total = num_runnable + num_pending + num_executing
         num_tasks_finished = len(self._state.finished_tasks)
-        print "[%s] timer handler fired: runnable=%s pending=%s executing=%s finished=%s" \
-              % (tnow, num_runnable, num_pending, num_executing, num_tasks_finished)
-        task_id_list = self._state.runnable_tasks[:]
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("timer handler fired: runnable={} pending={} executing={} finished={}",
+                num_runnable, num_pending, num_executing, num_tasks_finished)
+        task_id_list = list(self._state.runnable_tasks)
         assert(len(task_id_list) == num_runnable)
 
         #apply task selection policy
@@ -472,7 +623,8 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
                 P_sol = np.zeros((1,1)) #no allocation
             else:
                 P_sol = self.schedule(C, U, workercaps) #dimensions : numt x numw
-            print "[%s] P_sol=" %tnow; print P_sol
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug("P_sol=\n{}", P_sol)
             (numt, numw) = P_sol.shape
             for i in range(numt):
                 for j in range(numw):
@@ -521,14 +673,13 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
         for t in task_id_list:
             ready_objects = self._state.tasks[t].get_depends_on()
             ready_object_sizes = [self._state.finished_object_sizes[o] for o in ready_objects]
-            print "[%s] ready_object_sizes = " %self._system_time.get_time(); print ready_object_sizes
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug("ready_object_sizes = {}", ready_object_sizes)
             total_object_size = sum([self._state.finished_object_sizes[o] for o in self._state.tasks[t].get_depends_on()])
             ot.append((total_object_size, t))
-        print "[%s] OT=" %self._system_time.get_time()
-        print ot
-
         ot.sort(key=lambda tup: tup[0], reverse=True) # high to low sort on object_size
-        print ot
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("OT={}", ot)
         return [t for o,t in ot[:sum(workercaps)]]
 
     def _apply_task_policy(self, task_id_list, workercaps = None):
@@ -546,14 +697,16 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
         '''
         node_id_list = sorted(self._state.nodes) # sorted list of node ids
         workercaps = self._get_worker_capacities(node_id_list)
-        print "workercaps = "; print workercaps
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("workercaps = {}", workercaps)
         if sum(workercaps) < 1: # wait for at least x workers to be available before scheduling anything
             return (None, None, workercaps, node_id_list)
 
         (object_usage_array, object_id_list) = self._get_object_usage(task_id_list)
-        print "node_id_list"; print node_id_list
-        print "object_id_list"; print object_id_list
-        print "object_usage_array"; print object_usage_array
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("node_id_list {}", node_id_list)
+            self._pylogger.debug("object_id_list {}", object_id_list)
+            self._pylogger.debug("object_usage_array {}", object_usage_array)
         node2object_array = self._get_object_cost(object_id_list, node_id_list)
         C = np.matrix(node2object_array, dtype=int)
         U = np.matrix(object_usage_array, dtype=int)
@@ -610,12 +763,10 @@ class TransferCostAwareGlobalScheduler(BaseGlobalScheduler):
         # K = UC^T
         # coefficient ij = K_ij
         K = U * C.T
-        print("C=");
-        print(C)
-        print("U=");
-        print(U)
-        print("K=");
-        print(K)
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug("C=\n{}", C)
+            self._pylogger.debug("U=\n{}", U)
+            self._pylogger.debug("K=\n{}", K)
 
         P = []
         # create boolean decision variable matrix P
@@ -698,7 +849,8 @@ class PassthroughLocalScheduler():
         self._scheduler_db.get_local_scheduler_updates(self._node_id, lambda update: self._handle_scheduler_db_update(update))
 
     def _handle_runtime_update(self, update):
-        self._pylogger.debug('LocalScheduler update {}'.format(str(update)))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('LocalScheduler update {}', update)
         if isinstance(update, ObjectReadyUpdate):
             self._scheduler_db.object_ready(update.object_description, update.submitting_node_id)
         elif isinstance(update, FinishTaskUpdate):
@@ -737,7 +889,8 @@ class FlexiblePassthroughLocalScheduler():
         self._scheduler_db.get_local_scheduler_updates(self._node_id, lambda update: self._handle_scheduler_db_update(update))
 
     def _handle_runtime_update(self, update):
-        self._pylogger.debug('LocalScheduler update {}'.format(str(update)))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('LocalScheduler update {}', update)
         if isinstance(update, ObjectReadyUpdate):
             self._scheduler_db.object_ready(update.object_description, update.submitting_node_id)
         elif isinstance(update, FinishTaskUpdate):
@@ -752,7 +905,8 @@ class FlexiblePassthroughLocalScheduler():
 
 
     def _forward_to_global(self, task, scheduled_locally):
-        self._pylogger.debug('submit task to global scheduler {} - scheduled locally {}'.format(task.id(), scheduled_locally))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('submit task to global scheduler {} - scheduled locally {}', task.id(), scheduled_locally)
         self._scheduler_db.submit(task, self._node_runtime.node_id, scheduled_locally)
     
     def _filter_forward(self, task):
@@ -809,13 +963,15 @@ class ThresholdLocalScheduler(FlexiblePassthroughLocalScheduler):
         self._size_location_results[task_id].append((object_id, object_size, object_locations))
         self._size_location_awaiting_results[task_id].remove(object_id)
         task_load = float('inf')
-        self._pylogger.debug('task {} scheduling recieved object information about object {} with size {} and information {}'.format(task_id, object_id, object_size, object_locations))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('task {} scheduling recieved object information about object {} with size {} and information {}', task_id, object_id, object_size, object_locations)
 
         #"short circuit" check
         for node in object_locations.keys():
             if object_locations[node] != ObjectStatus.READY and node != self._node_id and task_id not in self._scheduled_tasks:
                 self._scheduled_tasks.append(task_id)
-                self._pylogger.debug('local load is medium, but remote objects are not ready yet, so sending task {} to global scheduler from node {}'.format(task_id, self._node_id))
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug('local load is medium, but remote objects are not ready yet, so sending task {} to global scheduler from node {}', task_id, self._node_id)
                 self._forward_to_global(task, scheduled_locally = False) 
                 ##need to make sure I ignore the next calls of this function!
 
@@ -828,8 +984,9 @@ class ThresholdLocalScheduler(FlexiblePassthroughLocalScheduler):
                 # go on processing with complete results
                 # either schedule locally or send to global scheduler
                 for obj_id,remote_object_size,locations_status in self._size_location_results[task_id]:
-                    self._pylogger.debug('remote object {} status is {} and size is {}'.format(
-                        obj_id, locations_status, remote_object_size))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug('remote object {} status is {} and size is {}',
+                            obj_id, locations_status, remote_object_size)
                     for node in locations_status.keys():
                         if locations_status[node] == ObjectStatus.READY and remote_object_size:
                             ready_remote_transfer_size += remote_object_size
@@ -842,14 +999,17 @@ class ThresholdLocalScheduler(FlexiblePassthroughLocalScheduler):
                 if ready_remote_transfer_size != 0:
                     #task_load = ready_remote_transfer_size
                     task_load = ready_remote_transfer_size * self.avg_data_transfer_cost if self.avg_message_db_delay==0 else ready_remote_transfer_size * self.avg_data_transfer_cost / self.avg_message_db_delay
-                self._pylogger.debug('task load is {}'.format(task_load))
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug('task load is {}', task_load)
              
                 if float(task_load) > float(self.threshold2) :
-                    self._pylogger.debug('local load is medium, and task load is high. task load is {} and threshold is {}, so sending task {} to global scheduler from node {}'.format(task_load, self.threshold2, task.id(), self._node_id))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug('local load is medium, and task load is high. task load is {} and threshold is {}, so sending task {} to global scheduler from node {}', task_load, self.threshold2, task.id(), self._node_id)
                     self._forward_to_global(task, scheduled_locally = False)
                     self._scheduled_tasks.append(task_id)
                 else:
-                    self._pylogger.debug('local load is medium, and task load is low. task load is {} and threshold is {}, so schedulling task {} locally on node {}'.format(task_load, self.threshold2, task.id(), self._node_id))
+                    if self._pylogger.debug_enabled:
+                        self._pylogger.debug('local load is medium, and task load is low. task load is {} and threshold is {}, so schedulling task {} locally on node {}', task_load, self.threshold2, task.id(), self._node_id)
                     self._node_runtime.send_to_dispatcher(task, 1)
                     self._forward_to_global(task, scheduled_locally = True)
                     self._scheduled_tasks.append(task_id)
@@ -866,25 +1026,30 @@ class ThresholdLocalScheduler(FlexiblePassthroughLocalScheduler):
 
         #avg_task_time = 1
         avg_task_time = self._node_runtime.get_avg_task_time()
-        self._pylogger.debug('get_avg_task_time : {}'.format(self._node_runtime.get_avg_task_time()))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('get_avg_task_time : {}', avg_task_time)
         #self._node_runtime.get_avg_task_time() buffers that last local 20 task completion times
         dispatcher_load = self._node_runtime.get_dispatch_queue_size()
         node_efficiency_rate = self._node_runtime.get_node_eff_rate()
         #add to node_runtime the function get_node_eff_rate(). It will record a buffer in the form of list of task_start_time for the last 10 or 20 tasks (this will be a constant parameter) sent for execution on the node. The node efficiency rate will be the buffer size (whatever the constant is) divided by the (last_element-first_element) of the buffer.
         
-        self._pylogger.debug('node_efficiency_rate is {}'.format(node_efficiency_rate))
-        self._pylogger.debug('avg_task_time is {}'.format(avg_task_time))
-        self._pylogger.debug('dispatcher_load is {}'.format(dispatcher_load))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('node_efficiency_rate is {}', node_efficiency_rate)
+            self._pylogger.debug('avg_task_time is {}', avg_task_time)
+            self._pylogger.debug('dispatcher_load is {}', dispatcher_load)
         local_load = 0 if (node_efficiency_rate == 0 or avg_task_time == 0) else (((dispatcher_load+self._node_runtime.num_workers_executing) / node_efficiency_rate) / avg_task_time)
-        self._pylogger.debug('local load is {}'.format(local_load))
+        if self._pylogger.debug_enabled:
+            self._pylogger.debug('local load is {}', local_load)
 
         for d_object_id in task.get_phase(0).depends_on:
             if self._node_runtime.is_local(d_object_id) == ObjectStatus.READY:
                 objects_status['local_ready'] += 1
-                self._pylogger.debug('object {} is ready'.format(d_object_id))
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug('object {} is ready', d_object_id)
             elif self._node_runtime.is_local(d_object_id) == ObjectStatus.EXPECTED:
                 objects_status['local_expected'] += 1
-                self._pylogger.debug('object {} is expected'.format(d_object_id))
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug('object {} is expected', d_object_id)
                 #objects_transfer_size = transfer_size + self._node_runtime.get_object_size(d_object_id)
             else:
                 remote_objects.append(d_object_id) 
@@ -892,33 +1057,38 @@ class ThresholdLocalScheduler(FlexiblePassthroughLocalScheduler):
 
         #the trivial case
         if len(task.get_phase(0).depends_on) == objects_status['local_ready'] and self._node_runtime.free_workers() > 0:
-            self._pylogger.debug('all objects ready locally and there are free workers, so scheduling task {} locally'.format(task.id()))
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('all objects ready locally and there are free workers, so scheduling task {} locally', task.id())
             self._node_runtime.send_to_dispatcher(task, 1)
             self._forward_to_global(task, scheduled_locally = True)
 
         #if the local scheduler has very low load, even with expected objects this still reduces to the trivial case (depending on the "low load" threshold)
         elif ((len(task.get_phase(0).depends_on) == (objects_status['local_ready']+objects_status['local_expected'])) and (float(self.threshold1l) >= float(local_load))):
-            self._pylogger.debug('all objects are either ready or expected locally, local load is {} and threshold is {}, so scheduling task {} locally on node {}'.format(local_load, self.threshold1l, task.id(), self._node_id))
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('all objects are either ready or expected locally, local load is {} and threshold is {}, so scheduling task {} locally on node {}', local_load, self.threshold1l, task.id(), self._node_id)
             self._node_runtime.send_to_dispatcher(task, 1)
             self._forward_to_global(task, scheduled_locally = True)
 
 
         #if the local scheduler has a very high load, it's better to send the task to the global scheduler, even without querrying about all the remote objects
         elif float(local_load) >= float(self.threshold1h):
-            self._pylogger.debug('threshold scheduler: local load is very high. local load is {} and threshold is {}, so sending task {} to global scheduler immidietly from node {}'.format(local_load, self.threshold1h, task.id(), self._node_id))
+            if self._pylogger.debug_enabled:
+                self._pylogger.debug('threshold scheduler: local load is very high. local load is {} and threshold is {}, so sending task {} to global scheduler immidietly from node {}', local_load, self.threshold1h, task.id(), self._node_id)
             self._forward_to_global(task, scheduled_locally = False)
 
         #the interesting case, where we need information about remote objects
         #elif local_load < self.threshold1h and local_load > self.threshold1l:
         else:
             if not remote_objects:
-                 self._pylogger.debug('local load {} is medium, but all objects will be local, so scheduling task {} locally on node {}'.format(local_load, task.id(), self._node_id))
+                 if self._pylogger.debug_enabled:
+                     self._pylogger.debug('local load {} is medium, but all objects will be local, so scheduling task {} locally on node {}', local_load, task.id(), self._node_id)
                  self._forward_to_global(task, scheduled_locally = False)
             #querry for remote object sizes and calculate task load
             for remote_object_id in remote_objects:
                 self._size_location_awaiting_results[task.id()].add(remote_object_id)
             for remote_object_id in remote_objects:
-                self._pylogger.debug('querring for remote object size')
+                if self._pylogger.debug_enabled:
+                    self._pylogger.debug('querring for remote object size')
                 self._node_runtime.get_object_size_locations(remote_object_id,
                     lambda object_id, size, object_locations:
                     self._size_location_result_handler(task, object_id, size, object_locations))
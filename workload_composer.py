@@ -0,0 +1,229 @@
+import argparse
+import array
+import random
+import time
+
+import columnartrace
+from interning import id_name, job_id
+from syngen import parse_distribution
+from tracewriter import TraceWriter
+
+
+################################################################
+#         Open-loop multi-job workloads from source traces      #
+################################################################
+#
+# combine_traces repeats one job at fixed offsets. The composer builds a
+# long workload out of a set of source traces, with jobs arriving by an
+# open-loop arrival process, independent of when earlier jobs finish:
+#
+#   poisson:RATE                  exponential gaps, RATE jobs per second
+#   bursty:LOW,HIGH,PERIOD        Poisson at rates alternating between LOW
+#                                 and HIGH, over exponential periods with
+#                                 a mean of PERIOD seconds
+#   trace:FILENAME                the arrival times in FILENAME, one per
+#                                 line, optionally followed by the index of
+#                                 the source trace of the job
+#
+# Each job is a copy of a source trace, picked at random unless the arrival
+# trace names it, with its task durations and its object sizes scaled by
+# factors drawn per job. Every task and object id is tagged with its job,
+# see interning.job_id(), so that the stats report per-job completion
+# times. As in combine_traces, a root task submits the root task of every
+# job in its first phase and waits for an object returned by each in its
+# second. Jobs are written as they arrive, and only the source traces and
+# two numbers per job are held, so workloads of millions of tasks stay
+# cheap to build.
+
+ROOT_TASK_ID = '0'
+JOB_RESULT_ID = 'done'
+
+
+def poisson_arrivals(rng, rate):
+    t = 0.
+    while True:
+        t += rng.expovariate(rate)
+        yield (t, None)
+
+
+def bursty_arrivals(rng, low_rate, high_rate, mean_period):
+    t = 0.
+    period_end = rng.expovariate(1. / mean_period)
+    rate = low_rate
+    while True:
+        gap = rng.expovariate(rate)
+        if t + gap < period_end:
+            t += gap
+            yield (t, None)
+            continue
+        # switch rates; exponential gaps are memoryless, so drawing again
+        # from the period end is exact
+        t = period_end
+        period_end += rng.expovariate(1. / mean_period)
+        rate = high_rate if rate == low_rate else low_rate
+
+
+def trace_arrivals(rng, filename):
+    with open(filename) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            source = int(fields[1]) if len(fields) > 1 else None
+            yield (float(fields[0]), source)
+
+
+def parse_arrivals(spec, rng):
+    """An iterator of (arrival time, source index or None) for the arrival
+       process given as NAME:ARGS."""
+    (name, _, args) = spec.partition(':')
+    if name == 'trace':
+        return trace_arrivals(rng, args)
+    try:
+        args = [float(arg) for arg in args.split(',')] if args else []
+    except ValueError:
+        raise ValueError('Bad arrival process arguments in {}'.format(spec))
+    if name == 'poisson' and len(args) == 1:
+        return poisson_arrivals(rng, args[0])
+    if name == 'bursty' and len(args) == 3:
+        return bursty_arrivals(rng, args[0], args[1], args[2])
+    raise ValueError('Unknown arrival process {}'.format(spec))
+
+
+class SourceJob():
+    """The tasks of a source trace, with plain string ids, ready to be
+       copied into a workload."""
+
+    def __init__(self, computation):
+        self.root_task_id = id_name(computation.get_root_task().id())
+        self.tasks = []
+        for task_id in computation.get_task_ids():
+            task = computation.get_task(task_id)
+            phases = []
+            for i in range(task.num_phases()):
+                phase = task.get_phase(i)
+                phases.append((phase.phase_id,
+                               [id_name(object_id) for object_id in phase.depends_on],
+                               [(id_name(s.task_id), s.time_offset) for s in phase.submits],
+                               phase.duration,
+                               [(id_name(put.object_id), put.size, put.time_offset)
+                                for put in phase.creates]))
+            results = [(id_name(result.object_id), result.size) for result in task.get_results()]
+            self.tasks.append((id_name(task_id), phases, results))
+
+    def write_job(self, writer, job, duration_scale=1., size_scale=1.):
+        """Write the tasks of the source tagged as job, scaled. The root task
+           also returns the job's JOB_RESULT_ID object."""
+        def tag(trace_id):
+            return job_id(job, trace_id)
+        def size(size):
+            return int(round(size * size_scale))
+        done_id = tag(JOB_RESULT_ID)
+        for (task_id, phases, results) in self.tasks:
+            results = [{'objectId': tag(object_id), 'size': size(object_size)}
+                       for (object_id, object_size) in results]
+            if task_id == self.root_task_id:
+                results.append({'objectId': done_id, 'size': 0})
+            writer.write_task({
+                'taskId': tag(task_id),
+                'phases': [{
+                    'phaseId': phase_id,
+                    'dependsOn': [tag(object_id) for object_id in depends_on],
+                    'submits': [{'taskId': tag(submitted), 'timeOffset': offset * duration_scale}
+                                for (submitted, offset) in submits],
+                    'duration': duration * duration_scale,
+                    'creates': [{'objectId': tag(object_id), 'size': size(object_size),
+                                 'timeOffset': offset * duration_scale}
+                                for (object_id, object_size, offset) in creates],
+                    } for (phase_id, depends_on, submits, duration, creates) in phases],
+                'results': results,
+                })
+
+
+def job_name(i):
+    return 'j{}'.format(i)
+
+
+def compose_workload(source_filenames, trace_filename, arrivals='poisson:1',
+                     num_jobs=None, horizon=None, duration_scale='const:1',
+                     size_scale='const:1', seed=0):
+    """Write a workload of jobs copied from the source traces, arriving by
+       the given process, until num_jobs jobs or the horizon in seconds is
+       reached, or the arrival trace ends. Returns (number of jobs, number of
+       tasks)."""
+    if num_jobs is None and horizon is None and not arrivals.startswith('trace:'):
+        raise ValueError('Either the number of jobs or the horizon is needed')
+    sources = [SourceJob(columnartrace.load_trace(filename)) for filename in source_filenames]
+    rng = random.Random(seed)
+    duration_scale = parse_distribution(duration_scale, rng)
+    size_scale = parse_distribution(size_scale, rng)
+    arrival_times = array.array('d')
+    job_sources = array.array('l')
+
+    writer = TraceWriter(trace_filename)
+    try:
+        for (arrival_time, source) in parse_arrivals(arrivals, rng):
+            if num_jobs is not None and len(arrival_times) >= num_jobs:
+                break
+            if horizon is not None and arrival_time > horizon:
+                break
+            if source is None:
+                source = rng.randrange(len(sources))
+            sources[source].write_job(writer, job_name(len(arrival_times)),
+                                      duration_scale(), size_scale())
+            arrival_times.append(arrival_time)
+            job_sources.append(source)
+        if not arrival_times:
+            raise ValueError('No job arrived')
+
+        num_arrived = len(arrival_times)
+        writer.write_large_task({
+            'taskId': ROOT_TASK_ID,
+            'phases': [{
+                'phaseId': 0,
+                'dependsOn': [],
+                'submits': ({'taskId': job_id(job_name(i), sources[job_sources[i]].root_task_id),
+                             'timeOffset': arrival_times[i]} for i in xrange(num_arrived)),
+                'duration': max(arrival_times),
+                'creates': [],
+                }, {
+                'phaseId': 1,
+                'dependsOn': (job_id(job_name(i), JOB_RESULT_ID) for i in xrange(num_arrived)),
+                'submits': [],
+                'duration': 0,
+                'creates': [],
+                }],
+            'results': [],
+            })
+        writer.close(ROOT_TASK_ID, is_combined=True)
+    except:
+        writer.abort()
+        raise
+    return (len(arrival_times), writer.num_tasks)
+
+
+parser = argparse.ArgumentParser(description="Compose a workload of jobs "
+        "arriving over time from source traces.")
+parser.add_argument("traces", nargs='+', help="Source traces")
+parser.add_argument("--output", required=True, help="Workload trace filename")
+parser.add_argument("--arrivals", default='poisson:1',
+                    help="poisson:RATE, bursty:LOW_RATE,HIGH_RATE,MEAN_PERIOD or "
+                         "trace:FILENAME of arrival times and optional source indices")
+parser.add_argument("--num-jobs", default=None, type=int)
+parser.add_argument("--horizon", default=None, type=float,
+                    help="Last arrival time in seconds")
+parser.add_argument("--duration-scale", default='const:1',
+                    help="Distribution of the per-job task duration factor, "
+                         "as for syngen.py --duration")
+parser.add_argument("--size-scale", default='const:1',
+                    help="Distribution of the per-job object size factor")
+parser.add_argument("--seed", default=0, type=int)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    start = time.time()
+    (num_jobs, num_tasks) = compose_workload(
+        args.traces, args.output, args.arrivals, args.num_jobs, args.horizon,
+        args.duration_scale, args.size_scale, args.seed)
+    print 'wrote {} jobs, {} tasks to {} in {:.1f} s'.format(
+        num_jobs, num_tasks, args.output, time.time() - start)